@@ -1,30 +1,28 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import and_, case, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from .database import SessionLocal
-from .models import Medicine, Order, RefillAlert
+from typing import Dict
+import asyncio
+import os
+from .database import get_async_db
+from .models import Medicine, Order, RefillAlert, Prescription
+from . import trace_store, admission
 
 router = APIRouter()
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 # =========================
 # OVERVIEW
 # =========================
 @router.get("/overview")
-def get_overview(db: Session = Depends(get_db)):
-    total_products = db.query(Medicine).count()
-    total_orders = db.query(Order).count()
-    total_patients = db.query(Order.patient_id).distinct().count()
-    low_stock = db.query(Medicine).filter(Medicine.stock < 10).count()
-    refill_alerts = db.query(RefillAlert).count()
+async def get_overview(db: AsyncSession = Depends(get_async_db)):
+    total_products = await db.scalar(select(func.count(Medicine.id)))
+    total_orders = await db.scalar(select(func.count(Order.id)))
+    total_patients = await db.scalar(select(func.count(func.distinct(Order.patient_ref))))
+    low_stock = await db.scalar(select(func.count(Medicine.id)).where(Medicine.stock < 10))
+    refill_alerts = await db.scalar(select(func.count(RefillAlert.id)))
 
     return {
         "total_products": total_products,
@@ -39,9 +37,9 @@ def get_overview(db: Session = Depends(get_db)):
 # PDC SUMMARY
 # =========================
 @router.get("/pdc-summary")
-def clinic_pdc(db: Session = Depends(get_db)):
+async def clinic_pdc(db: AsyncSession = Depends(get_async_db)):
 
-    orders = db.query(Order).all()
+    orders = (await db.scalars(select(Order))).all()
 
     if not orders:
         return {"clinic_pdc": 0}
@@ -66,6 +64,136 @@ def clinic_pdc(db: Session = Depends(get_db)):
 # LOW STOCK
 # =========================
 @router.get("/low-stock")
-def low_stock(db: Session = Depends(get_db)):
-    medicines = db.query(Medicine).filter(Medicine.stock < 10).all()
-    return medicines
\ No newline at end of file
+async def low_stock(db: AsyncSession = Depends(get_async_db)):
+    medicines = (await db.scalars(select(Medicine).where(Medicine.stock < 10))).all()
+    return medicines
+
+# =========================
+# REQUEST STATS (trace store rollups)
+# =========================
+DASHBOARD_INVENTORY_ROWS = 30
+DASHBOARD_PRESCRIPTIONS = 20
+
+
+class _PdcTotals:
+    """
+    Running totals for the clinic PDC. Orders are append-only and written
+    by the single writer, so each call only folds in the orders after the
+    last id seen (a primary-key range) instead of summing the whole table.
+    """
+
+    def __init__(self):
+        self.covered = 0.0
+        self.orders = 0
+        self.last_id = 0
+        self._lock = asyncio.Lock()
+
+    async def score(self, db: AsyncSession) -> float:
+        counts = and_(Order.dosage_frequency > 0, Order.quantity > 0)
+
+        async with self._lock:
+            covered, orders, last_id = (await db.execute(
+                select(
+                    func.sum(case((counts, Order.quantity / Order.dosage_frequency), else_=0)),
+                    func.count(case((counts, Order.id))),
+                    func.max(Order.id)
+                ).where(Order.id > self.last_id)
+            )).one()
+
+            if last_id is not None:
+                self.covered += covered or 0
+                self.orders += orders
+                self.last_id = last_id
+
+        # Same formula as /pdc-summary
+        return round(self.covered / (self.orders * 30), 4) if self.orders else 0.0
+
+
+pdc_totals = _PdcTotals()
+
+
+@router.get("/stats")
+async def request_stats(
+    window: int = Query(60, ge=1, le=30 * 24 * 60),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Everything the admin dashboard shows, in one call:
+    latency percentiles, stage timings, intents, outcomes, emergency
+    triggers and token usage over the last `window` minutes (served from
+    the trace store rollups — raw traces are never rescanned), plus the
+    lowest stock levels, clinic PDC, the latest prescriptions and the
+    /chat admission state.
+    """
+    stats = trace_store.store.stats(window)
+
+    lowest_stock = (await db.execute(
+        select(Medicine.name, Medicine.stock, Medicine.prescription_required)
+        .order_by(Medicine.stock, Medicine.id)
+        .limit(DASHBOARD_INVENTORY_ROWS)
+    )).all()
+
+    prescriptions = (await db.execute(
+        select(
+            Prescription.patient_id,
+            Prescription.medicine_name,
+            Prescription.uploaded_at,
+            Prescription.status
+        )
+        .order_by(Prescription.uploaded_at.desc())
+        .limit(DASHBOARD_PRESCRIPTIONS)
+    )).all()
+
+    stats.update({
+        "inventory": {
+            name: {"stock": stock, "restricted": bool(restricted)}
+            for name, stock, restricted in lowest_stock
+        },
+        "avg_pdc_score": await pdc_totals.score(db),
+        "admission": admission.controller.stats(),
+        "prescription_queue": [
+            {
+                "patient": patient_id,
+                "drug": medicine,
+                "timestamp": uploaded_at.strftime("%Y-%m-%d %H:%M") if uploaded_at else None,
+                "status": status
+            }
+            for patient_id, medicine, uploaded_at, status in prescriptions
+        ],
+    })
+
+    return stats
+
+
+# =========================
+# FRONTEND RERUN TRACES
+# =========================
+class FrontendTrace(BaseModel):
+    page: str                          # ui_phase the rerun rendered
+    total_ms: float = Field(ge=0)
+    stages: Dict[str, float] = {}      # component / "api <METHOD> <path>" → ms
+    api_calls: int = 0
+
+
+@router.post("/frontend-traces", status_code=204)
+def record_frontend_trace(trace: FrontendTrace):
+    """
+    One Streamlit rerun profile from the frontend's developer profiler.
+    """
+    trace_store.frontend_store.record({
+        "id": os.urandom(6).hex(),
+        "ts": datetime.utcnow().isoformat(),
+        "kind": trace.page,
+        "total_ms": trace.total_ms,
+        "stages": trace.stages,
+        "api_calls": trace.api_calls,
+    })
+
+
+@router.get("/frontend-stats")
+def frontend_stats(window: int = Query(60, ge=1, le=30 * 24 * 60)):
+    """
+    Rerun timings per component over the last `window` minutes
+    (same rollup shape as /stats; `requests` counts reruns per page).
+    """
+    return trace_store.frontend_store.stats(window)
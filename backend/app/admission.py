@@ -0,0 +1,178 @@
+import asyncio
+import math
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+# =========================
+# CONFIG
+# =========================
+# Concurrent agent runs — each can hold a Groq call, so size this to the LLM quota
+CHAT_MAX_CONCURRENT = int(os.getenv("CHAT_MAX_CONCURRENT", "8"))
+
+# Requests allowed to wait for a slot; beyond this new requests are shed at once
+CHAT_MAX_QUEUED = int(os.getenv("CHAT_MAX_QUEUED", "32"))
+
+# Longest a queued request waits before it is shed
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))
+
+# Per-user token bucket: sustained messages per second and burst size
+CHAT_USER_RATE = float(os.getenv("CHAT_USER_RATE", "0.5"))
+CHAT_USER_BURST = int(os.getenv("CHAT_USER_BURST", "5"))
+
+# Buckets kept in memory (least recently seen users are forgotten — they come back full)
+MAX_TRACKED_USERS = 10_000
+
+# Retry-After sent when shedding for global load
+BUSY_RETRY_SECONDS = 5
+
+
+class Busy(Exception):
+    """Request not admitted. `reason` is "rate_limited" or "overloaded"."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# =========================
+# PER-USER RATE LIMIT
+# =========================
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: int):
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, rate: float, burst: int) -> float:
+        """Spend one token. Returns 0 if admitted, else seconds until the next token."""
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / rate if rate > 0 else BUSY_RETRY_SECONDS
+
+
+# =========================
+# ADMISSION CONTROLLER
+# =========================
+class AdmissionController:
+    """
+    Gate in front of the chat agent, used from the event loop only.
+
+    Each message spends a token from the user's bucket, then takes one of
+    `max_concurrent` slots or waits in a bounded FIFO queue. A freed slot
+    passes straight to the next waiter, so a burst never runs more than
+    `max_concurrent` agents. Emergencies never come through here — /chat
+    answers them before admission, as they need no agent slot.
+    """
+
+    def __init__(self, max_concurrent=CHAT_MAX_CONCURRENT, max_queued=CHAT_MAX_QUEUED,
+                 queue_timeout=CHAT_QUEUE_TIMEOUT, user_rate=CHAT_USER_RATE, user_burst=CHAT_USER_BURST):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+
+        self._active = 0
+        self._waiters = deque()              # futures, oldest first
+        self._queued = 0                     # live (not cancelled) waiters
+        self._buckets = OrderedDict()        # user_id → TokenBucket, LRU order
+        self.counts = Counter()              # admitted / waited / rate_limited / overloaded / timed_out
+
+    # ── rate limit ───────────────────────────────────────────────────────────
+
+    def _check_rate(self, user_id: str):
+        bucket = self._buckets.pop(user_id, None) or TokenBucket(self.user_burst)
+        self._buckets[user_id] = bucket
+
+        while len(self._buckets) > MAX_TRACKED_USERS:
+            self._buckets.popitem(last=False)
+
+        wait = bucket.take(self.user_rate, self.user_burst)
+        if wait:
+            self.counts["rate_limited"] += 1
+            raise Busy("rate_limited", wait)
+
+    # ── slots ────────────────────────────────────────────────────────────────
+
+    async def _acquire(self):
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            return
+
+        if self._queued >= self.max_queued:
+            self.counts["overloaded"] += 1
+            raise Busy("overloaded", BUSY_RETRY_SECONDS)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._queued += 1
+        self.counts["waited"] += 1
+
+        try:
+            done, _ = await asyncio.wait({future}, timeout=self.queue_timeout)
+        except BaseException:
+            # Client went away while waiting — give back a slot we were just handed
+            self._abandon(future)
+            raise
+
+        if not done:
+            self._abandon(future)
+            self.counts["timed_out"] += 1
+            raise Busy("overloaded", BUSY_RETRY_SECONDS)
+
+    def _abandon(self, future):
+        if future.done():
+            self._release()
+        else:
+            future.cancel()
+            self._queued -= 1
+
+    def _release(self):
+        # Hand the slot to the oldest live waiter; cancelled ones are skipped lazily
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.cancelled():
+                self._queued -= 1
+                future.set_result(None)
+                return
+
+        self._active -= 1
+
+    @asynccontextmanager
+    async def admit(self, user_id: str):
+        """
+        `async with controller.admit(user_id): ...` — raises Busy instead
+        of queueing without bound.
+        """
+        self._check_rate(user_id)
+
+        await self._acquire()
+        self.counts["admitted"] += 1
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            **self.counts,
+        }
+
+
+controller = AdmissionController()
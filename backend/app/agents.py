@@ -8,7 +8,6 @@ from .services import (
     check_stock,
     check_prescription,
     place_order,
-    check_recent_purchase,
     predict_refill
 )
 load_dotenv()
@@ -1,4 +1,4 @@
-from ..services import place_order
+from ..services import place_order_by_id
 
-def execute_order(db, user_id, medicine, quantity, dosage):
-    return place_order(db, user_id, medicine, quantity, dosage)
\ No newline at end of file
+def execute_resolved_order(db, user_id, order, quantity, dosage):
+    return place_order_by_id(db, user_id, order.id, quantity, dosage)
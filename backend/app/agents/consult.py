@@ -0,0 +1,259 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+
+from .. import async_services
+from ..database import AsyncSessionLocal
+from ..models import Medicine
+from ..services import RECENT_PURCHASE_DAYS, rank_for_symptom, stock_status
+from ..entitlements import patient_entitlements
+from .intent_agent import detect_intent
+from .order_context import clean_medicine_text
+from .safety_agent import safety_verdict
+from ..trace_store import add_stage, annotate
+
+
+# =========================
+# CONFIG
+# =========================
+AGENT_TIMEOUT_SECONDS = 20
+
+MEDICINE_COLUMNS = (
+    Medicine.id,
+    Medicine.name,
+    Medicine.description,
+    Medicine.price,
+    Medicine.stock,
+    Medicine.prescription_required
+)
+
+
+# =========================
+# PER-REQUEST SNAPSHOT
+# =========================
+@dataclass(frozen=True)
+class ConsultSnapshot:
+    """
+    Everything the three agents read, loaded once on a single async read
+    session. The medicine is resolved once, through the same alias
+    index as /chat and checkout, so every agent talks about the same
+    product. Agents only read from it, so they can run concurrently.
+    """
+    user_id: Optional[str]
+    message: str
+    intent: dict
+    medicine: Optional[Medicine]        # None if unresolved
+    recent_purchases: frozenset         # {medicine.id} if bought in the last RECENT_PURCHASE_DAYS
+    entitlements: frozenset             # medicine ids covered by a valid prescription (approved or still pending review)
+    catalog: tuple = ()                 # only for symptom recommendations
+    quantity: Optional[int] = None
+
+
+async def load_snapshot(user_id, message, medicine=None, quantity=None, intent=None) -> ConsultSnapshot:
+    """
+    `medicine` from the caller wins over the one extracted by the intent;
+    either is resolved exactly (no fuzzy match) through the async services,
+    on one async read session.
+    """
+    intent = intent or {}
+    medicine_text = clean_medicine_text(medicine or intent.get("medicine") or "")
+
+    async with AsyncSessionLocal() as db:
+        row = await async_services.resolve_medicine(db, medicine_text) if medicine_text else None
+
+        catalog = ()
+        if intent.get("intent") == "recommend" and intent.get("symptom"):
+            catalog = tuple((await db.execute(select(*MEDICINE_COLUMNS))).all())
+
+        recent_purchases, entitlements = frozenset(), frozenset()
+
+        if user_id:
+            # Only the resolved medicine can be ordered, so it is the only one checked
+            if row is not None and await async_services.check_recent_purchase(db, user_id, medicine_text):
+                recent_purchases = frozenset({row.id})
+            entitlements = await db.run_sync(patient_entitlements, user_id)
+
+        return ConsultSnapshot(
+            user_id=user_id,
+            message=message,
+            intent=intent,
+            medicine=row,
+            recent_purchases=recent_purchases,
+            entitlements=entitlements,
+            catalog=catalog,
+            quantity=quantity,
+        )
+
+
+async def prepare(user_id, message, medicine=None, quantity=None, with_intent=True):
+    """
+    Intent (skipped when the caller names the medicine and no agent needs
+    it), then the snapshot. Returns (snapshot, timings in ms).
+    """
+    intent, timings = {}, {}
+
+    if with_intent or not medicine:
+        started = time.perf_counter()
+        try:
+            intent = await asyncio.wait_for(asyncio.to_thread(detect_intent, message), AGENT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            intent = {"error": f"intent detection timed out after {AGENT_TIMEOUT_SECONDS:g}s"}
+        except Exception as e:
+            intent = {"error": f"intent detection failed: {e}"}
+        timings["intent"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    snapshot = await load_snapshot(user_id, message, medicine, quantity, intent)
+    timings["snapshot"] = (time.perf_counter() - started) * 1000
+
+    return snapshot, timings
+
+
+# =========================
+# AGENTS
+# =========================
+# Each returns {"result": text for the chat UI, "data": structured details}
+
+def pharmacist_agent(snapshot: ConsultSnapshot) -> dict:
+    intent = snapshot.intent
+
+    if "error" in intent:
+        raise RuntimeError(intent["error"])
+
+    if intent.get("intent") == "recommend" and intent.get("symptom"):
+        recommendations = rank_for_symptom(snapshot.catalog, intent["symptom"])
+
+        if not recommendations:
+            text = f"No matching OTC products found for '{intent['symptom']}'. Please consult a physician."
+        else:
+            text = "Recommendation:\n" + "\n".join(
+                f"- {r['name']} (${r['price']:.2f}): {r['reason']}" for r in recommendations
+            )
+
+        return {"result": text, "data": {"intent": intent, "recommendations": recommendations}}
+
+    if intent.get("intent") == "emergency":
+        return {
+            "result": "🚨 This sounds like a medical emergency. Please go to the nearest hospital immediately.",
+            "data": {"intent": intent}
+        }
+
+    medicine = snapshot.medicine
+
+    if medicine is None:
+        return {"result": "Please describe your symptom or the medicine you need.", "data": {"intent": intent}}
+
+    text = (
+        f"Medicine: {medicine.name}\n"
+        f"OTC availability: {'No — prescription required' if medicine.prescription_required else 'Yes — no prescription required'}"
+    )
+    if medicine.description:
+        text += f"\nAbout: {medicine.description[:200]}"
+
+    return {"result": text, "data": {"intent": intent, "medicine_id": medicine.id}}
+
+
+def safety_agent(snapshot: ConsultSnapshot) -> dict:
+    """
+    The order flow's safety_verdict, over the snapshot's purchases and entitlements.
+    """
+    medicine = snapshot.medicine
+
+    if medicine is None:
+        return {"result": "No specific medicine to check.", "data": {"status": "unknown"}}
+
+    verdict = safety_verdict(medicine, snapshot.recent_purchases, snapshot.entitlements)
+
+    if verdict["status"] == "safe":
+        text = f"Safety status: ✅ CLEAR — {medicine.name} can be dispensed."
+    elif verdict["reason"] == "recent_purchase":
+        text = f"Safety status: ⛔ BLOCKED — {medicine.name} was purchased in the last {RECENT_PURCHASE_DAYS} days."
+    else:
+        text = f"Safety status: ⛔ BLOCKED — {medicine.name} requires an approved prescription."
+
+    return {"result": text, "data": {**verdict, "medicine_id": medicine.id}}
+
+
+def fulfillment_agent(snapshot: ConsultSnapshot) -> dict:
+    """
+    services.stock_status (what check_stock returns) for the snapshot's medicine.
+    """
+    medicine = snapshot.medicine
+
+    if medicine is None:
+        return {"result": "No specific medicine to fulfil.", "data": {"status": "not_found"}}
+
+    quantity = snapshot.quantity or 1
+    status = stock_status(medicine, quantity)
+
+    if status["status"] == "available":
+        text = f"Inventory check: {medicine.name} — IN STOCK ✅ ({medicine.stock} units)"
+    else:
+        text = f"Inventory check: {medicine.name} — only {status['available']} left ❌"
+
+    text += f"\nPrice: ${medicine.price:.2f} × {quantity} = ${medicine.price * quantity:.2f}"
+
+    return {"result": text, "data": {**status, "medicine_id": medicine.id}}
+
+
+AGENTS = {
+    "pharmacist": pharmacist_agent,
+    "safety": safety_agent,
+    "fulfillment": fulfillment_agent,
+}
+
+
+# =========================
+# FAN-OUT
+# =========================
+async def run_agent(name: str, snapshot: ConsultSnapshot, timeout: float = AGENT_TIMEOUT_SECONDS) -> dict:
+    """
+    Run one agent in a worker thread. Errors and timeouts are reported in
+    the result instead of failing the whole consult.
+    """
+    started = time.perf_counter()
+
+    try:
+        outcome = await asyncio.wait_for(asyncio.to_thread(AGENTS[name], snapshot), timeout)
+        outcome["status"] = "ok"
+    except asyncio.TimeoutError:
+        outcome = {"status": "timeout", "result": f"⚠️ {name} agent timed out after {timeout:g}s"}
+    except Exception as e:
+        outcome = {"status": "error", "result": f"⚠️ {name} agent failed: {e}"}
+
+    outcome["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+async def consult(user_id, message, medicine=None, quantity=None) -> dict:
+    """
+    Intent and snapshot once, then all three agents concurrently.
+    Total time ≈ intent + snapshot + the slowest agent.
+    """
+    started = time.perf_counter()
+
+    snapshot, timings = await prepare(user_id, message, medicine, quantity)
+
+    outcomes = await asyncio.gather(*(run_agent(name, snapshot) for name in AGENTS))
+    results = dict(zip(AGENTS, outcomes))
+
+    stage_ms = {**timings, **{name: r["elapsed_ms"] for name, r in results.items()}}
+    for name, ms in stage_ms.items():
+        add_stage(name, ms)
+
+    annotate(
+        intent=snapshot.intent.get("intent"),
+        outcome=results["safety"].get("data", {}).get("status")
+    )
+
+    return {
+        "medicine": snapshot.medicine.name if snapshot.medicine else None,
+        "agents": results,
+        "timings_ms": {
+            **{name: round(ms, 1) for name, ms in stage_ms.items()},
+            "total": round((time.perf_counter() - started) * 1000, 1),
+        }
+    }
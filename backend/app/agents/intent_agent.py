@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 from groq import Groq
 import json
 
+from ..trace_store import add_tokens
+
 load_dotenv()
 
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
@@ -66,6 +68,11 @@ def detect_intent(message: str):
         ],
         temperature=0
     )
+
+    usage = getattr(completion, "usage", None)
+    if usage:
+        add_tokens(prompt=usage.prompt_tokens, completion=usage.completion_tokens)
+
     message_lower = message.lower()
     if any(word in message_lower for word in ["chest pain", "breathing", "bleeding"]):
         return {"intent": "emergency"}
@@ -1,4 +1,5 @@
-from ..services import check_stock
+from ..services import stock_status
 
-def check_inventory(db, medicine, quantity):
-    return check_stock(db, medicine, quantity)
\ No newline at end of file
+def check_order_inventory(order, quantity):
+    # Reads the resolved snapshot — no query
+    return stock_status(order, quantity)
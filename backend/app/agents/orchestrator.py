@@ -1,52 +1,91 @@
 from .intent_agent import detect_intent
-from .safety_agent import run_safety_checks
-from .inventory_agent import check_inventory
-from .action_agent import execute_order
+from .safety_agent import check_order_safety
+from .inventory_agent import check_order_inventory
+from .action_agent import execute_resolved_order
+from .order_context import clean_medicine_text, resolve_order_medicine
 
-from ..services import recommend_from_symptom, fuzzy_match_medicine
+from ..services import recommend_from_symptom, patient_ref
 from ..models import PendingOrder
+from ..database import writer
+from ..trace_store import stage, annotate
+
+
+def _clear_pending_order(db, user_id):
+    db.query(PendingOrder).filter(
+        PendingOrder.patient_id == user_id
+    ).delete(synchronize_session=False)
+
+
+def _save_pending_order(db, user_id, order):
+    _clear_pending_order(db, user_id)
+    db.add(PendingOrder(
+        patient_id=user_id,
+        patient_ref=patient_ref(db, user_id),
+        medicine_name=order.name,
+        medicine_id=order.id
+    ))
+
+
+# =====================================================
+# 🚨 EMERGENCY MATCHER (also used by /chat before admission)
+# =====================================================
+RED_FLAGS = [
+    "chest pain",
+    "breathing difficulty",
+    "can't breathe",
+    "severe bleeding",
+    "unconscious",
+    "heart attack",
+    "stroke"
+]
+
+
+def emergency_flag(message):
+    lowered = (message or "").lower()
+    return next((flag for flag in RED_FLAGS if flag in lowered), None)
+
+
+def emergency_response(flagged):
+    annotate(intent="emergency", outcome="emergency", emergency=flagged)
+    return {
+        "message": "🚨 This sounds like a medical emergency. Please go to the nearest hospital immediately.",
+        "trace": ["Emergency mode triggered"]
+    }
 
 
 def run_pharmacy_agent(db, user_id, message):
 
     trace = []
 
+    # Medicine id already known (pending order) — skips the name lookup
+    medicine_id = None
+
     # =====================================================
     # 🚨 1️⃣ EMERGENCY DETECTION
     # =====================================================
-    RED_FLAGS = [
-        "chest pain",
-        "breathing difficulty",
-        "can't breathe",
-        "severe bleeding",
-        "unconscious",
-        "heart attack",
-        "stroke"
-    ]
-
-    if any(flag in message.lower() for flag in RED_FLAGS):
-        return {
-            "message": "🚨 This sounds like a medical emergency. Please go to the nearest hospital immediately.",
-            "trace": ["Emergency mode triggered"]
-        }
+    flagged = emergency_flag(message)
+
+    if flagged:
+        return emergency_response(flagged)
 
     # =====================================================
     # 🔁 2️⃣ CONTINUE PENDING ORDER (MULTI-TURN SUPPORT)
     # =====================================================
-    pending = db.query(PendingOrder).filter(
-        PendingOrder.patient_id == user_id
-    ).first()
+    with stage("pending_lookup"):
+        pending = db.query(PendingOrder).filter(
+            PendingOrder.patient_id == user_id
+        ).first()
 
     if pending and message.strip().isdigit():
 
         quantity = int(message.strip())
         medicine = pending.medicine_name
+        medicine_id = pending.medicine_id
 
         trace.append("Continuing pending order")
 
         # Clear pending state
-        db.delete(pending)
-        db.commit()
+        writer.run(_clear_pending_order, user_id)
 
         data = {
             "intent": "order",
@@ -59,9 +98,12 @@ def run_pharmacy_agent(db, user_id, message):
         # =====================================================
         # 🤖 3️⃣ INTENT DETECTION
         # =====================================================
-        data = detect_intent(message)
+        with stage("intent"):
+            data = detect_intent(message)
         trace.append(f"Intent detected: {data}")
 
+    annotate(intent=data.get("intent"))
+
     # =====================================================
     # 🩺 4️⃣ RECOMMEND FLOW
     # =====================================================
@@ -70,12 +112,16 @@ def run_pharmacy_agent(db, user_id, message):
         symptom = data.get("symptom")
 
         if not symptom:
+            annotate(outcome="clarify")
             return {
                 "message": "Please describe your symptom clearly.",
                 "trace": trace
             }
 
-        recommendations = recommend_from_symptom(db, symptom)
+        with stage("recommend"):
+            recommendations = recommend_from_symptom(db, symptom)
+
+        annotate(outcome="recommended")
 
         return {
             "message": f"Based on your symptom '{symptom}', I recommend:",
@@ -96,52 +142,54 @@ def run_pharmacy_agent(db, user_id, message):
     trace.append(f"Medicine extracted from intent: {medicine_input}")
 
     if not medicine_input:
+        annotate(outcome="clarify")
         return {
             "message": "Please specify the medicine name clearly.",
             "trace": trace
         }
 
-    # Fuzzy match only the medicine name, NOT full sentence
-    import re
+    # Match only the medicine name, NOT the full sentence
+    filtered = clean_medicine_text(medicine_input)
+
+    trace.append(f"Cleaned medicine input: {filtered}")
 
-# Remove numbers
-    cleaned = re.sub(r"\b\d+\b", "", medicine_input)
+    # Resolved once for the whole turn; every stage below reads this snapshot
+    with stage("match"):
+        order = resolve_order_medicine(db, filtered, medicine_id)
 
-# Remove common filler words
-    STOPWORDS = ["i", "need", "want", "give", "me", "please"]
-    tokens = cleaned.lower().split()
-    filtered = " ".join([t for t in tokens if t not in STOPWORDS])
+    if not order:
+        # Unknown name — a close match is only suggested, ordered once the user confirms
+        with stage("suggest"):
+            suggestion = resolve_order_medicine(db, filtered, fuzzy=True)
 
-    trace.append(f"Cleaned medicine input: {filtered}")
+        if suggestion:
+            with stage("save_pending"):
+                writer.run(_save_pending_order, user_id, suggestion)
 
-    medicine = fuzzy_match_medicine(db, filtered)
+            annotate(outcome="suggested")
 
-    if not medicine:
+            return {
+                "message": f"Did you mean {suggestion.name}? Reply with the number of units to order it.",
+                "trace": trace + [f"Fuzzy suggestion: {suggestion.name}", "Pending order saved"]
+            }
+
+        annotate(outcome="not_found")
         return {
             "message": "Medicine not found. Please check spelling.",
             "trace": ["Fuzzy match failed"]
         }
 
-    trace.append(f"Fuzzy matched medicine: {medicine}")
+    medicine = order.name
+    trace.append(f"Matched medicine: {medicine}")
 
     # If quantity missing → ask
     if not quantity:
 
-        existing = db.query(PendingOrder).filter(
-            PendingOrder.patient_id == user_id
-        ).first()
-
-        if existing:
-            db.delete(existing)
-            db.commit()
+        # Replaces any earlier pending order for this user
+        with stage("save_pending"):
+            writer.run(_save_pending_order, user_id, order)
 
-        pending = PendingOrder(
-            patient_id=user_id,
-            medicine_name=medicine
-        )
-
-        db.add(pending)
-        db.commit()
+        annotate(outcome="awaiting_quantity")
 
         return {
             "message": f"How many units of {medicine} would you like?",
@@ -149,27 +197,34 @@ def run_pharmacy_agent(db, user_id, message):
         }
 
     # Stock check
-    inventory = check_inventory(db, medicine, quantity)
+    with stage("inventory"):
+        inventory = check_order_inventory(order, quantity)
     trace.append(f"Stock check: {inventory}")
 
     if inventory["status"] != "available":
+        annotate(outcome="out_of_stock")
         return {
             "message": f"{medicine} is out of stock.",
             "trace": trace
         }
 
     # Safety check
-    safety = run_safety_checks(db, user_id, medicine)
+    with stage("safety"):
+        safety = check_order_safety(db, user_id, order)
     trace.append(f"Safety check: {safety}")
 
     if safety["status"] == "blocked":
+        annotate(outcome="blocked")
         return {
             "message": safety.get("message", "Order blocked due to safety policy."),
             "trace": trace
         }
 
     # Execute
-    result = execute_order(db, user_id, medicine, quantity, dosage)
+    with stage("order"):
+        result = execute_resolved_order(db, user_id, order, quantity, dosage)
+
+    annotate(outcome="order_placed")
 
     return {
         "message": f"Order placed successfully for {medicine}.",
@@ -0,0 +1,73 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+
+from ..medicine_index import index
+from ..models import Medicine
+
+
+# =========================
+# MEDICINE TEXT
+# =========================
+STOPWORDS = {"i", "need", "want", "give", "me", "please"}
+
+# Bare numbers are quantities; numbers with a unit ("400 mg", "0,1 %") are strengths and stay
+_QUANTITY = re.compile(
+    r"(?<![\w.,])\d+(?:[.,]\d+)?(?![\w]|[.,]\d|\s*(?:%|(?:mg|mcg|µg|ug|g|ml|iu|i\.?\s?e)\b))",
+    re.IGNORECASE
+)
+
+
+def clean_medicine_text(text: str) -> str:
+    """ "I need 2 Ibuprofen 400 mg please" → "ibuprofen 400 mg" """
+    cleaned = _QUANTITY.sub("", text or "")
+    return " ".join(t for t in cleaned.lower().split() if t not in STOPWORDS)
+
+
+# =========================
+# PER-REQUEST MEDICINE
+# =========================
+@dataclass(frozen=True)
+class OrderMedicine:
+    """
+    The medicine one order turn is about, resolved once (alias index +
+    one primary-key read) and passed to the stock, safety and order
+    stages so none of them looks it up again.
+    """
+    id: int
+    name: str
+    stock: int
+    prescription_required: bool
+
+    @classmethod
+    def from_row(cls, row) -> "OrderMedicine":
+        # A Medicine instance or a selected row with the same column names
+        return cls(
+            id=row.id,
+            name=row.name,
+            stock=row.stock or 0,
+            prescription_required=bool(row.prescription_required),
+        )
+
+
+def resolve_order_medicine(db, text: Optional[str] = None, medicine_id: Optional[int] = None,
+                           fuzzy: bool = False) -> Optional[OrderMedicine]:
+    """
+    Free text (or a known id, e.g. from a pending order) → OrderMedicine.
+    The alias index answers from memory; the row snapshot is one SELECT.
+    `fuzzy` is for suggestions only — never order a fuzzy match unconfirmed.
+    """
+    if medicine_id is None:
+        medicine_id = index.lookup(db, text, fuzzy=fuzzy)
+
+    if medicine_id is None:
+        return None
+
+    row = db.execute(
+        select(Medicine.id, Medicine.name, Medicine.stock, Medicine.prescription_required)
+        .where(Medicine.id == medicine_id)
+    ).first()
+
+    return OrderMedicine.from_row(row) if row is not None else None
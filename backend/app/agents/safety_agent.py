@@ -1,22 +1,34 @@
-from ..services import check_recent_purchase, check_prescription
-from ..models import Prescription
+from ..services import has_recent_purchase
+from ..entitlements import patient_entitlements
 
-def run_safety_checks(db, user_id, medicine):
 
+def safety_verdict(medicine, recent_purchases, entitlements) -> dict:
+    """
+    The order safety rules, with no I/O. `medicine` has .id and
+    .prescription_required; `recent_purchases` and `entitlements` are
+    collections of medicine ids (entitlements are only consulted for
+    prescription medicines). Shared by the order flow and /agents/*.
+    """
     # Overdose check
-    if check_recent_purchase(db, user_id, medicine):
+    if medicine.id in recent_purchases:
         return {"status": "blocked", "reason": "recent_purchase"}
 
     # Prescription check
-    prescription_required = check_prescription(db, medicine)
+    if medicine.prescription_required and medicine.id not in entitlements:
+        return {"status": "blocked", "reason": "prescription_required"}
 
-    if prescription_required.get("prescription_required"):
-        existing = db.query(Prescription).filter(
-            Prescription.patient_id == user_id,
-            Prescription.medicine_name.ilike(f"%{medicine}%")
-        ).first()
+    return {"status": "safe"}
 
-        if not existing:
-            return {"status": "blocked", "reason": "prescription_required"}
 
-    return {"status": "safe"}
\ No newline at end of file
+def check_order_safety(db, user_id, order):
+    """
+    safety_verdict for an already resolved OrderMedicine: one indexed query
+    for the recent-purchase check, the patient's cached entitlements only
+    for prescription medicines.
+    """
+    recent = {order.id} if has_recent_purchase(db, user_id, order.id) else ()
+
+    needs_entitlements = order.prescription_required and not recent
+    entitlements = patient_entitlements(db, user_id) if needs_entitlements else ()
+
+    return safety_verdict(order, recent, entitlements)
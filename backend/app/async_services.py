@@ -0,0 +1,126 @@
+# Async counterparts of services.py for the async routes.
+# Reads run on the async engine; writes are awaited on the single writer
+# thread so they still group-commit with the sync code paths.
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import ReadSessionLocal, writer
+from .medicine_index import index
+from .models import Medicine, Order, Patient
+from .services import RECENT_PURCHASE_DAYS, _place_order_tx, notify_warehouse, stock_status
+
+
+# =========================
+# RESOLVE / SEARCH
+# =========================
+def _lookup(medicine_name: str):
+    # Sync read session — only touched if the index still has to be loaded
+    with ReadSessionLocal() as db:
+        return index.lookup(db, medicine_name, fuzzy=False)
+
+
+async def resolve_medicine(db: AsyncSession, medicine_name: str):
+    # Remembered per session, so the checks below can each take the name:
+    # after the first call a repeat costs a dict hit and an identity-map get
+    resolved = db.info.setdefault("resolved_medicines", {})
+
+    if medicine_name not in resolved:
+        # Index load and matching are CPU-bound — worker thread, not the event loop
+        resolved[medicine_name] = await asyncio.to_thread(_lookup, medicine_name)
+
+    medicine_id = resolved[medicine_name]
+    return await db.get(Medicine, medicine_id) if medicine_id is not None else None
+
+
+async def search_medicines(db: AsyncSession, query: str, limit: int = 5):
+    result = await db.scalars(
+        select(Medicine).where(
+            or_(
+                Medicine.name.ilike(f"%{query}%"),
+                Medicine.description.ilike(f"%{query}%")
+            )
+        ).limit(limit)
+    )
+    return result.all()
+
+
+# =========================
+# CHECK STOCK
+# =========================
+async def check_stock(db: AsyncSession, medicine_name: str, quantity: int):
+    return stock_status(await resolve_medicine(db, medicine_name), quantity)
+
+
+# =========================
+# CHECK PRESCRIPTION
+# =========================
+async def check_prescription(db: AsyncSession, medicine_name: str):
+    product = await resolve_medicine(db, medicine_name)
+
+    if not product:
+        return {"status": "not_found"}
+
+    return {
+        "prescription_required": product.prescription_required,
+        "medicine_id": product.id
+    }
+
+
+# =========================
+# RECENT PURCHASE
+# =========================
+async def has_recent_purchase(db: AsyncSession, user_id: str, medicine_id: int):
+    since = datetime.utcnow() - timedelta(days=RECENT_PURCHASE_DAYS)
+
+    # Same indexed range as services.has_recent_purchase
+    recent_order = await db.scalar(
+        select(Order.id)
+        .join(Patient, Order.patient_ref == Patient.id)
+        .where(
+            Patient.external_id == user_id,
+            Order.medicine_id == medicine_id,
+            Order.purchase_date >= since
+        ).limit(1)
+    )
+
+    return recent_order is not None
+
+
+async def check_recent_purchase(db: AsyncSession, user_id: str, medicine_name: str):
+    product = await resolve_medicine(db, medicine_name)
+
+    if not product:
+        return False
+
+    return await has_recent_purchase(db, user_id, product.id)
+
+
+# =========================
+# PLACE ORDER
+# =========================
+async def place_order(patient_id: str, medicine_name: str, quantity: int, dosage_frequency: float):
+    product_name = await writer.run_async(
+        _place_order_tx, patient_id, medicine_name, quantity, dosage_frequency
+    )
+
+    if not product_name:
+        return {"status": "not_found"}
+
+    # requests is blocking → keep the webhook off the event loop
+    await asyncio.to_thread(notify_warehouse, patient_id, product_name, quantity)
+
+    return {
+        "status": "order_placed",
+        "product": product_name
+    }
+
+
+# =========================
+# REFILL PREDICTION
+# =========================
+async def predict_refill(db: AsyncSession, user_id: str):
+    return {"alert": "You are running low on Vitamin D. Reorder?"}
@@ -0,0 +1,114 @@
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from .database import writer
+from .models import Medicine, MedicineTombstone
+
+
+# =========================
+# CONFIG
+# =========================
+# A change to any of these moves the product into the next catalog version
+TRACKED_FIELDS = ("name", "price", "stock", "package_size", "description", "prescription_required")
+
+
+# =========================
+# VERSIONING
+# =========================
+def _changed(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[f].history.has_changes() for f in TRACKED_FIELDS)
+
+
+def _latest_version():
+    # Deletions count too: a tombstone can hold the newest version.
+    # Both columns are indexed → two index lookups.
+    return select(func.max(
+        select(func.coalesce(func.max(Medicine.version), 0)).scalar_subquery(),
+        select(func.coalesce(func.max(MedicineTombstone.version), 0)).scalar_subquery(),
+    ))
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_version(session, flush_context, instances):
+    """
+    Every flush that adds, changes or deletes products stamps them with the
+    latest version + 1; deleted ones leave a tombstone at that version.
+    Writes are serialised (single writer / BEGIN IMMEDIATE), so versions only grow.
+    """
+    changed = [
+        obj for obj in (*session.new, *session.dirty)
+        if isinstance(obj, Medicine) and (obj in session.new or _changed(obj))
+    ]
+    deleted = [
+        obj.id for obj in session.deleted
+        if isinstance(obj, Medicine) and obj.id is not None
+    ]
+
+    if not changed and not deleted:
+        return
+
+    with session.no_autoflush:
+        version = session.scalar(_latest_version()) + 1
+
+        for medicine_id in deleted:
+            session.merge(MedicineTombstone(medicine_id=medicine_id, version=version))
+
+    for obj in changed:
+        obj.version = version
+
+
+async def current_version(db) -> int:
+    return await db.scalar(_latest_version())
+
+
+def _backfill_tx(db: Session):
+    # Rows from before the version column, or inserted outside the ORM
+    version = db.scalar(_latest_version()) + 1
+
+    return db.execute(
+        update(Medicine).where(Medicine.version == 0).values(version=version)
+    ).rowcount
+
+
+def backfill():
+    """
+    Stamp unversioned products (version 0) with the next catalog version,
+    so a mirror syncing with ?since=0 receives them. Safe to run on every startup.
+    """
+    return writer.run(_backfill_tx)
+
+
+# =========================
+# CONDITIONAL GET
+# =========================
+def etag_for(version: int, request: Request) -> str:
+    """
+    Version + query string, so different pages / fields / searches never share a tag.
+    """
+    variant = hashlib.sha1(str(request.url.query).encode()).hexdigest()[:12]
+    return f'"v{version}-{variant}"'
+
+
+def not_modified(request: Request, etag: str):
+    """
+    304 response if the client's If-None-Match already has `etag`, else None.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+
+    tags = {t.strip() for t in header.split(",")}
+    if etag in tags or f"W/{etag}" in tags or "*" in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return None
+
+
+def tag(response: Response, version: int, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["X-Catalog-Version"] = str(version)
+    return response
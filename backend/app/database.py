@@ -1,11 +1,129 @@
-from sqlalchemy import create_engine
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./pharmacy.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./pharmacy.db")
+
+
+def to_async_url(url: str) -> str:
+    """
+    Sync URL → async driver URL (aiosqlite for SQLite, asyncpg for Postgres).
+    """
+    for prefix, async_prefix in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+CONNECT_ARGS = {"check_same_thread": False} if IS_SQLITE else {}
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",       # readers never block the writer (and vice versa)
+    "synchronous": "NORMAL",     # safe with WAL, fsync only at checkpoints
+    "mmap_size": 268435456,      # 256 MB memory-mapped reads
+    "cache_size": -65536,        # 64 MB page cache per connection
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+READ_POOL_SIZE = 8
+ASYNC_POOL_SIZE = 20
+
+# Group commit: the writer waits this long for more jobs before committing a batch
+WRITE_BATCH_SIZE = 64
+WRITE_BATCH_WAIT = 0.002
+
+
+def configure_sqlite(engine, read_only: bool = False, immediate: bool = False):
+    """
+    Apply SQLITE_PRAGMAS on connect.
+
+    read_only  → PRAGMA query_only, so a stray write fails loudly
+    immediate  → transactions start with BEGIN IMMEDIATE and SAVEPOINTs work
+                 (pysqlite's own transaction handling breaks both)
+
+    No-op for other databases.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _):
+        if immediate:
+            dbapi_conn.isolation_level = None
+
+        cursor = dbapi_conn.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    if immediate:
+        @event.listens_for(engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+# General purpose engine — startup import, migrations, mixed read paths
+engine = configure_sqlite(
+    create_engine(DATABASE_URL, connect_args=CONNECT_ARGS)
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Pool of read-only connections for read-only endpoints
+read_engine = configure_sqlite(
+    create_engine(
+        DATABASE_URL,
+        connect_args=CONNECT_ARGS,
+        pool_size=READ_POOL_SIZE,
+        max_overflow=READ_POOL_SIZE
+    ),
+    read_only=True
+)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+# Single connection owned by the writer thread
+write_engine = configure_sqlite(
+    create_engine(
+        DATABASE_URL,
+        connect_args=CONNECT_ARGS,
+        pool_size=1,
+        max_overflow=0
+    ),
+    immediate=True
+)
+# expire_on_commit=False: rows returned by a job stay readable after the batch commits
+WriteSessionLocal = sessionmaker(
+    bind=write_engine, autoflush=False, autocommit=False, expire_on_commit=False
+)
+
+# Async read engine for the async routes. Writes still go through `writer`.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=ASYNC_POOL_SIZE,
+    max_overflow=ASYNC_POOL_SIZE
+)
+configure_sqlite(async_engine.sync_engine, read_only=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -13,4 +131,156 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# =========================
+# SINGLE-WRITER QUEUE
+# =========================
+class WriteQueue:
+    """
+    All writes go through one thread that owns the write connection.
+
+    A job is fn(session, *args). Jobs waiting in the queue are run back to
+    back in one transaction and committed together (group commit), each in
+    its own SAVEPOINT so a failing job is rolled back without touching the
+    rest of the batch. Jobs must not commit themselves; flush() is fine.
+    """
+
+    def __init__(self, session_factory, batch_size=WRITE_BATCH_SIZE, batch_wait=WRITE_BATCH_WAIT):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily so importing this module never spawns threads
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._loop, name="sqlite-writer", daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def run(self, fn, *args):
+        """
+        Blocking submit — returns fn's result once its batch is committed.
+        """
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            batch = [job]
+            deadline = time.monotonic() + self._batch_wait
+
+            while len(batch) < self._batch_size:
+                try:
+                    job = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._queue.put(None)
+                    break
+                batch.append(job)
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        session = self._session_factory()
+        outcomes = []
+
+        try:
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                savepoint = session.begin_nested()
+                try:
+                    result = fn(session, *args)
+                    savepoint.commit()
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    savepoint.rollback()
+                    outcomes.append((future, None, e))
+
+            session.commit()
+
+        except Exception as e:
+            session.rollback()
+            outcomes = [(future, None, e) for _, _, future in batch if not future.cancelled()]
+
+        finally:
+            session.close()
+
+        # Only report success once the whole batch is durable
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+writer = WriteQueue(WriteSessionLocal)
+
+
+def add_missing_columns():
+    """
+    create_all() never alters tables that already exist.
+    Add any model columns (and their indexes) missing from an older pharmacy.db.
+    """
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = column.type.compile(engine.dialect)
+                    if column.server_default is not None:
+                        # Existing rows get the default instead of NULL
+                        ddl += f" DEFAULT {column.server_default.arg}"
+                        if not column.nullable:
+                            ddl += " NOT NULL"
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}"))
+
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,133 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .models import Prescription, PrescriptionEntitlement
+from .services import resolve_medicine
+from .database import writer
+
+
+# =========================
+# CONFIG
+# =========================
+PRESCRIPTION_VALID_DAYS = 180
+
+# Upper bound on staleness when several server processes share one DB —
+# invalidation below only reaches the process that handled the upload
+CACHE_TTL_SECONDS = 60
+
+# patient_id → (frozenset of medicine ids, monotonic deadline)
+_cache = {}
+_lock = threading.Lock()
+
+
+def invalidate(patient_id: str):
+    with _lock:
+        _cache.pop(patient_id, None)
+
+
+# =========================
+# GRANT / REVOKE
+# =========================
+def grant(db: Session, prescription: Prescription):
+    """
+    Resolve the prescription's medicine to its canonical id and
+    record the entitlement. Runs as (part of) a writer job — call
+    invalidate() once the job has committed.
+    """
+    if prescription.medicine_id is None:
+        medicine = resolve_medicine(db, prescription.medicine_name or "")
+        if not medicine:
+            return None
+        prescription.medicine_id = medicine.id
+
+    if prescription.id is None:
+        db.flush()
+
+    uploaded_at = prescription.uploaded_at or datetime.utcnow()
+
+    entitlement = PrescriptionEntitlement(
+        patient_id=prescription.patient_id,
+        medicine_id=prescription.medicine_id,
+        prescription_id=prescription.id,
+        expires_at=uploaded_at + timedelta(days=PRESCRIPTION_VALID_DAYS)
+    )
+    db.add(entitlement)
+    return entitlement
+
+
+def revoke(db: Session, prescription: Prescription):
+    """
+    Drop entitlements backed by a prescription (e.g. rejected by the pipeline).
+    Writer job, like grant() — invalidate() after it commits.
+    """
+    db.query(PrescriptionEntitlement).filter(
+        PrescriptionEntitlement.prescription_id == prescription.id
+    ).delete(synchronize_session=False)
+
+
+def _backfill_tx(db: Session):
+    pending = db.query(Prescription).filter(
+        Prescription.medicine_id.is_(None),
+        or_(Prescription.status.is_(None), Prescription.status != "rejected")
+    ).all()
+
+    return sum(1 for p in pending if grant(db, p) is not None)
+
+
+def backfill():
+    """
+    Grant entitlements for prescriptions stored before medicine ids were resolved.
+    """
+    granted = writer.run(_backfill_tx)
+
+    with _lock:
+        _cache.clear()
+
+    return granted
+
+
+# =========================
+# LOOKUP
+# =========================
+def patient_entitlements(db: Session, patient_id: str) -> frozenset:
+    """
+    Medicine ids the patient currently holds a valid prescription for.
+    Served from memory; reloaded after an upload, a revocation, the
+    earliest expiry, or CACHE_TTL_SECONDS.
+    """
+    now = time.monotonic()
+
+    with _lock:
+        cached = _cache.get(patient_id)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    utc_now = datetime.utcnow()
+
+    rows = db.query(
+        PrescriptionEntitlement.medicine_id,
+        PrescriptionEntitlement.expires_at
+    ).filter(
+        PrescriptionEntitlement.patient_id == patient_id,
+        PrescriptionEntitlement.expires_at > utc_now
+    ).all()
+
+    medicine_ids = frozenset(medicine_id for medicine_id, _ in rows)
+
+    deadline = now + CACHE_TTL_SECONDS
+    if rows:
+        seconds_to_expiry = (min(expires for _, expires in rows) - utc_now).total_seconds()
+        deadline = min(deadline, now + seconds_to_expiry)
+
+    with _lock:
+        _cache[patient_id] = (medicine_ids, deadline)
+
+    return medicine_ids
+
+
+def is_entitled(db: Session, patient_id: str, medicine_id: int) -> bool:
+    return medicine_id in patient_entitlements(db, patient_id)
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .models import Medicine, RefillAlert
+
+
+# =========================
+# CONFIG
+# =========================
+LOW_STOCK_THRESHOLD = 10       # same line as /admin/low-stock and the overview
+SUBSCRIBER_BUFFER = 256        # events held per client before the oldest are dropped
+HEARTBEAT_SECONDS = 15
+
+TOPICS = ("inventory", "refill")
+
+
+# =========================
+# BUS
+# =========================
+class Subscription:
+    """
+    One connected client. Bounded: when the client falls behind, the oldest
+    events are dropped and the next read reports how many were lost.
+    """
+
+    def __init__(self, topics, maxsize=SUBSCRIBER_BUFFER):
+        self.topics = set(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _push(self, item):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    async def get(self, timeout=None):
+        """
+        Next event, a {"type": "lagged"} notice after drops, or None on timeout.
+        """
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"type": "lagged", "dropped": dropped}
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+    In-process pub/sub. publish() may be called from any thread
+    (the writer thread, importers); delivery happens on each subscriber's loop.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics=TOPICS) -> Subscription:
+        subscription = Subscription(topics)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, topic: str, payload: dict):
+        with self._lock:
+            targets = [s for s in self._subscribers if topic in s.topics]
+
+        item = {"topic": topic, **payload}
+
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, item)
+            except RuntimeError:
+                # Loop already closed — client is gone
+                self.unsubscribe(subscription)
+
+
+bus = EventBus()
+
+
+def parse_topics(topics: str):
+    """
+    "inventory,refill" → validated topic list (ValueError on unknown names).
+    """
+    names = [t.strip() for t in topics.split(",") if t.strip()]
+    unknown = [t for t in names if t not in TOPICS]
+
+    if unknown or not names:
+        raise ValueError(f"topics must be a comma separated subset of: {', '.join(TOPICS)}")
+
+    return names
+
+
+# =========================
+# PUBLISHERS
+# =========================
+# Changes are collected on flush and published only once the transaction
+# commits, so rolled-back orders (or failed writer jobs) never reach clients.
+# This covers place_order, finalize_checkout, the importers and the refill scan.
+_PENDING = "pending_events"
+
+
+def _stock_events(medicine: Medicine, is_new: bool):
+    history = inspect(medicine).attrs.stock.history
+
+    if not is_new and not history.deleted:
+        return []
+
+    previous = None if is_new else history.deleted[0]
+    if previous == medicine.stock:
+        return []
+
+    product = {
+        "product_id": medicine.id,
+        "name": medicine.name,
+        "stock": medicine.stock,
+        "version": medicine.version
+    }
+    events = [("inventory", {"type": "stock", "previous": previous, **product})]
+
+    crossed = previous is None or previous >= LOW_STOCK_THRESHOLD
+    if medicine.stock is not None and medicine.stock < LOW_STOCK_THRESHOLD and crossed:
+        events.append(("inventory", {"type": "low_stock", "threshold": LOW_STOCK_THRESHOLD, **product}))
+
+    return events
+
+
+def _refill_event(alert: RefillAlert):
+    return ("refill", {
+        "type": "refill_alert",
+        "patient_id": alert.patient_id,
+        "medicine": alert.medicine_name,
+        "expected_run_out": alert.expected_run_out.strftime("%Y-%m-%d") if alert.expected_run_out else None
+    })
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    events = []
+
+    for obj in session.new:
+        if isinstance(obj, Medicine):
+            events += _stock_events(obj, is_new=True)
+        elif isinstance(obj, RefillAlert):
+            events.append(_refill_event(obj))
+
+    for obj in session.dirty:
+        if isinstance(obj, Medicine):
+            events += _stock_events(obj, is_new=False)
+
+    if events:
+        # Tag with the innermost transaction so a rolled back SAVEPOINT drops its own events
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        session.info.setdefault(_PENDING, []).extend((transaction, e) for e in events)
+
+
+def _inside(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    pending = session.info.get(_PENDING)
+    if pending:
+        session.info[_PENDING] = [
+            (t, e) for t, e in pending if not _inside(t, previous_transaction)
+        ]
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    # Also fires when a SAVEPOINT is released — wait for the outer commit
+    if session.get_nested_transaction() is not None:
+        return
+
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+
+    at = datetime.utcnow().isoformat()
+    for _, (topic, payload) in pending:
+        bus.publish(topic, {**payload, "at": at})
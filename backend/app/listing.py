@@ -0,0 +1,167 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_, or_, DateTime
+
+from .database import AsyncSessionLocal
+
+
+# =========================
+# CONFIG
+# =========================
+MAX_PAGE_SIZE = 1000
+
+# Rows pulled from the DB cursor per chunk when streaming
+STREAM_BATCH_SIZE = 1000
+
+FORMATS = ("json", "ndjson")
+
+
+# =========================
+# FIELDS
+# =========================
+def select_fields(fields: Optional[str], columns: dict, default: list):
+    """
+    "id,name" → requested output names, validated against `columns`.
+    """
+    if not fields:
+        return list(default)
+
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [n for n in names if n not in columns]
+
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(columns)}"
+        )
+
+    return names
+
+
+# =========================
+# CURSORS
+# =========================
+def encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+
+def decode_cursor(cursor: str, order: list):
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(order):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Datetimes travel as ISO strings
+    return [
+        datetime.fromisoformat(v) if isinstance(c.type, DateTime) and v is not None else v
+        for v, (c, _) in zip(values, order)
+    ]
+
+
+def _after(order: list, values: list):
+    """
+    WHERE clause for rows strictly after `values` in `order`.
+    Expanded (a > x OR (a = x AND b > y)) form, so it works on any backend.
+    """
+    clauses = []
+
+    for i, (column, descending) in enumerate(order):
+        equal = [c == v for (c, _), v in zip(order[:i], values[:i])]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+
+    return or_(*clauses)
+
+
+# =========================
+# LIST RESPONSE
+# =========================
+async def list_response(
+    db,
+    *,
+    columns: dict,
+    names: list,
+    order: list,
+    filters=(),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    format: str = "json",
+):
+    """
+    Keyset-paginated, column-projected listing.
+
+    columns  output name → SQL column expression
+    names    output names to return (see select_fields)
+    order    [(column, descending)] — must be unique overall, e.g. end with the id
+
+    With `limit`: one page, next page cursor in the X-Next-Cursor header.
+    Without:      every row, streamed as a JSON array or NDJSON in batches.
+    Rows come straight from Core select() — no ORM entities are built.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    # Sort keys ride along after the requested fields so the next cursor can be built
+    stmt = select(
+        *(columns[n].label(n) for n in names),
+        *(column.label(f"_k{i}") for i, (column, _) in enumerate(order))
+    ).where(*filters).order_by(
+        *(column.desc() if descending else column.asc() for column, descending in order)
+    )
+
+    if cursor:
+        stmt = stmt.where(_after(order, decode_cursor(cursor, order)))
+
+    width = len(names)
+
+    if limit is not None:
+        rows = (await db.execute(stmt.limit(limit + 1))).all()
+
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(list(rows[-1][width:]))
+
+        items = [dict(zip(names, row[:width])) for row in rows]
+
+        if format == "ndjson":
+            body = b"".join(orjson.dumps(item) + b"\n" for item in items)
+            return Response(body, media_type="application/x-ndjson", headers=headers)
+
+        return Response(orjson.dumps(items), media_type="application/json", headers=headers)
+
+    async def stream():
+        # Own session: the request-scoped one may be closed before streaming ends
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+
+            first = True
+            if format == "json":
+                yield b"["
+
+            async for batch in result.partitions():
+                encoded = [orjson.dumps(dict(zip(names, row[:width]))) for row in batch]
+
+                if format == "ndjson":
+                    yield b"\n".join(encoded) + b"\n"
+                else:
+                    yield (b"" if first else b",") + b",".join(encoded)
+
+                first = False
+
+            if format == "json":
+                yield b"]"
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(stream(), media_type=media_type)
@@ -1,18 +1,30 @@
 from fastapi import FastAPI
-from .database import engine, SessionLocal
+from .database import engine, SessionLocal, add_missing_columns, writer
 from .models import Base
 from .routes import router as main_router
 from .admin_routes import router as admin_router
 from .services import import_products_from_excel
+from .storage import UploadSizeLimit
+from . import prescription_pipeline, entitlements, normalize, medicine_index, trace_store, catalog
+from importlib.util import find_spec
 
 app = FastAPI()
 
+# Oversized uploads are refused before the multipart form is parsed
+app.add_middleware(UploadSizeLimit)
+
 # Include routers
 app.include_router(main_router)  # Chat + core routes
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
+# Voice endpoints need openai-whisper (and ffmpeg); the rest of the API runs without it
+if find_spec("whisper"):
+    from .voice_routes import router as voice_router
+    app.include_router(voice_router, tags=["voice"])  # /voice-chat, /voice-stream
+
 # Create tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
 
 @app.get("/")
 def root():
@@ -20,6 +32,25 @@ def root():
 
 @app.on_event("startup")
 def startup_event():
+    # Rollups are replayed from the trace log on the writer threads, not in a request
+    trace_store.store.start()
+    trace_store.frontend_store.start()
+
     db = SessionLocal()
     import_products_from_excel(db)
-    db.close()
\ No newline at end of file
+    medicine_index.backfill()
+    medicine_index.warm()
+    normalize.backfill()
+    catalog.backfill()
+    entitlements.backfill()
+    prescription_pipeline.backfill_phash_bands()
+    prescription_pipeline.requeue_pending(db)
+    db.close()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    prescription_pipeline.shutdown()
+    trace_store.store.close()
+    trace_store.frontend_store.close()
+    writer.stop()
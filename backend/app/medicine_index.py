@@ -0,0 +1,402 @@
+import re
+import threading
+import unicodedata
+
+from rapidfuzz import process
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from .database import ReadSessionLocal, writer
+from .models import Medicine, MedicineAlias
+
+
+# =========================
+# CONFIG
+# =========================
+# Same cut-off the catalog fuzzy match has always used
+FUZZY_THRESHOLD = 75
+
+# Remembered fuzzy matches (query → alias), dropped with the index
+FUZZY_CACHE_SIZE = 1024
+
+# When one alias fits several products: best kind, then shortest name, then lowest id
+KIND_RANK = {"canonical": 0, "stripped": 1, "short": 2, "english": 3, "brand": 4}
+
+# German label words → English (after accent folding)
+ENGLISH = {
+    "tabletten": "tablets",
+    "filmtabletten": "film coated tablets",
+    "schmelztabletten": "orodispersible tablets",
+    "kapseln": "capsules",
+    "hartkapseln": "capsules",
+    "retardkapseln": "extended release capsules",
+    "dragees": "coated tablets",
+    "tropfen": "drops",
+    "augentropfen": "eye drops",
+    "saft": "syrup",
+    "salbe": "ointment",
+    "heilsalbe": "healing ointment",
+    "creme": "cream",
+    "schaum": "foam",
+    "loesung": "solution",
+    "fluessigkeit": "liquid",
+    "schmerzgel": "pain gel",
+    "magensaftresistente": "gastro resistant",
+    "zuckerfrei": "sugar free",
+    "taeglich": "daily",
+    "kinder": "children",
+    "fuer": "for",
+    "saegepalme": "saw palmetto",
+}
+
+# Brand / German name → generic (INN) names. Both sides become aliases.
+GENERIC = {
+    "paracetamol": ("acetaminophen",),
+    "nurofen": ("ibuprofen",),
+    "bepanthen": ("dexpanthenol", "panthenol"),
+    "panthenol": ("dexpanthenol",),
+    "mucosolvan": ("ambroxol",),
+    "dulcolax": ("bisacodyl",),
+    "cetirizin": ("cetirizine",),
+    "loperamid": ("loperamide",),
+    "diclo": ("diclofenac",),
+    "cromo": ("cromoglicic acid", "cromolyn"),
+    "livocab": ("levocabastine",),
+    "vigantolvit": ("vitamin d3", "cholecalciferol"),
+    "umckaloabo": ("pelargonium",),
+    "fenihydrocort": ("hydrocortisone",),
+    "hyaluron": ("hyaluronic acid",),
+}
+
+
+# =========================
+# CANONICAL FORMS
+# =========================
+_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+# "500 mg", "46,3 mg/g", "0,05 %", "2000 I.E." — groups: amount, unit
+_DOSAGE = re.compile(
+    r"(?<![a-z0-9])(\d+(?:[.,]\d+)?)\s*(mg|mcg|[µμ]g|ug|g|ml|i\.?\s?e\.?|iu|%)(?:\s*/\s*(?:g|ml))?(?![a-z])"
+)
+
+# Spellings of the same unit
+_UNITS = {"mcg": "ug", "µg": "ug", "μg": "ug", "ie": "iu"}
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _fold(text: str) -> str:
+    text = (text or "").lower().translate(_FOLD)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _words(folded: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", folded).split())
+
+
+def canonical(text: str) -> str:
+    """ "Cetirizin HEXAL® Tropfen, 10 mg/ml" → "cetirizin hexal tropfen 10 mg ml" """
+    return _words(_fold(text))
+
+
+def without_dosage(text: str) -> str:
+    """ "Paracetamol apodiscounter 500 mg Tabletten" → "paracetamol apodiscounter tabletten" """
+    return _words(_DOSAGE.sub(" ", _fold(text)))
+
+
+def strengths(text: str) -> frozenset:
+    """ "Ramipril 2,5 mg Tabletten, 100 St" → {"2.5 mg"} """
+    found = set()
+    for amount, unit in _DOSAGE.findall(_fold(text)):
+        unit = unit.replace(".", "").replace(" ", "")
+        found.add(f"{float(amount.replace(',', '.')):g} {_UNITS.get(unit, unit)}")
+    return frozenset(found)
+
+
+def english(alias: str) -> str:
+    return " ".join(ENGLISH.get(word, word) for word in alias.split())
+
+
+def aliases(name: str) -> list:
+    """Every lookup key for one product name, as (alias, kind)."""
+    found = {}
+
+    def add(alias, kind):
+        if alias and alias not in found:
+            found[alias] = kind
+
+    full = canonical(name)
+    stripped = without_dosage(name)
+    short = without_dosage(name.split(",")[0])
+
+    add(full, "canonical")
+    add(stripped, "stripped")
+    add(short, "short")
+
+    for alias in (full, stripped, short):
+        add(english(alias), "english")
+
+    words = stripped.split()
+
+    # Leading word is usually the brand ("nurofen", "norsan", "ramipril")
+    if words and len(words[0]) >= 4 and words[0].isalpha():
+        add(words[0], "brand")
+
+    for word in words:
+        for generic in GENERIC.get(word, ()):
+            add(word, "brand")
+            add(generic, "brand")
+
+    return list(found.items())
+
+
+def _query_keys(text: str):
+    full = canonical(text)
+    yield full
+    stripped = without_dosage(text)
+    if stripped != full:
+        yield stripped
+
+
+# =========================
+# IN-MEMORY INDEX
+# =========================
+class MedicineIndex:
+    """
+    alias → candidate medicine ids (best first), loaded once from
+    medicine_aliases and dropped whenever a commit changes product names.
+    Exact and alias hits are a dict lookup; only misses go to fuzzy matching.
+
+    Dosage-stripped and brand aliases cover every strength of a drug, so a
+    query that names a strength only accepts candidates with that strength —
+    "ibuprofen 400 mg" never resolves to a 600 mg product.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._tables_cache = None
+        self._fuzzy = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._tables_cache = None
+            self._fuzzy = {}
+
+    def _tables(self, db: Session):
+        """(alias → ids, aliases in preference order, id → strengths)"""
+        with self._lock:
+            if self._tables_cache is not None:
+                return self._tables_cache
+            generation = self._generation
+
+        products = {}
+        shared = {}
+        for medicine_id, name, length in db.execute(
+            select(Medicine.id, Medicine.name, func.length(Medicine.canonical_name))
+        ):
+            found = strengths(name or "")
+            # Few distinct strength sets across the catalog — share them
+            products[medicine_id] = (length or 0, shared.setdefault(found, found))
+
+        candidates = {}
+        for alias, medicine_id, kind in db.execute(
+            select(MedicineAlias.alias, MedicineAlias.medicine_id, MedicineAlias.kind)
+        ):
+            if medicine_id in products:
+                rank = (KIND_RANK.get(kind, len(KIND_RANK)), products[medicine_id][0], medicine_id)
+                candidates.setdefault(alias, []).append(rank)
+
+        by_alias = {}
+        for alias, ranks in candidates.items():
+            ranks.sort()
+            by_alias[alias] = tuple(dict.fromkeys(medicine_id for *_, medicine_id in ranks))
+
+        # Preferred aliases first, so fuzzy ties go to them
+        keys = sorted(by_alias, key=lambda alias: candidates[alias][0])
+        by_strength = {medicine_id: found for medicine_id, (_, found) in products.items()}
+
+        tables = by_alias, keys, by_strength
+
+        with self._lock:
+            # A commit during the load made this snapshot stale — use it once, don't keep it
+            if self._generation == generation:
+                self._tables_cache = tables
+
+        return tables
+
+    def load(self, db: Session):
+        """Build the tables now (startup) instead of on the first lookup."""
+        self._tables(db)
+
+    @staticmethod
+    def _pick(ids, wanted: frozenset, by_strength: dict):
+        # Best-ranked candidate that has every strength the query names
+        if not wanted:
+            return ids[0]
+        return next((i for i in ids if wanted <= by_strength.get(i, frozenset())), None)
+
+    def lookup(self, db: Session, text: str, fuzzy: bool = False):
+        """
+        Free text → medicine id (or None). Fuzzy matching is opt-in: it can
+        land on a different product, so it is for suggestions, not orders.
+        """
+        if not text or not text.strip():
+            return None
+
+        by_alias, keys, by_strength = self._tables(db)
+        wanted = strengths(text)
+        known = False
+
+        for key in _query_keys(text):
+            if key in by_alias:
+                known = True
+                medicine_id = self._pick(by_alias[key], wanted, by_strength)
+                if medicine_id is not None:
+                    return medicine_id
+
+        # Known name, but not in the strength asked for — let the caller ask
+        if known or not fuzzy:
+            return None
+
+        return self.fuzzy(db, text)
+
+    def fuzzy(self, db: Session, text: str):
+        query = without_dosage(text)
+
+        with self._lock:
+            generation = self._generation
+            cached = query in self._fuzzy
+            alias = self._fuzzy.get(query)
+
+        by_alias, keys, by_strength = self._tables(db)
+
+        if not cached:
+            match = process.extractOne(query, keys, score_cutoff=FUZZY_THRESHOLD) if query and keys else None
+            alias = match[0] if match else None
+
+            with self._lock:
+                if self._generation == generation:
+                    if len(self._fuzzy) >= FUZZY_CACHE_SIZE:
+                        self._fuzzy.clear()
+                    self._fuzzy[query] = alias
+
+        if alias is None or alias not in by_alias:
+            return None
+
+        return self._pick(by_alias[alias], strengths(text), by_strength)
+
+
+index = MedicineIndex()
+
+
+def warm():
+    """Load the index at startup, so no request pays for it."""
+    with ReadSessionLocal() as db:
+        index.load(db)
+
+
+def resolve(db: Session, text: str, fuzzy: bool = False):
+    """Free text → Medicine row (or None)."""
+    medicine_id = index.lookup(db, text, fuzzy=fuzzy)
+    return db.get(Medicine, medicine_id) if medicine_id is not None else None
+
+
+# =========================
+# KEEPING ALIASES CURRENT
+# =========================
+def _alias_rows(medicines) -> list:
+    return [
+        {"medicine_id": medicine_id, "alias": alias, "kind": kind}
+        for medicine_id, name in medicines
+        for alias, kind in aliases(name or "")
+    ]
+
+
+@event.listens_for(Session, "before_flush")
+def _canonicalize(session, flush_context, instances):
+    """New / renamed products get their canonical name here and their aliases after the flush."""
+    renamed = session.info.setdefault("renamed_medicines", set())
+    removed = session.info.setdefault("removed_medicines", set())
+
+    for obj in (*session.new, *session.dirty):
+        if not isinstance(obj, Medicine):
+            continue
+        if obj in session.new or inspect(obj).attrs.name.history.has_changes():
+            obj.canonical_name = canonical(obj.name)
+            renamed.add(obj)
+
+    for obj in session.deleted:
+        if isinstance(obj, Medicine) and obj.id is not None:
+            removed.add(obj.id)
+
+
+@event.listens_for(Session, "after_flush")
+def _write_aliases(session, flush_context):
+    renamed = session.info.pop("renamed_medicines", set())
+    removed = session.info.pop("removed_medicines", set())
+
+    if not renamed and not removed:
+        return
+
+    connection = session.connection()
+    table = MedicineAlias.__table__
+
+    stale = removed | {obj.id for obj in renamed}
+    connection.execute(delete(table).where(table.c.medicine_id.in_(stale)))
+
+    rows = _alias_rows((obj.id, obj.name) for obj in renamed)
+    if rows:
+        connection.execute(insert(table), rows)
+
+    session.info["catalog_renamed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate(session):
+    if session.info.pop("catalog_renamed", False):
+        index.invalidate()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget(session, previous_transaction):
+    session.info.pop("renamed_medicines", None)
+    session.info.pop("removed_medicines", None)
+
+
+# =========================
+# BACKFILL
+# =========================
+def _backfill_tx(db: Session):
+    missing = db.execute(
+        select(Medicine.id, Medicine.name).where(Medicine.canonical_name.is_(None))
+    ).all()
+
+    if not missing:
+        return 0
+
+    table = Medicine.__table__
+    db.connection().execute(
+        update(table).where(table.c.id == bindparam("_id")).values(canonical_name=bindparam("canonical")),
+        [{"_id": medicine_id, "canonical": canonical(name)} for medicine_id, name in missing]
+    )
+
+    ids = [medicine_id for medicine_id, _ in missing]
+    db.execute(delete(MedicineAlias).where(MedicineAlias.medicine_id.in_(ids)))
+
+    rows = _alias_rows(missing)
+    if rows:
+        db.execute(insert(MedicineAlias), rows)
+
+    db.info["catalog_renamed"] = True
+    return len(missing)
+
+
+def backfill():
+    """
+    Canonical names and aliases for products stored before they existed.
+    New and renamed products are handled on flush; safe to run on every startup.
+    """
+    return writer.run(_backfill_tx)
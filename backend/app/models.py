@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index
 from datetime import datetime
 from .database import Base
 
@@ -12,33 +12,97 @@ class Medicine(Base):
     package_size = Column(String)
     description = Column(String)
 
-    stock = Column(Integer, default=0)
+    stock = Column(Integer, default=0, index=True)  # admin dashboard: lowest stock first
     prescription_required = Column(Boolean, default=False)
 
+    # Catalog version of the last change to this row (see catalog.py)
+    version = Column(Integer, default=0, server_default="0", nullable=False, index=True)
+
+    # Lowercased, accent-folded, punctuation-free name (see medicine_index.py)
+    canonical_name = Column(String, index=True)
+
+
+class MedicineTombstone(Base):
+    """
+    A deleted product and the catalog version that deleted it, so
+    /products/changes can tell mirrors which ids to drop.
+    """
+    __tablename__ = "medicine_tombstones"
+
+    medicine_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+
+
+class MedicineAlias(Base):
+    """
+    Canonical lookup keys for a product: its full name, dosage-stripped and
+    short forms, English variants and brand / generic names.
+    Regenerated whenever the product's name changes.
+    """
+    __tablename__ = "medicine_aliases"
+
+    id = Column(Integer, primary_key=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id", ondelete="CASCADE"), nullable=False, index=True)
+    alias = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)      # canonical / stripped / short / english / brand
+
+
+class Patient(Base):
+    """
+    One row per patient. `external_id` is the id the API and the frontend
+    use ("PAT001"); everything else references the integer `id`.
+    """
+    __tablename__ = "patients"
+
+    id = Column(Integer, primary_key=True)
+    external_id = Column(String, unique=True, nullable=False, index=True)
+    age = Column(Integer)
+    gender = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# The string patient_id / product_name / medicine_name columns below are kept
+# for display and API output; lookups and joins go through patient_ref and
+# medicine_id (filled on write, backfilled for older rows by normalize.py).
 
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String)
+    patient_ref = Column(Integer, ForeignKey("patients.id"))
     patient_age = Column(Integer)
     patient_gender = Column(String)
     purchase_date = Column(DateTime, default=datetime.utcnow)
     product_name = Column(String)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"))
     quantity = Column(Integer)
     total_price = Column(Float)
     dosage_frequency = Column(Float)
 
+    __table_args__ = (
+        # Recent-purchase safety check: patient + medicine + date range
+        Index("ix_orders_patient_medicine_date", "patient_ref", "medicine_id", "purchase_date"),
+        # Order history, newest first
+        Index("ix_orders_patient_date", "patient_ref", "purchase_date"),
+    )
+
 
 class RefillAlert(Base):
     __tablename__ = "refill_alerts"
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String)
+    patient_ref = Column(Integer, ForeignKey("patients.id"))
     medicine_name = Column(String)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"))
     expected_run_out = Column(DateTime)
     alert_generated_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_refill_alerts_patient_medicine", "patient_ref", "medicine_id"),
+    )
+
 
 from sqlalchemy import Boolean, DateTime
 from datetime import datetime
@@ -48,10 +112,59 @@ class Prescription(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String)
+    patient_ref = Column(Integer, ForeignKey("patients.id"), index=True)
     medicine_name = Column(String)
-    file_path = Column(String)
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
-    approved = Column(Boolean, default=True)  # mock approval for hackathon
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), index=True)  # resolved at upload
+    file_path = Column(String)              # content-addressed, no extension (see storage.py)
+    file_extension = Column(String)         # as uploaded, e.g. ".jpg"
+    content_type = Column(String)           # as uploaded, e.g. "image/jpeg"
+    content_hash = Column(String, index=True)
+    uploaded_at = Column(DateTime, default=datetime.utcnow, index=True)  # latest uploads first
+    approved = Column(Boolean, default=False)  # set by the processing pipeline
+
+    # Background processing (see prescription_pipeline.py)
+    status = Column(String, default="pending")  # pending | approved | rejected | error
+    review_notes = Column(String)
+    phash = Column(String)
+    thumbnail_path = Column(String)
+    image_metadata = Column(String)  # JSON
+    processed_at = Column(DateTime)
+
+
+class PrescriptionPhashBand(Base):
+    """
+    One row per band of a prescription's dHash (see prescription_pipeline.py).
+    Scans within PHASH_MATCH_DISTANCE bits of each other share at least one
+    band exactly, so the forgery check only compares hashes found here.
+    """
+    __tablename__ = "prescription_phash_bands"
+
+    id = Column(Integer, primary_key=True)
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id", ondelete="CASCADE"), nullable=False, index=True)
+    band = Column(Integer, nullable=False)
+    value = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_phash_bands_band_value", "band", "value"),
+    )
+
+
+class PrescriptionEntitlement(Base):
+    """
+    One row per (patient, medicine) a stored prescription unlocks.
+    Read through entitlements.py, which caches it per patient.
+    """
+    __tablename__ = "prescription_entitlements"
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(String, nullable=False)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_entitlements_patient_medicine", "patient_id", "medicine_id"),
+    )
 
 
 class PendingOrder(Base):
@@ -59,5 +172,7 @@ class PendingOrder(Base):
 
     id = Column(Integer, primary_key=True)
     patient_id = Column(String, unique=True)
+    patient_ref = Column(Integer, ForeignKey("patients.id"), index=True)
     medicine_name = Column(String)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
@@ -0,0 +1,171 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, insert, select, union, update
+from sqlalchemy.orm import Session
+
+from .database import writer
+from .medicine_index import canonical, index
+from .models import Medicine, Order, Patient, PendingOrder, Prescription, RefillAlert
+
+
+# =========================
+# CONFIG
+# =========================
+# (model, free-text patient column, free-text medicine column)
+REFERENCING = [
+    (Order, Order.patient_id, Order.product_name),
+    (RefillAlert, RefillAlert.patient_id, RefillAlert.medicine_name),
+    (Prescription, Prescription.patient_id, Prescription.medicine_name),
+    (PendingOrder, PendingOrder.patient_id, PendingOrder.medicine_name),
+]
+
+# Scratch table for the name → id mapping, so each table is updated in one statement
+_name_map = Table(
+    "medicine_name_map",
+    MetaData(),
+    Column("name", String, primary_key=True),
+    Column("medicine_id", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+# =========================
+# NAME RESOLUTION
+# =========================
+def resolve_names(db: Session, names) -> dict:
+    """
+    Distinct free-text names → medicine ids.
+    Alias index (canonical name, brand, English, dosage-stripped), then the
+    longest canonical name contained in the text, fuzzy match last.
+    Unresolved names are left out.
+    """
+    catalog = db.execute(
+        select(Medicine.id, Medicine.canonical_name).where(Medicine.canonical_name.is_not(None))
+    ).all()
+
+    by_length = sorted(
+        ((name, medicine_id) for medicine_id, name in sorted(catalog) if name),
+        key=lambda item: -len(item[0])
+    )
+    resolved = {}
+
+    for name in names:
+        medicine_id = index.lookup(db, name, fuzzy=False)
+
+        if medicine_id is None:
+            text = canonical(name)
+            medicine_id = next((i for catalog_name, i in by_length if catalog_name in text), None)
+
+        if medicine_id is None:
+            medicine_id = index.fuzzy(db, name)
+
+        if medicine_id is not None:
+            resolved[name] = medicine_id
+
+    return resolved
+
+
+# =========================
+# BACKFILL
+# =========================
+def _backfill_patients(db: Session):
+    # Every patient id seen anywhere becomes a Patient row
+    seen = union(*(
+        select(column.label("external_id")).where(column.is_not(None))
+        for _, column, _ in REFERENCING
+    )).subquery()
+
+    last_id = db.scalar(select(func.max(Patient.id))) or 0
+
+    db.execute(
+        insert(Patient).from_select(
+            ["external_id"],
+            select(seen.c.external_id).where(
+                seen.c.external_id.not_in(select(Patient.external_id))
+            )
+        )
+    )
+
+    updated = 0
+    for model, column, _ in REFERENCING:
+        result = db.execute(
+            update(model)
+            .where(model.patient_ref.is_(None), column.is_not(None))
+            .values(
+                patient_ref=select(Patient.id)
+                .where(Patient.external_id == column)
+                .scalar_subquery()
+            )
+        )
+        updated += result.rowcount
+
+    # New patients take age / gender from their latest order (ix_orders_patient_date)
+    for attribute, column in ((Patient.age, Order.patient_age), (Patient.gender, Order.patient_gender)):
+        latest = select(column).where(
+            Order.patient_ref == Patient.id,
+            column.is_not(None)
+        ).order_by(Order.purchase_date.desc()).limit(1).scalar_subquery()
+
+        db.execute(
+            update(Patient)
+            .where(Patient.id > last_id, attribute.is_(None))
+            .values({attribute.key: latest})
+        )
+
+    return updated
+
+
+def _backfill_medicines(db: Session):
+    unresolved = set()
+    for model, _, column in REFERENCING:
+        unresolved.update(db.scalars(
+            select(column).where(model.medicine_id.is_(None), column.is_not(None)).distinct()
+        ))
+
+    if not unresolved:
+        return 0
+
+    resolved = resolve_names(db, unresolved)
+
+    if not resolved:
+        return 0
+
+    connection = db.connection()
+    _name_map.create(connection, checkfirst=True)
+
+    try:
+        connection.execute(
+            insert(_name_map),
+            [{"name": name, "medicine_id": medicine_id} for name, medicine_id in resolved.items()]
+        )
+
+        updated = 0
+        for model, _, column in REFERENCING:
+            result = db.execute(
+                update(model)
+                .where(model.medicine_id.is_(None), column.in_(select(_name_map.c.name)))
+                .values(
+                    medicine_id=select(_name_map.c.medicine_id)
+                    .where(_name_map.c.name == column)
+                    .scalar_subquery()
+                )
+            )
+            updated += result.rowcount
+
+        return updated
+    finally:
+        _name_map.drop(connection)
+
+
+def _backfill_tx(db: Session):
+    return {
+        "patients": _backfill_patients(db),
+        "medicines": _backfill_medicines(db),
+    }
+
+
+def backfill():
+    """
+    Fill patient_ref / medicine_id on rows written before they existed.
+    Set-based: one INSERT for new patients, one UPDATE per table and column,
+    names resolved once per distinct value. Safe to run on every startup.
+    """
+    return writer.run(_backfill_tx)
@@ -0,0 +1,383 @@
+import importlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ExifTags
+
+from .storage import sharded_path
+
+
+# =========================
+# CONFIG
+# =========================
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_DIR = "thumbnails"
+
+MIN_IMAGE_SIDE = 300          # smaller than this is unreadable as a prescription
+ALLOWED_FORMATS = {"PNG", "JPEG", "PDF"}
+
+# dHash distance at or below which two scans are treated as the same document
+PHASH_MATCH_DISTANCE = 6
+
+# The 64-bit dHash is indexed in one more band than that distance: hashes
+# that close differ in at most PHASH_MATCH_DISTANCE bands, so one is equal
+PHASH_BITS = 64
+PHASH_BANDS = PHASH_MATCH_DISTANCE + 1
+
+EDITING_SOFTWARE = ("photoshop", "gimp", "pixelmator", "affinity", "canva")
+
+# Comma separated modules imported in every worker — they register
+# extra validators or an OCR hook through the functions below
+PLUGIN_MODULES = os.getenv("PRESCRIPTION_PLUGINS", "")
+
+_executor = None
+
+
+# =========================
+# PLUGGABLE VALIDATORS
+# =========================
+VALIDATORS = []
+_ocr_hook = None
+
+
+def register_validator(fn):
+    """
+    Decorator. fn(info: dict) -> rejection reason string, or None if fine.
+    Must run at import time so the worker processes see it.
+    """
+    VALIDATORS.append(fn)
+    return fn
+
+
+def set_ocr_hook(fn):
+    """
+    fn(file_path) -> extracted text. Result is passed to validators as info["ocr_text"].
+    """
+    global _ocr_hook
+    _ocr_hook = fn
+
+
+@register_validator
+def check_format(info):
+    if info["format"] not in ALLOWED_FORMATS:
+        return f"Unsupported file format: {info['format']}"
+    return None
+
+
+@register_validator
+def check_resolution(info):
+    width, height = info.get("width"), info.get("height")
+    if width and height and min(width, height) < MIN_IMAGE_SIDE:
+        return f"Image resolution too low ({width}x{height})"
+    return None
+
+
+@register_validator
+def check_editing_software(info):
+    software = (info.get("exif", {}).get("Software") or "").lower()
+    if any(editor in software for editor in EDITING_SOFTWARE):
+        return f"Image was edited with {info['exif']['Software']}"
+    return None
+
+
+@register_validator
+def check_ocr_mentions_medicine(info):
+    text = info.get("ocr_text")
+    if text is None:
+        return None
+
+    words = [w for w in info["medicine_name"].lower().split() if len(w) > 2]
+    if words and not any(w in text.lower() for w in words):
+        return f"{info['medicine_name']} not found on the prescription"
+    return None
+
+
+for _module in filter(None, (m.strip() for m in PLUGIN_MODULES.split(","))):
+    importlib.import_module(_module)
+
+
+# =========================
+# IMAGE ANALYSIS (runs in worker processes)
+# =========================
+def difference_hash(image) -> str:
+    """
+    64-bit dHash as 16 hex chars. Robust to rescaling and recompression,
+    so re-photographed or lightly edited copies land a few bits apart.
+    """
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+
+def _exif(image):
+    try:
+        raw = image.getexif()
+    except Exception:
+        return {}
+
+    wanted = {"Software", "DateTime", "Make", "Model"}
+    return {
+        ExifTags.TAGS.get(tag, str(tag)): str(value)
+        for tag, value in raw.items()
+        if ExifTags.TAGS.get(tag) in wanted
+    }
+
+
+def analyze_file(file_path: str, content_hash: str, medicine_name: str) -> dict:
+    """
+    Everything CPU heavy for one prescription: metadata, thumbnail,
+    perceptual hash and validators. Returns a plain dict (picklable).
+    """
+    info = {"medicine_name": medicine_name, "file_path": file_path}
+
+    with open(file_path, "rb") as f:
+        head = f.read(5)
+
+    if head == b"%PDF-":
+        info.update(format="PDF", size_bytes=os.path.getsize(file_path))
+    else:
+        try:
+            with Image.open(file_path) as image:
+                image.load()
+
+                info.update(
+                    format=image.format,
+                    width=image.width,
+                    height=image.height,
+                    mode=image.mode,
+                    exif=_exif(image),
+                    size_bytes=os.path.getsize(file_path),
+                )
+
+                info["phash"] = difference_hash(image)
+
+                thumb = image.convert("RGB")
+                thumb.thumbnail(THUMBNAIL_SIZE)
+                thumb_path = sharded_path(content_hash, ".jpg", subdir=THUMBNAIL_DIR)
+                os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+                thumb.save(thumb_path, "JPEG", quality=80)
+                info["thumbnail_path"] = thumb_path
+
+        except (OSError, Image.DecompressionBombError):
+            info["format"] = "UNKNOWN"
+
+    if _ocr_hook is not None:
+        info["ocr_text"] = _ocr_hook(file_path)
+
+    info["problems"] = [reason for reason in (v(info) for v in VALIDATORS) if reason]
+
+    return info
+
+
+# =========================
+# RESULT HANDLING (main process)
+# =========================
+def _hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def phash_bands(phash: str) -> list:
+    """
+    (band, value) pairs: the dHash split into PHASH_BANDS near-equal bit ranges.
+    """
+    value = int(phash, 16)
+    bands, start = [], 0
+
+    for band in range(PHASH_BANDS):
+        width = (PHASH_BITS - start) // (PHASH_BANDS - band)
+        bands.append((band, (value >> start) & ((1 << width) - 1)))
+        start += width
+
+    return bands
+
+
+def _index_phash(db, prescription_id: int, phash: str):
+    from .models import PrescriptionPhashBand
+
+    # Reprocessing (e.g. requeued after a restart) replaces the old bands
+    db.query(PrescriptionPhashBand).filter(
+        PrescriptionPhashBand.prescription_id == prescription_id
+    ).delete(synchronize_session=False)
+
+    db.add_all(
+        PrescriptionPhashBand(prescription_id=prescription_id, band=band, value=value)
+        for band, value in phash_bands(phash)
+    )
+
+
+def _find_forgery(db, prescription, phash):
+    """
+    Same-looking scan already on file for a different patient → likely reused.
+    Only hashes sharing a band with this one (an index lookup per band) are compared.
+    """
+    from sqlalchemy import and_, or_
+    from .models import Prescription, PrescriptionPhashBand
+
+    others = db.query(Prescription.patient_id, Prescription.phash).join(
+        PrescriptionPhashBand, PrescriptionPhashBand.prescription_id == Prescription.id
+    ).filter(
+        or_(*(
+            and_(PrescriptionPhashBand.band == band, PrescriptionPhashBand.value == value)
+            for band, value in phash_bands(phash)
+        )),
+        Prescription.patient_id != prescription.patient_id
+    ).distinct().all()
+
+    for patient_id, other_hash in others:
+        if _hamming(phash, other_hash) <= PHASH_MATCH_DISTANCE:
+            return f"Matches a prescription uploaded by another patient ({patient_id})"
+
+    return None
+
+
+def _apply_result_tx(db, prescription_id: int, info: dict):
+    from .models import Prescription
+    from . import entitlements
+
+    prescription = db.get(Prescription, prescription_id)
+    if not prescription:
+        return None
+
+    problems = list(info["problems"])
+
+    if info.get("phash"):
+        forgery = _find_forgery(db, prescription, info["phash"])
+        if forgery:
+            problems.append(forgery)
+
+    metadata = {
+        k: info[k]
+        for k in ("format", "width", "height", "mode", "exif", "size_bytes")
+        if k in info
+    }
+
+    prescription.phash = info.get("phash")
+    if prescription.phash:
+        _index_phash(db, prescription.id, prescription.phash)
+    prescription.thumbnail_path = info.get("thumbnail_path")
+    prescription.image_metadata = json.dumps(metadata)
+    prescription.status = "rejected" if problems else "approved"
+    prescription.approved = not problems
+    prescription.review_notes = "; ".join(problems) or None
+    prescription.processed_at = datetime.utcnow()
+
+    if problems:
+        entitlements.revoke(db, prescription)
+
+    return prescription.patient_id
+
+
+def apply_result(prescription_id: int, info: dict):
+    from .database import writer
+    from . import entitlements
+
+    patient_id = writer.run(_apply_result_tx, prescription_id, info)
+
+    if patient_id is not None:
+        entitlements.invalidate(patient_id)
+
+
+def _mark_failed_tx(db, prescription_id: int, error: Exception):
+    from .models import Prescription
+
+    prescription = db.get(Prescription, prescription_id)
+    if prescription:
+        prescription.status = "error"
+        prescription.review_notes = f"Processing failed: {error}"
+        prescription.processed_at = datetime.utcnow()
+
+
+def _mark_failed(prescription_id: int, error: Exception):
+    from .database import writer
+
+    writer.run(_mark_failed_tx, prescription_id, error)
+
+
+# =========================
+# WORKER POOL
+# =========================
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: forking a threaded server process can deadlock the children
+        _executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def submit_prescription(prescription):
+    """
+    Queue one stored prescription for background processing.
+    Returns immediately; the row is updated when the worker finishes.
+    """
+    prescription_id = prescription.id
+
+    future = _get_executor().submit(
+        analyze_file,
+        prescription.file_path,
+        prescription.content_hash,
+        prescription.medicine_name,
+    )
+
+    def _done(f):
+        try:
+            apply_result(prescription_id, f.result())
+        except Exception as e:
+            _mark_failed(prescription_id, e)
+
+    future.add_done_callback(_done)
+    return future
+
+
+def requeue_pending(db):
+    """
+    Resubmit prescriptions left pending by a previous run (e.g. a restart mid-processing).
+    """
+    from .models import Prescription
+
+    pending = db.query(Prescription).filter(
+        Prescription.status == "pending",
+        Prescription.content_hash.isnot(None)
+    ).all()
+
+    for prescription in pending:
+        submit_prescription(prescription)
+
+    return len(pending)
+
+
+def _backfill_phash_tx(db):
+    from .models import Prescription, PrescriptionPhashBand
+
+    unindexed = db.query(Prescription.id, Prescription.phash).filter(
+        Prescription.phash.isnot(None),
+        ~Prescription.id.in_(db.query(PrescriptionPhashBand.prescription_id))
+    ).all()
+
+    for prescription_id, phash in unindexed:
+        _index_phash(db, prescription_id, phash)
+
+    return len(unindexed)
+
+
+def backfill_phash_bands():
+    """
+    Index the dHash bands of prescriptions processed before the band table existed.
+    """
+    from .database import writer
+
+    return writer.run(_backfill_phash_tx)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, Query, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, Query, UploadFile, File, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from collections import Counter
-from typing import List
-import os
-
-from .database import get_db
-from .models import Medicine, Order, RefillAlert, Prescription
-from .services import (
-    predict_refill,
-    scan_and_generate_refill_alerts,
-)
-from .agents.orchestrator import run_pharmacy_agent
-from .agents.safety_agent import run_safety_checks
+from typing import List, Optional
+import asyncio
+import time
+import orjson
+
+from .database import get_db, get_async_db, writer
+from .models import Medicine, MedicineTombstone, Order, RefillAlert, Prescription, Patient
+from .services import scan_and_generate_refill_alerts, patient_ref
+from . import async_services, catalog, events
+from .listing import list_response, select_fields
+from .agents.orchestrator import run_pharmacy_agent, emergency_flag, emergency_response
+from .agents.safety_agent import check_order_safety, safety_verdict
+from .agents.order_context import OrderMedicine
+from .agents import consult
+from .trace_store import traced, add_stage, annotate
+from .storage import store_upload
+from .prescription_pipeline import submit_prescription
+from . import entitlements, admission
 
 # ✅ ONLY ONE ROUTER
 router = APIRouter()
@@ -20,23 +30,115 @@ router = APIRouter()
 # =====================================================
 # 🤖 CHAT (MAIN ENTRY)
 # =====================================================
+BUSY_MESSAGES = {
+    "rate_limited": "You're sending messages too quickly. Please wait {retry_after}s and try again.",
+    "overloaded": "Our pharmacist assistant is busy right now. Please try again in {retry_after}s.",
+}
+
+
 @router.post("/chat")
-def chat(user_id: str, message: str, db: Session = Depends(get_db)):
-    return run_pharmacy_agent(db, user_id, message)
+async def chat(user_id: str, message: str, db: Session = Depends(get_db)):
+    flagged = emergency_flag(message)
+
+    with traced("chat"):
+        # Emergency advice needs no agent or LLM slot — never queued, never shed
+        if flagged:
+            return emergency_response(flagged)
+
+        # Admission first, so a burst queues here instead of in the threadpool / Groq
+        started = time.perf_counter()
+
+        try:
+            async with admission.controller.admit(user_id):
+                add_stage("admission", (time.perf_counter() - started) * 1000)
+                return await run_in_threadpool(run_pharmacy_agent, db, user_id, message)
+
+        except admission.Busy as busy:
+            annotate(outcome=busy.reason)
+            return JSONResponse(
+                status_code=429 if busy.reason == "rate_limited" else 503,
+                headers={"Retry-After": str(busy.retry_after)},
+                content={
+                    "status": "busy",
+                    "reason": busy.reason,
+                    "retry_after": busy.retry_after,
+                    "message": BUSY_MESSAGES[busy.reason].format(retry_after=busy.retry_after),
+                },
+            )
+
+
+# =====================================================
+# 🧑‍⚕️ AGENT ENDPOINTS (used by the frontend agent panels)
+# =====================================================
+from pydantic import BaseModel
+
+
+class AgentRequest(BaseModel):
+    message: str
+    user_id: Optional[str] = None
+    medicine: Optional[str] = None     # skip extraction when the caller already knows it
+    quantity: Optional[int] = None
+
+
+async def _run_single_agent(name: str, data: AgentRequest):
+    # Safety / fulfillment only need the intent to find the medicine
+    snapshot, _ = await consult.prepare(
+        data.user_id, data.message, data.medicine, data.quantity, with_intent=name == "pharmacist"
+    )
+    outcome = await consult.run_agent(name, snapshot)
+
+    if outcome["status"] == "error":
+        raise HTTPException(status_code=502, detail=outcome["result"])
+    if outcome["status"] == "timeout":
+        raise HTTPException(status_code=504, detail=outcome["result"])
+
+    return outcome
+
+
+@router.post("/agents/pharmacist")
+async def agent_pharmacist(data: AgentRequest):
+    return await _run_single_agent("pharmacist", data)
+
+
+@router.post("/agents/safety")
+async def agent_safety(data: AgentRequest):
+    return await _run_single_agent("safety", data)
+
+
+@router.post("/agents/fulfillment")
+async def agent_fulfillment(data: AgentRequest):
+    return await _run_single_agent("fulfillment", data)
+
+
+@router.post("/agents/consult")
+async def agent_consult(data: AgentRequest):
+    """
+    All three agents in one round trip, run concurrently over one shared snapshot.
+    """
+    with traced("consult"):
+        return await consult.consult(data.user_id, data.message, data.medicine, data.quantity)
 
 
 # =====================================================
 # 🔎 SEARCH MEDICINES
 # =====================================================
 @router.get("/search")
-def search_medicines(query: str = Query(..., min_length=2), db: Session = Depends(get_db)):
+async def search_medicines(
+    request: Request,
+    response: Response,
+    query: str = Query(..., min_length=2),
+    db: AsyncSession = Depends(get_async_db)
+):
 
-    results = db.query(Medicine).filter(
-        or_(
-            Medicine.name.ilike(f"%{query}%"),
-            Medicine.description.ilike(f"%{query}%")
-        )
-    ).limit(5).all()
+    version = await catalog.current_version(db)
+    etag = catalog.etag_for(version, request)
+
+    cached = catalog.not_modified(request, etag)
+    if cached:
+        return cached
+
+    results = await async_services.search_medicines(db, query)
+    catalog.tag(response, version, etag)
 
     return [
         {
@@ -53,21 +155,91 @@ def search_medicines(query: str = Query(..., min_length=2), db: Session = Depend
 # =====================================================
 # 📦 PRODUCTS (STORE FRONT)
 # =====================================================
+MEDICINE_FIELDS = {
+    "id": Medicine.id,
+    "name": Medicine.name,
+    "price": Medicine.price,
+    "stock": Medicine.stock,
+    "prescription_required": Medicine.prescription_required,
+    "package_size": Medicine.package_size,
+    "description": Medicine.description,
+}
+
+
 @router.get("/products")
-def get_products(db: Session = Depends(get_db)):
+async def get_products(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db)
+):
 
-    medicines = db.query(Medicine).all()
+    version = await catalog.current_version(db)
+    etag = catalog.etag_for(version, request)
+
+    cached = catalog.not_modified(request, etag)
+    if cached:
+        return cached
+
+    response = await list_response(
+        db,
+        columns=MEDICINE_FIELDS,
+        names=select_fields(fields, MEDICINE_FIELDS, ["id", "name", "price", "stock", "prescription_required"]),
+        order=[(Medicine.id, False)],
+        limit=limit,
+        cursor=cursor,
+        format=format
+    )
 
-    return [
-        {
-            "id": m.id,
-            "name": m.name,
-            "price": m.price,
-            "stock": m.stock,
-            "prescription_required": m.prescription_required
-        }
-        for m in medicines
-    ]
+    return catalog.tag(response, version, etag)
+
+
+@router.get("/products/changes")
+async def get_product_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Products added or changed after catalog version `since`, and the ids of
+    products deleted since then. Keep a local mirror by passing back the
+    returned `version` next time.
+    """
+    names = select_fields(fields, MEDICINE_FIELDS, list(MEDICINE_FIELDS))
+
+    version = await catalog.current_version(db)
+    etag = catalog.etag_for(version, request)
+
+    cached = catalog.not_modified(request, etag)
+    if cached:
+        return cached
+
+    rows = (await db.execute(
+        select(*(MEDICINE_FIELDS[n].label(n) for n in names), Medicine.version)
+        .where(Medicine.version > since)
+        .order_by(Medicine.version, Medicine.id)
+    )).all()
+
+    deleted = (await db.scalars(
+        select(MedicineTombstone.medicine_id)
+        .where(MedicineTombstone.version > since)
+        .order_by(MedicineTombstone.version, MedicineTombstone.medicine_id)
+    )).all()
+
+    response = Response(
+        orjson.dumps({
+            "version": version,
+            "since": since,
+            "products": [row._asdict() for row in rows],
+            "deleted": deleted
+        }),
+        media_type="application/json"
+    )
+
+    return catalog.tag(response, version, etag)
 
 
 # =====================================================
@@ -84,8 +256,7 @@ class CheckoutRequest(BaseModel):
     patient_id: str
     items: List[CartItem]
 
-@router.post("/finalize-checkout")
-def finalize_checkout(data: CheckoutRequest, db: Session = Depends(get_db)):
+def _checkout_tx(db: Session, data: CheckoutRequest):
 
     for item in data.items:
 
@@ -102,8 +273,8 @@ def finalize_checkout(data: CheckoutRequest, db: Session = Depends(get_db)):
         if medicine.prescription_required:
             raise HTTPException(status_code=403, detail=f"{item.name} requires prescription")
 
-        # 3️⃣ Safety check
-        safety = run_safety_checks(db, data.patient_id, medicine.name)
+        # 3️⃣ Safety check (row already loaded — no second lookup)
+        safety = check_order_safety(db, data.patient_id, OrderMedicine.from_row(medicine))
 
         if safety["status"] == "blocked":
             raise HTTPException(status_code=403, detail="Safety rule blocked this purchase")
@@ -114,14 +285,21 @@ def finalize_checkout(data: CheckoutRequest, db: Session = Depends(get_db)):
         # 5️⃣ Create order record
         new_order = Order(
             patient_id=data.patient_id,
+            patient_ref=patient_ref(db, data.patient_id),
             product_name=medicine.name,
+            medicine_id=medicine.id,
             quantity=item.quantity,
             dosage_frequency=1
         )
 
         db.add(new_order)
 
-    db.commit()
+
+@router.post("/finalize-checkout")
+async def finalize_checkout(data: CheckoutRequest):
+
+    # Whole cart commits (or rolls back) together on the writer thread
+    await writer.run_async(_checkout_tx, data)
 
     return {
         "status": "success",
@@ -129,32 +307,94 @@ def finalize_checkout(data: CheckoutRequest, db: Session = Depends(get_db)):
     }
 
 
+class OrderRequest(BaseModel):
+    patient_id: str
+    medicine: str
+    quantity: int = 1
+    dosage_frequency: float = 1
+
+
+@router.post("/order")
+async def order_medicine(data: OrderRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    One medicine by name, without the chat agent: the checks read on the
+    async engine, the order itself is awaited on the writer thread.
+    """
+    with traced("order"):
+        stock = await async_services.check_stock(db, data.medicine, data.quantity)
+
+        if stock["status"] != "available":
+            annotate(outcome=stock["status"])
+            return stock
+
+        # Same name → same row: resolved once per session, the checks reuse it
+        medicine = await async_services.resolve_medicine(db, data.medicine)
+        prescription = await async_services.check_prescription(db, data.medicine)
+
+        recent = ()
+        if await async_services.check_recent_purchase(db, data.patient_id, data.medicine):
+            recent = {medicine.id}
+
+        held = ()
+        if prescription["prescription_required"] and not recent:
+            held = await db.run_sync(entitlements.patient_entitlements, data.patient_id)
+
+        verdict = safety_verdict(medicine, recent, held)
+
+        if verdict["status"] == "blocked":
+            annotate(outcome=verdict["reason"])
+            return verdict
+
+        result = await async_services.place_order(
+            data.patient_id, data.medicine, data.quantity, data.dosage_frequency
+        )
+        annotate(outcome=result["status"])
+        return result
+
+
 # =====================================================
 # 📊 USER ORDER HISTORY
 # =====================================================
-@router.get("/user/orders/{user_id}")
-def get_user_orders(user_id: str, db: Session = Depends(get_db)):
+ORDER_FIELDS = {
+    "id": Order.id,
+    "product": Order.product_name,
+    "quantity": Order.quantity,
+    "purchase_date": Order.purchase_date,
+    "dosage_frequency": Order.dosage_frequency,
+    "total_price": Order.total_price,
+}
 
-    orders = db.query(Order).filter(
-        Order.patient_id == user_id
-    ).order_by(Order.purchase_date.desc()).all()
 
-    return [
-        {
-            "product": order.product_name,
-            "quantity": order.quantity,
-            "purchase_date": order.purchase_date
-        }
-        for order in orders
-    ]
+@router.get("/user/orders/{user_id}")
+async def get_user_orders(
+    user_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db)
+):
+
+    return await list_response(
+        db,
+        columns=ORDER_FIELDS,
+        names=select_fields(fields, ORDER_FIELDS, ["product", "quantity", "purchase_date"]),
+        order=[(Order.purchase_date, True), (Order.id, True)],
+        filters=[
+            Order.patient_ref == select(Patient.id).where(Patient.external_id == user_id).scalar_subquery()
+        ],
+        limit=limit,
+        cursor=cursor,
+        format=format
+    )
 
 
 # =====================================================
 # 🔔 REFILL SYSTEM
 # =====================================================
 @router.get("/admin/refill/{user_id}")
-def refill_alert(user_id: str, db: Session = Depends(get_db)):
-    return predict_refill(db, user_id)
+async def refill_alert(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await async_services.predict_refill(db, user_id)
 
 
 @router.post("/admin/scan-refills")
@@ -166,44 +406,64 @@ def scan_refills(db: Session = Depends(get_db)):
     }
 
 
-@router.get("/admin/refill-alerts")
-def get_refill_alerts(db: Session = Depends(get_db)):
+REFILL_ALERT_FIELDS = {
+    "id": RefillAlert.id,
+    "patient_id": RefillAlert.patient_id,
+    "medicine": RefillAlert.medicine_name,
+    "expected_run_out": func.date(RefillAlert.expected_run_out),
+    "alert_generated_at": RefillAlert.alert_generated_at,
+}
 
-    alerts = db.query(RefillAlert).all()
 
-    return [
-        {
-            "patient_id": a.patient_id,
-            "medicine": a.medicine_name,
-            "expected_run_out": a.expected_run_out.strftime("%Y-%m-%d")
-        }
-        for a in alerts
-    ]
+@router.get("/admin/refill-alerts")
+async def get_refill_alerts(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db)
+):
+
+    return await list_response(
+        db,
+        columns=REFILL_ALERT_FIELDS,
+        names=select_fields(fields, REFILL_ALERT_FIELDS, ["patient_id", "medicine", "expected_run_out"]),
+        order=[(RefillAlert.id, False)],
+        limit=limit,
+        cursor=cursor,
+        format=format
+    )
 
 
 # =====================================================
 # 📦 INVENTORY SYSTEM
 # =====================================================
 @router.get("/admin/inventory")
-def get_inventory(db: Session = Depends(get_db)):
-
-    medicines = db.query(Medicine).all()
+async def get_inventory(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db)
+):
 
-    return [
-        {
-            "id": med.id,
-            "name": med.name,
-            "stock": med.stock,
-            "price": med.price
-        }
-        for med in medicines
-    ]
+    return await list_response(
+        db,
+        columns=MEDICINE_FIELDS,
+        names=select_fields(fields, MEDICINE_FIELDS, ["id", "name", "stock", "price"]),
+        order=[(Medicine.id, False)],
+        limit=limit,
+        cursor=cursor,
+        format=format
+    )
 
 
 @router.get("/admin/low-stock")
-def low_stock(threshold: int = 10, db: Session = Depends(get_db)):
+async def low_stock(threshold: int = 10, db: AsyncSession = Depends(get_async_db)):
 
-    medicines = db.query(Medicine).filter(Medicine.stock <= threshold).all()
+    medicines = (await db.scalars(
+        select(Medicine).where(Medicine.stock <= threshold)
+    )).all()
 
     return [
         {
@@ -215,11 +475,9 @@ def low_stock(threshold: int = 10, db: Session = Depends(get_db)):
 
 
 @router.get("/debug/stock/{product_name}")
-def debug_stock(product_name: str, db: Session = Depends(get_db)):
+async def debug_stock(product_name: str, db: AsyncSession = Depends(get_async_db)):
 
-    product = db.query(Medicine).filter(
-        Medicine.name.ilike(f"%{product_name}%")
-    ).first()
+    product = await async_services.resolve_medicine(db, product_name)
 
     if not product:
         return {"status": "not_found"}
@@ -233,40 +491,132 @@ def debug_stock(product_name: str, db: Session = Depends(get_db)):
 # =====================================================
 # 📄 PRESCRIPTION UPLOAD
 # =====================================================
-UPLOAD_DIR = "uploaded_prescriptions"
+def _save_prescription_tx(db: Session, user_id: str, medicine_name: str, stored: dict):
+
+    prescription = Prescription(
+        patient_id=user_id,
+        patient_ref=patient_ref(db, user_id),
+        medicine_name=medicine_name,
+        file_path=stored["file_path"],
+        file_extension=stored["extension"],
+        content_type=stored["content_type"],
+        content_hash=stored["content_hash"]
+    )
+
+    db.add(prescription)
+    db.flush()
+
+    # Resolves the medicine id, committed together with the prescription
+    entitlements.grant(db, prescription)
+
+    return prescription
 
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
 
 @router.post("/upload-prescription/{user_id}/{medicine_name}")
 async def upload_prescription(
     user_id: str,
     medicine_name: str,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
 
-    file_location = f"{UPLOAD_DIR}/{user_id}_{medicine_name}_{file.filename}"
-
-    with open(file_location, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Streamed to disk in chunks, stored by content hash
+    stored = await store_upload(file)
 
-    prescription = Prescription(
-        patient_id=user_id,
-        medicine_name=medicine_name,
-        file_path=file_location
+    prescription = await writer.run_async(
+        _save_prescription_tx, user_id, medicine_name, stored
     )
+    entitlements.invalidate(user_id)
 
-    db.add(prescription)
-    db.commit()
+    # Thumbnails, hashing and validation run in the worker pool
+    submit_prescription(prescription)
 
     return {
         "message": "Prescription uploaded successfully.",
-        "file_path": file_location
+        "prescription_id": prescription.id,
+        "status": prescription.status,
+        "file_path": stored["file_path"],
+        "duplicate": stored["duplicate"]
+    }
+
+
+@router.get("/prescription-status/{prescription_id}")
+async def prescription_status(prescription_id: int, db: AsyncSession = Depends(get_async_db)):
+
+    prescription = await db.get(Prescription, prescription_id)
+
+    if not prescription:
+        raise HTTPException(status_code=404, detail="Prescription not found")
+
+    return {
+        "prescription_id": prescription.id,
+        "medicine": prescription.medicine_name,
+        "status": prescription.status,
+        "approved": prescription.approved,
+        "notes": prescription.review_notes,
+        "thumbnail_path": prescription.thumbnail_path
     }
 
 
+# =====================================================
+# 📡 LIVE INVENTORY / REFILL EVENTS
+# =====================================================
+# Storefront: topics=inventory. Admin: topics=inventory,refill.
+# On a {"type": "lagged"} event the client missed some updates and should
+# resync, e.g. with /products/changes?since=<last version seen>.
+
+def _subscribe(topics: str):
+    try:
+        return events.bus.subscribe(events.parse_topics(topics))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/events")
+async def event_stream(request: Request, topics: str = "inventory"):
+
+    subscription = _subscribe(topics)
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                item = await subscription.get(timeout=events.HEARTBEAT_SECONDS)
+
+                if item is None:
+                    yield b": keep-alive\n\n"
+                    continue
+
+                yield b"event: " + item["type"].encode() + b"\ndata: " + orjson.dumps(item) + b"\n\n"
+        finally:
+            events.bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/events/ws")
+async def event_socket(websocket: WebSocket, topics: str = "inventory"):
+
+    try:
+        subscription = events.bus.subscribe(events.parse_topics(topics))
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    await websocket.accept()
+
+    try:
+        while True:
+            item = await subscription.get(timeout=events.HEARTBEAT_SECONDS)
+            await websocket.send_text(orjson.dumps(item or {"type": "heartbeat"}).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        events.bus.unsubscribe(subscription)
+
+
 # =====================================================
 # 🚚 WAREHOUSE WEBHOOK
 # =====================================================
@@ -1,8 +1,10 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import pandas as pd
-from sqlalchemy import or_
-from .models import Medicine, Order, RefillAlert
+from sqlalchemy import or_, func, select, and_
+from .models import Medicine, Order, RefillAlert, Patient
+from .database import writer
+from . import medicine_index
 
 
 
@@ -33,6 +35,9 @@ def import_products_from_excel(db: Session):
 # =========================
 # IMPORT ORDERS
 # =========================
+# Same medicine again within this window is blocked as a possible overdose
+RECENT_PURCHASE_DAYS = 3
+
 DOSAGE_MAP = {
     "once daily": 1,
     "twice daily": 2,
@@ -77,12 +82,11 @@ def import_products_from_excel(db: Session):
 # CHECK STOCK
 # =========================
 def check_stock(db: Session, medicine_name: str, quantity: int):
-    medicine_name = medicine_name.strip().lower()
+    return stock_status(resolve_medicine(db, medicine_name), quantity)
 
-    product = db.query(Medicine).filter(
-    Medicine.name.ilike(f"%{medicine_name}%")
-).order_by(Medicine.name).first()
 
+def stock_status(product, quantity: int):
+    # Any object with .name / .stock — a Medicine row or an already resolved snapshot
     if not product:
         return {"status": "not_found"}
 
@@ -94,15 +98,45 @@ def check_stock(db: Session, medicine_name: str, quantity: int):
 # =========================
 # CHECK PRESCRIPTION
 # =========================
+def resolve_medicine(db: Session, medicine_name: str):
+    """
+    Free text → Medicine row. Canonical name or alias (brand, English,
+    dosage-stripped, strength-checked) from the in-memory index. No fuzzy
+    match: stock, prescription and order decisions need the product the
+    user named, or not_found.
+    """
+    return medicine_index.resolve(db, medicine_name, fuzzy=False)
+
+
+def patient_ref(db: Session, external_id: str):
+    """
+    "PAT001" → patients.id, creating the patient on first sight.
+    Writes, so only call it from a writer job.
+    """
+    if not external_id:
+        return None
+
+    ref = db.scalar(select(Patient.id).where(Patient.external_id == external_id))
+
+    if ref is None:
+        patient = Patient(external_id=external_id)
+        db.add(patient)
+        db.flush()
+        ref = patient.id
+
+    return ref
+
+
 def check_prescription(db: Session, medicine_name: str):
-    product = db.query(Medicine).filter(
-        Medicine.name.ilike(f"%{medicine_name}%")
-    ).first()
+    product = resolve_medicine(db, medicine_name)
 
     if not product:
         return {"status": "not_found"}
 
-    return {"prescription_required": product.prescription_required}
+    return {
+        "prescription_required": product.prescription_required,
+        "medicine_id": product.id
+    }
 
 
 # =========================
@@ -110,44 +144,82 @@ def check_prescription(db: Session, medicine_name: str):
 # =========================
 import requests
 
-def place_order(db: Session, patient_id: str, medicine_name: str, quantity: int, dosage_frequency: float):
-    product = db.query(Medicine).filter(
-        Medicine.name.ilike(f"%{medicine_name}%")
-    ).first()
+def _place_order_tx(db: Session, patient_id: str, medicine_name: str, quantity: int, dosage_frequency: float):
+    product = resolve_medicine(db, medicine_name)
 
     if not product:
-        return {"status": "not_found"}
+        return None
+
+    return _record_order(db, patient_id, product, quantity, dosage_frequency)
 
+
+def _place_order_by_id_tx(db: Session, patient_id: str, medicine_id: int, quantity: int, dosage_frequency: float):
+    product = db.get(Medicine, medicine_id)
+
+    if not product:
+        return None
+
+    return _record_order(db, patient_id, product, quantity, dosage_frequency)
+
+
+def _record_order(db: Session, patient_id: str, product: Medicine, quantity: int, dosage_frequency: float):
     product.stock -= quantity
 
     order = Order(
         patient_id=patient_id,
+        patient_ref=patient_ref(db, patient_id),
         product_name=product.name,
+        medicine_id=product.id,
         quantity=quantity,
         dosage_frequency=dosage_frequency
     )
 
     db.add(order)
-    db.commit()
+    return product.name
+
+
+def place_order(db: Session, patient_id: str, medicine_name: str, quantity: int, dosage_frequency: float):
+    # Lookup + stock deduction run on the writer thread, in one transaction
+    product_name = writer.run(
+        _place_order_tx, patient_id, medicine_name, quantity, dosage_frequency
+    )
+    return _order_placed(patient_id, product_name, quantity)
+
+
+def place_order_by_id(db: Session, patient_id: str, medicine_id: int, quantity: int, dosage_frequency: float):
+    # Medicine already resolved by the caller — no name lookup on the writer
+    product_name = writer.run(
+        _place_order_by_id_tx, patient_id, medicine_id, quantity, dosage_frequency
+    )
+    return _order_placed(patient_id, product_name, quantity)
 
+
+def _order_placed(patient_id: str, product_name, quantity: int):
+    if not product_name:
+        return {"status": "not_found"}
+
+    notify_warehouse(patient_id, product_name, quantity)
+
+    return {
+        "status": "order_placed",
+        "product": product_name
+    }
+
+
+def notify_warehouse(patient_id: str, product_name: str, quantity: int):
     # 🔥 Webhook Trigger
     try:
         requests.post(
             "http://127.0.0.1:8000/webhook/warehouse",
             json={
                 "patient_id": patient_id,
-                "product": product.name,
+                "product": product_name,
                 "quantity": quantity
             }
         )
     except:
         pass
 
-    return {
-        "status": "order_placed",
-        "product": product.name
-    }
-
 # =========================
 # REFILL PREDICTION
 # =========================
@@ -157,58 +229,69 @@ def predict_refill(db: Session, user_id: str):
 from datetime import datetime, timedelta
 from .models import Order
 
-def check_recent_purchase(db: Session, user_id: str, medicine_name: str):
-    three_days_ago = datetime.utcnow() - timedelta(days=3)
+def has_recent_purchase(db: Session, user_id: str, medicine_id: int):
+    three_days_ago = datetime.utcnow() - timedelta(days=RECENT_PURCHASE_DAYS)
 
-    recent_order = db.query(Order).filter(
-        Order.patient_id == user_id,
-        Order.product_name.ilike(f"%{medicine_name}%"),
+    # patients.external_id (unique) → range on ix_orders_patient_medicine_date
+    recent_order = db.query(Order.id).join(
+        Patient, Order.patient_ref == Patient.id
+    ).filter(
+        Patient.external_id == user_id,
+        Order.medicine_id == medicine_id,
         Order.purchase_date >= three_days_ago
     ).first()
 
-    if recent_order:
-        return True
-
-    return False
+    return recent_order is not None
 # =========================
 # AUTONOMOUS SCAN
 # =========================
 def scan_and_generate_refill_alerts(db: Session):
-    users = db.query(Order.patient_id).distinct().all()
-    users = [u[0] for u in users]
+    return writer.run(_scan_refills_tx)
 
-    generated = []
 
-    for user in users:
-        orders = db.query(Order).filter(Order.patient_id == user).all()
+def _scan_refills_tx(db: Session):
+    # One pass over orders, anti-joined to existing alerts on the integer keys
+    orders = db.query(Order).outerjoin(
+        RefillAlert,
+        and_(
+            RefillAlert.patient_ref == Order.patient_ref,
+            RefillAlert.medicine_id == Order.medicine_id
+        )
+    ).filter(
+        RefillAlert.id.is_(None),
+        Order.patient_ref.is_not(None),
+        Order.medicine_id.is_not(None),
+        Order.dosage_frequency > 0
+    ).order_by(Order.patient_ref, Order.id).all()
 
-        for order in orders:
-            if order.dosage_frequency <= 0:
-                continue
+    generated = []
+    alerted = set()
 
-            days_supply = order.quantity / order.dosage_frequency
-            run_out = order.purchase_date + timedelta(days=days_supply)
+    for order in orders:
+        key = (order.patient_ref, order.medicine_id)
+        if key in alerted:
+            continue
 
-            if datetime.utcnow() >= run_out - timedelta(days=2):
-                existing = db.query(RefillAlert).filter(
-                    RefillAlert.patient_id == user,
-                    RefillAlert.medicine_name == order.product_name
-                ).first()
+        days_supply = order.quantity / order.dosage_frequency
+        run_out = order.purchase_date + timedelta(days=days_supply)
 
-                if not existing:
-                    alert = RefillAlert(
-                        patient_id=user,
-                        medicine_name=order.product_name,
-                        expected_run_out=run_out
-                    )
-                    db.add(alert)
+        if datetime.utcnow() >= run_out - timedelta(days=2):
+            alerted.add(key)
 
-                    generated.append({
-                        "patient_id": user,
-                        "medicine": order.product_name
-                    })
+            alert = RefillAlert(
+                patient_id=order.patient_id,
+                patient_ref=order.patient_ref,
+                medicine_name=order.product_name,
+                medicine_id=order.medicine_id,
+                expected_run_out=run_out
+            )
+            db.add(alert)
+
+            generated.append({
+                "patient_id": order.patient_id,
+                "medicine": order.product_name
+            })
 
-    db.commit()
     return generated
 
 from sqlalchemy import or_
@@ -220,10 +303,15 @@ from .models import Medicine
 
 
 def recommend_from_symptom(db, symptom):
+    return rank_for_symptom(db.query(Medicine).all(), symptom)
 
-    symptom = symptom.lower()
 
-    medicines = db.query(Medicine).all()
+def rank_for_symptom(medicines, symptom):
+    """
+    Top 5 of `medicines` (ORM rows or plain row tuples with the same
+    attribute names) for a symptom, with a reason for each.
+    """
+    symptom = symptom.lower()
 
     scored = []
 
@@ -284,21 +372,3 @@ def generate_reason(symptom, medicine):
 
     return "May help support your condition."
 
-from rapidfuzz import process
-from .models import Medicine
-
-def fuzzy_match_medicine(db, input_name: str):
-
-    medicines = db.query(Medicine).all()
-    names = [m.name for m in medicines]
-
-    if not names:
-        return None
-
-    match = process.extractOne(input_name, names)
-
-    # match format: (matched_string, score, index)
-    if match and match[1] > 75:  # confidence threshold
-        return match[0]
-
-    return None
\ No newline at end of file
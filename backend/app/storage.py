@@ -0,0 +1,174 @@
+import hashlib
+import os
+import uuid
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+
+# =========================
+# CONFIG
+# =========================
+UPLOAD_DIR = "uploaded_prescriptions"
+
+# Same limit the frontend uploader advertises
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Whole request body allowed on upload routes: the file plus multipart framing
+MAX_UPLOAD_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+# Two levels of 256 directories → a few files per directory even at millions of uploads
+SHARD_DEPTH = 2
+
+
+def sharded_path(content_hash: str, extension: str = "", subdir: str = "") -> str:
+    """
+    ab/cd/abcdef...  — content-addressed location of a stored file.
+    `subdir` keeps derived files (thumbnails) apart from the originals.
+    """
+    shards = [content_hash[i * 2:i * 2 + 2] for i in range(SHARD_DEPTH)]
+    return os.path.join(UPLOAD_DIR, subdir, *shards, content_hash + extension)
+
+
+def _too_large_detail():
+    return f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)}MB upload limit"
+
+
+def _too_large():
+    return HTTPException(status_code=413, detail=_too_large_detail())
+
+
+# =========================
+# REQUEST SIZE CAP
+# =========================
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware capping the request body on the upload routes.
+
+    FastAPI parses a multipart form (spooling the file to a temp file)
+    before the endpoint runs, so store_upload's own check comes too late
+    to stop an oversized body. This rejects it up front from
+    Content-Length, or, for chunked bodies, as soon as the running total
+    passes MAX_UPLOAD_REQUEST_BYTES.
+    """
+
+    def __init__(self, app, paths=("/upload-prescription",), max_bytes=MAX_UPLOAD_REQUEST_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+
+        rejected = JSONResponse(status_code=413, content={"detail": _too_large_detail()})
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await rejected(scope, receive, send)
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received, started
+            message = await receive()
+
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+
+                if received > self.max_bytes:
+                    # Answer now: FastAPI reports any error raised while it
+                    # parses the form as a 400, which tracked_send drops
+                    if not started:
+                        await rejected(scope, receive, send)
+                        started = True
+                    raise _BodyTooLarge()
+
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                if started:
+                    return
+                started = True
+            elif received > self.max_bytes:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except _BodyTooLarge:
+            pass
+
+
+# =========================
+# STORE UPLOAD
+# =========================
+async def store_upload(file: UploadFile) -> dict:
+    """
+    Stream an upload to disk in chunks, hashing as it goes.
+
+    The file is written to a temporary name first and then moved to its
+    content-addressed path (the hash alone, so the same bytes under another
+    file name or extension are still a duplicate). If that path already
+    exists the upload is a duplicate and the temporary copy is discarded.
+    The extension and content type are returned for the Prescription row.
+    """
+
+    # Size is known up front for most multipart uploads → reject before any copy
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    extension = os.path.splitext(file.filename or "")[1].lower()
+
+    tmp_dir = anyio.Path(UPLOAD_DIR) / "tmp"
+    await tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = tmp_dir / uuid.uuid4().hex
+
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large()
+
+                digest.update(chunk)
+                await out.write(chunk)
+
+        content_hash = digest.hexdigest()
+        final_path = anyio.Path(sharded_path(content_hash))
+
+        await final_path.parent.mkdir(parents=True, exist_ok=True)
+
+        duplicate = await final_path.exists()
+
+        if duplicate:
+            await tmp_path.unlink()
+        else:
+            await tmp_path.replace(final_path)
+
+    except BaseException:
+        await tmp_path.unlink(missing_ok=True)
+        raise
+
+    return {
+        "file_path": str(final_path),
+        "content_hash": content_hash,
+        "size": size,
+        "extension": extension,
+        "content_type": file.content_type,
+        "duplicate": duplicate
+    }
@@ -0,0 +1,404 @@
+import contextvars
+import glob
+import math
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import orjson
+
+
+# =========================
+# CONFIG
+# =========================
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+
+MINUTE_RETENTION = timedelta(hours=24)
+HOUR_RETENTION = timedelta(days=30)
+
+RECENT_TRACES = 50
+
+# Traces waiting for the writer thread; beyond this new ones are dropped, never waited on
+TRACE_QUEUE_SIZE = 10_000
+TRACE_WRITE_BATCH = 500
+
+# Latency histogram: log-spaced bucket upper bounds from 1 ms to ~2 min (~8% wide).
+# Percentiles are read from these, so no raw trace is ever rescanned.
+BUCKET_BOUNDS = [1.08 ** i for i in range(0, 153)]
+
+
+def _bucket_index(ms: float) -> int:
+    if ms <= 1:
+        return 0
+    return min(len(BUCKET_BOUNDS) - 1, math.ceil(math.log(ms, 1.08)))
+
+
+# =========================
+# ROLLUPS
+# =========================
+class Series:
+    """count / sum / min / max + latency histogram for one metric in one bucket."""
+
+    __slots__ = ("count", "total", "min", "max", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.hist = Counter()
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.hist[_bucket_index(ms)] += 1
+
+    def merge(self, other: "Series"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.hist.update(other.hist)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = p / 100 * self.count
+        seen = 0
+        for index in sorted(self.hist):
+            seen += self.hist[index]
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[index], self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1),
+            "min": round(self.min, 1),
+            "p50": round(self.percentile(50), 1),
+            "p90": round(self.percentile(90), 1),
+            "p99": round(self.percentile(99), 1),
+            "max": round(self.max, 1),
+        }
+
+
+class Bucket:
+    """Everything recorded in one minute (or hour)."""
+
+    __slots__ = ("latency", "counts", "tokens")
+
+    def __init__(self):
+        self.latency = {}          # "total" / "stage:<name>" → Series
+        self.counts = Counter()    # "kind:chat", "intent:order", "outcome:blocked", "emergency:stroke"
+        self.tokens = Counter()    # prompt / completion
+
+    def add(self, trace: dict):
+        self.latency.setdefault("total", Series()).add(trace["total_ms"])
+        for stage, ms in trace.get("stages", {}).items():
+            self.latency.setdefault(f"stage:{stage}", Series()).add(ms)
+
+        self.counts[f"kind:{trace['kind']}"] += 1
+        for key in ("intent", "outcome", "emergency"):
+            if trace.get(key):
+                self.counts[f"{key}:{trace[key]}"] += 1
+
+        self.tokens.update(trace.get("tokens", {}))
+
+    def merge(self, other: "Bucket"):
+        for name, series in other.latency.items():
+            self.latency.setdefault(name, Series()).merge(series)
+        self.counts.update(other.counts)
+        self.tokens.update(other.tokens)
+
+
+class TraceStore:
+    """
+    Append-only JSONL log of request traces (one file per day) plus
+    per-minute and per-hour rollups.
+
+    record() only enqueues: a daemon writer thread replays the log into
+    the rollups once (started at app startup), then appends queued traces
+    in batches and rolls them up, so neither file I/O nor the replay ever
+    runs on the event loop.
+    """
+
+    def __init__(self, directory: str = TRACE_DIR):
+        self.directory = directory
+        self.minutes = {}
+        self.hours = {}
+        self.recent = deque(maxlen=RECENT_TRACES)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._replayed = False
+        self._file = None
+        self._file_day = None
+
+    # ── writer thread ────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the writer thread (replays the log first). Idempotent, returns at once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-store", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Write out what is queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def _run(self):
+        if not self._replayed:
+            self._replay()
+            self._replayed = True
+
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < TRACE_WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            traces = [trace for trace in batch if trace is not None]
+
+            try:
+                self._write(traces)
+            except OSError as e:
+                print("⚠️ Trace store write failed:", e)
+
+            with self._lock:
+                for trace in traces:
+                    self._roll_up(trace)
+
+            if stop:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                return
+
+    # ── write path ───────────────────────────────────────────────────────────
+
+    def record(self, trace: dict):
+        self.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, traces: list):
+        for trace in traces:
+            day = trace["ts"][:10]
+            if self._file_day != day:
+                if self._file:
+                    self._file.close()
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(os.path.join(self.directory, f"{day}.jsonl"), "ab")
+                self._file_day = day
+            self._file.write(orjson.dumps(trace) + b"\n")
+
+        if self._file:
+            self._file.flush()
+
+    def _roll_up(self, trace: dict):
+        at = datetime.fromisoformat(trace["ts"])
+        minute = at.replace(second=0, microsecond=0)
+        hour = minute.replace(minute=0)
+
+        self.minutes.setdefault(minute, Bucket()).add(trace)
+        self.hours.setdefault(hour, Bucket()).add(trace)
+        self.recent.append(trace)
+
+        self._prune(at)
+
+    def _prune(self, now: datetime):
+        for buckets, retention in ((self.minutes, MINUTE_RETENTION), (self.hours, HOUR_RETENTION)):
+            oldest = now - retention
+            # dicts keep insertion order → oldest buckets come first
+            while buckets and next(iter(buckets)) < oldest:
+                del buckets[next(iter(buckets))]
+
+    def _replay(self):
+        # Writer thread only, before any new trace is appended. The lock is
+        # taken per line so stats() is never held up for the whole replay.
+        cutoff = (datetime.utcnow() - HOUR_RETENTION).strftime("%Y-%m-%d")
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.jsonl"))):
+            if os.path.basename(path)[:10] < cutoff:
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        trace = orjson.loads(line)
+                        with self._lock:
+                            self._roll_up(trace)
+                    except (orjson.JSONDecodeError, KeyError, ValueError):
+                        continue  # torn last line after a crash
+
+    # ── read path ────────────────────────────────────────────────────────────
+
+    def stats(self, window_minutes: int = 60) -> dict:
+        """
+        Merge the rollup buckets covering the last `window_minutes`.
+        Minute buckets up to 24h, hour buckets beyond that.
+        """
+        self.start()
+
+        now = datetime.utcnow()
+        use_minutes = timedelta(minutes=window_minutes) <= MINUTE_RETENTION
+        buckets = self.minutes if use_minutes else self.hours
+        start = now - timedelta(minutes=window_minutes)
+        start = start.replace(second=0, microsecond=0) if use_minutes else start.replace(minute=0, second=0, microsecond=0)
+
+        merged = Bucket()
+        timeline = []
+
+        with self._lock:
+            for at, bucket in sorted(buckets.items()):
+                if at < start:
+                    continue
+                merged.merge(bucket)
+                total = bucket.latency.get("total")
+                timeline.append({
+                    "at": at.isoformat(),
+                    "requests": total.count if total else 0,
+                    "p50_ms": round(total.percentile(50), 1) if total else 0,
+                    "p95_ms": round(total.percentile(95), 1) if total else 0,
+                })
+            recent = list(self.recent)[-10:]
+
+        def counts(prefix):
+            return {k[len(prefix):]: v for k, v in merged.counts.items() if k.startswith(prefix)}
+
+        return {
+            "window_minutes": window_minutes,
+            "granularity": "minute" if use_minutes else "hour",
+            "requests": counts("kind:"),
+            "latency_ms": merged.latency.get("total", Series()).summary(),
+            "stages_ms": {
+                name[len("stage:"):]: series.summary()
+                for name, series in merged.latency.items()
+                if name.startswith("stage:")
+            },
+            "intents": counts("intent:"),
+            "outcomes": counts("outcome:"),
+            "emergency_counts": counts("emergency:"),
+            "tokens": dict(merged.tokens),
+            "dropped_traces": self.dropped,
+            "timeline": timeline,
+            "recent_traces": [
+                {
+                    "trace_id": t["id"],
+                    "ts": t["ts"],
+                    "kind": t["kind"],
+                    "intent": t.get("intent"),
+                    "outcome": t.get("outcome"),
+                    "total_ms": t["total_ms"],
+                }
+                for t in reversed(recent)
+            ],
+        }
+
+
+store = TraceStore()
+
+# Streamlit rerun timings posted by the frontend — kept in their own log and
+# rollups so they never mix with API request latencies.
+frontend_store = TraceStore(os.path.join(TRACE_DIR, "frontend"))
+
+
+# =========================
+# REQUEST TRACING
+# =========================
+_current = contextvars.ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    def __init__(self, kind: str):
+        self.started = time.perf_counter()
+        self.data = {
+            "id": os.urandom(6).hex(),
+            "ts": datetime.utcnow().isoformat(),
+            "kind": kind,
+            "stages": {},
+            "tokens": {},
+        }
+
+    def add_stage(self, name: str, ms: float):
+        stages = self.data["stages"]
+        stages[name] = round(stages.get(name, 0) + ms, 2)
+
+
+@contextmanager
+def traced(kind: str):
+    """
+    Trace one request: `with traced("chat"): ...`. Stages, tokens and
+    annotations made inside (on this thread / task) land in the same trace.
+    """
+    trace = RequestTrace(kind)
+    token = _current.set(trace)
+    try:
+        yield trace
+    except Exception:
+        trace.data.setdefault("outcome", "error")
+        raise
+    finally:
+        _current.reset(token)
+        trace.data["total_ms"] = round((time.perf_counter() - trace.started) * 1000, 2)
+        # Enqueue only — safe on the event loop
+        store.record(trace.data)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a stage of the current trace (no-op outside one)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, (time.perf_counter() - started) * 1000)
+
+
+def add_stage(name: str, ms: float):
+    """Record an already measured stage (e.g. timed in a worker)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_stage(name, ms)
+
+
+def annotate(**fields):
+    """Set intent / outcome / emergency etc. on the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.data.update({k: v for k, v in fields.items() if v is not None})
+
+
+def add_tokens(**counts):
+    trace = _current.get()
+    if trace is not None:
+        tokens = trace.data["tokens"]
+        for key, value in counts.items():
+            if value:
+                tokens[key] = tokens.get(key, 0) + value
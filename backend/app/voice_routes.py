@@ -0,0 +1,91 @@
+from fastapi import APIRouter, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from .whisper_service import (
+    transcribe_audio,
+    decode_pcm16,
+    StreamingTranscriber,
+    SAMPLE_RATE,
+)
+from .agents.orchestrator import run_pharmacy_agent
+from .database import SessionLocal
+
+router = APIRouter()
+
+
+@router.post("/voice-chat")
+async def voice_chat(audio: UploadFile = File(...)):
+
+    # Speech → Text
+    text = transcribe_audio(audio)
+
+    # Agent reasoning — LangChain / OpenAI only loaded when this endpoint is used
+    from .agents.langchain_agent import run_agent
+    response = run_agent(text)
+
+    return {
+        "transcription": text,
+        "response": response
+    }
+
+
+@router.websocket("/voice-stream")
+async def voice_stream(websocket: WebSocket, user_id: str, sample_rate: int = SAMPLE_RATE):
+    """
+    Streaming voice chat.
+
+    Client → server:
+        binary frames: raw 16-bit little-endian mono PCM at `sample_rate`
+        text frame "end": utterance finished (optional — trailing silence also ends it)
+
+    Server → client:
+        {"type": "partial", "text": ...}   while audio is streaming
+        {"type": "final", "text": ...}     once the utterance ends
+        {"type": "response", "response": ...}  result of the intent pipeline
+    """
+    await websocket.accept()
+
+    transcriber = StreamingTranscriber()
+
+    try:
+        while True:
+            message = await websocket.receive()
+
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes"):
+                pcm = decode_pcm16(message["bytes"], sample_rate)
+
+                # Whisper is blocking → keep it off the event loop
+                partial = await run_in_threadpool(transcriber.feed, pcm)
+
+                if partial is not None:
+                    await websocket.send_json({"type": "partial", "text": partial})
+
+                if transcriber.end_of_speech():
+                    break
+
+            elif (message.get("text") or "").strip().lower() == "end":
+                break
+
+        # Only the uncommitted tail of the window is decoded here
+        text = await run_in_threadpool(transcriber.finish)
+        await websocket.send_json({"type": "final", "text": text})
+
+        if text:
+            db = SessionLocal()
+            try:
+                response = await run_in_threadpool(run_pharmacy_agent, db, user_id, text)
+            finally:
+                db.close()
+
+            await websocket.send_json({
+                "type": "response",
+                "response": jsonable_encoder(response)
+            })
+
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        pass
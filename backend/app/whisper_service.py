@@ -0,0 +1,296 @@
+import whisper
+import tempfile
+import hashlib
+import threading
+import wave
+import io
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Load once at startup
+model = whisper.load_model("base")
+
+# Whisper works on 16 kHz mono float32 — everything is converted to this once
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
+# Voice activity detection (energy based)
+VAD_FRAME_MS = 30
+VAD_PADDING_MS = 200          # keep a little audio around detected speech
+VAD_MIN_RMS = 0.01            # absolute floor so pure silence never counts as speech
+VAD_NOISE_RATIO = 3.0         # speech must be this much louder than the noise floor
+
+# Transcript cache (content hash → text)
+TRANSCRIPT_CACHE_SIZE = 256
+
+# Streaming transcription
+STREAM_WINDOW_SECONDS = 8.0   # audio kept in the sliding window before committing text
+STREAM_STEP_SECONDS = 1.0     # re-decode the window after this much new audio
+ENDPOINT_SILENCE_MS = 700     # trailing silence that ends an utterance
+
+_transcript_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Whisper is not safe to call from several threads at once
+_model_lock = threading.Lock()
+
+
+# =========================
+# DECODING
+# =========================
+def _decode_wav(audio_bytes: bytes):
+    with wave.open(io.BytesIO(audio_bytes)) as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise wave.Error(f"Unsupported sample width: {width}")
+
+    return samples.reshape(-1, channels), rate
+
+
+def _resample(samples: np.ndarray, rate: int) -> np.ndarray:
+    if rate == SAMPLE_RATE:
+        return samples
+
+    # Integer ratios (48k, 32k) → average blocks, which also acts as a low-pass
+    if rate % SAMPLE_RATE == 0:
+        factor = rate // SAMPLE_RATE
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1)
+
+    duration = len(samples) / rate
+    target = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    source = np.arange(len(samples)) / rate
+    return np.interp(target, source, samples).astype(np.float32)
+
+
+def decode_pcm16(chunk: bytes, rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Raw little-endian 16-bit mono PCM (one streamed chunk) -> 16 kHz float32.
+    """
+    usable = len(chunk) - len(chunk) % 2
+    samples = np.frombuffer(chunk[:usable], dtype="<i2").astype(np.float32) / 32768
+    return np.ascontiguousarray(_resample(samples, rate), dtype=np.float32)
+
+
+def load_pcm(audio_bytes: bytes) -> np.ndarray:
+    """
+    Decode uploaded audio -> 16 kHz mono float32.
+    Downmixing and resampling happen exactly once, here.
+    """
+    try:
+        samples, rate = _decode_wav(audio_bytes)
+    except (wave.Error, EOFError):
+        # Not a plain PCM WAV (webm, mp3, ...) → let ffmpeg decode it
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp.write(audio_bytes)
+            temp_path = tmp.name
+        try:
+            return whisper.load_audio(temp_path)
+        finally:
+            os.remove(temp_path)
+
+    mono = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    return np.ascontiguousarray(_resample(mono, rate), dtype=np.float32)
+
+
+# =========================
+# VOICE ACTIVITY DETECTION
+# =========================
+def speech_frames(pcm: np.ndarray) -> np.ndarray:
+    """
+    Boolean mask, one entry per VAD frame, True where the frame holds speech.
+    """
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    count = len(pcm) // frame
+
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+
+    frames = pcm[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+
+    noise_floor = np.percentile(rms, 10)
+
+    # Cap at half the peak so a clip that is speech from start to end
+    # (no quiet frames to estimate noise from) still registers as voiced
+    threshold = max(VAD_MIN_RMS, min(noise_floor * VAD_NOISE_RATIO, rms.max() / 2))
+
+    return rms > threshold
+
+
+def trim_silence(pcm: np.ndarray) -> np.ndarray:
+    """
+    Cut leading and trailing silence.
+    Returns an empty array when the clip contains no speech at all.
+    """
+    voiced = np.flatnonzero(speech_frames(pcm))
+
+    if voiced.size == 0:
+        return pcm[:0]
+
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    padding = SAMPLE_RATE * VAD_PADDING_MS // 1000
+
+    start = max(0, voiced[0] * frame - padding)
+    end = min(len(pcm), (voiced[-1] + 1) * frame + padding)
+
+    return pcm[start:end]
+
+
+# =========================
+# TRANSCRIPT CACHE
+# =========================
+def _cache_get(key: str):
+    with _cache_lock:
+        text = _transcript_cache.get(key)
+        if text is not None:
+            _transcript_cache.move_to_end(key)
+        return text
+
+
+def _cache_put(key: str, text: str):
+    with _cache_lock:
+        _transcript_cache[key] = text
+        _transcript_cache.move_to_end(key)
+        while len(_transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+            _transcript_cache.popitem(last=False)
+
+
+# =========================
+# TRANSCRIPTION
+# =========================
+def transcribe_pcm(pcm: np.ndarray) -> str:
+    """
+    Run Whisper on already decoded audio, skipping silence.
+    """
+    speech = trim_silence(pcm)
+
+    if speech.size == 0:
+        return ""
+
+    with _model_lock:
+        result = model.transcribe(speech)
+
+    return result["text"].strip()
+
+
+def transcribe_audio(upload_file):
+    """
+    Convert uploaded audio -> text
+    """
+
+    audio_bytes = upload_file.file.read()
+
+    # Same recording submitted twice → skip decoding and Whisper entirely
+    key = hashlib.sha256(audio_bytes).hexdigest()
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    text = transcribe_pcm(load_pcm(audio_bytes))
+
+    _cache_put(key, text)
+
+    return text
+
+
+# =========================
+# STREAMING TRANSCRIPTION
+# =========================
+class StreamingTranscriber:
+    """
+    Incremental transcription of one utterance streamed in small chunks.
+
+    The uncommitted audio is re-decoded every STREAM_STEP_SECONDS. Once it
+    grows past STREAM_WINDOW_SECONDS, every Whisper segment except the last
+    is committed and its audio dropped, so each decode (and the final one
+    after end of speech) only covers the tail of the utterance.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = STREAM_WINDOW_SECONDS,
+        step_seconds: float = STREAM_STEP_SECONDS,
+    ):
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.step = int(step_seconds * SAMPLE_RATE)
+
+        self.committed = []
+        self.tail = ""
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.since_decode = 0
+
+    @property
+    def text(self) -> str:
+        return " ".join(t for t in self.committed + [self.tail] if t)
+
+    def feed(self, pcm: np.ndarray):
+        """
+        Add a chunk of 16 kHz audio.
+        Returns the updated partial transcript, or None if nothing was decoded.
+        """
+        self.buffer = np.concatenate([self.buffer, pcm])
+        self.since_decode += len(pcm)
+
+        if self.since_decode < self.step:
+            return None
+
+        self.since_decode = 0
+
+        if not speech_frames(self.buffer).any():
+            return None
+
+        with _model_lock:
+            result = model.transcribe(self.buffer)
+
+        segments = result.get("segments") or []
+
+        if len(self.buffer) > self.window and len(segments) > 1:
+            # Slide the window: earlier segments are final, keep the last one open
+            done = segments[:-1]
+            self.committed.extend(s["text"].strip() for s in done)
+            self.buffer = self.buffer[int(done[-1]["end"] * SAMPLE_RATE):]
+            self.tail = segments[-1]["text"].strip()
+
+        elif len(self.buffer) > 2 * self.window:
+            # One very long segment → commit it as-is rather than grow forever
+            self.committed.append(result["text"].strip())
+            self.buffer = self.buffer[:0]
+            self.tail = ""
+
+        else:
+            self.tail = result["text"].strip()
+
+        return self.text
+
+    def end_of_speech(self) -> bool:
+        """
+        True once speech was heard and has been followed by ENDPOINT_SILENCE_MS of silence.
+        """
+        voiced = speech_frames(self.buffer)
+        silent_frames = ENDPOINT_SILENCE_MS // VAD_FRAME_MS
+
+        if len(voiced) <= silent_frames or not voiced.any():
+            return False
+
+        return not voiced[-silent_frames:].any()
+
+    def finish(self) -> str:
+        """
+        Decode whatever is left in the window and return the final transcript.
+        """
+        self.tail = transcribe_pcm(self.buffer)
+        self.buffer = self.buffer[:0]
+
+        return self.text
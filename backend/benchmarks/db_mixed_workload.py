@@ -0,0 +1,192 @@
+"""
+Mixed read/write throughput: default SQLite setup vs WAL + read pool + group-commit writer.
+
+Run from backend/:
+    python -m benchmarks.db_mixed_workload --threads 16 --seconds 10 --write-ratio 0.2
+
+Each worker thread loops for the given time, doing either a read
+(product lookup + small listing, like /products and /search) or a write
+(stock decrement + order insert, like place_order). Both setups use a
+fresh temporary database seeded with the same catalog.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, WriteQueue, configure_sqlite, READ_POOL_SIZE
+from app.models import Medicine, Order
+
+
+CATALOG_SIZE = 2000
+
+
+def _seed(url):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all(
+            Medicine(name=f"Medicine {i}", price=9.99, stock=1_000_000, description="")
+            for i in range(CATALOG_SIZE)
+        )
+        db.commit()
+    engine.dispose()
+
+
+def _read(db):
+    medicine_id = random.randint(1, CATALOG_SIZE)
+    db.get(Medicine, medicine_id)
+    db.query(Medicine.id, Medicine.name, Medicine.stock).filter(
+        Medicine.id >= medicine_id
+    ).limit(20).all()
+
+
+def _write_tx(db, patient_id):
+    medicine = db.get(Medicine, random.randint(1, CATALOG_SIZE))
+    medicine.stock -= 1
+    db.add(Order(
+        patient_id=patient_id, product_name=medicine.name, medicine_id=medicine.id,
+        quantity=1, dosage_frequency=1
+    ))
+
+
+# =========================
+# SETUPS
+# =========================
+class Baseline:
+    """What database.py did before: one default engine, commit per write."""
+
+    name = "baseline (default journal, commit per write)"
+
+    def __init__(self, url):
+        self.engine = create_engine(url, connect_args={"check_same_thread": False})
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+
+    def read(self):
+        with self.Session() as db:
+            _read(db)
+
+    def write(self, patient_id):
+        with self.Session() as db:
+            _write_tx(db, patient_id)
+            db.commit()
+
+    def close(self):
+        self.engine.dispose()
+
+
+class Tuned:
+    """WAL + pragmas, read-only pool, single writer with group commit."""
+
+    name = "tuned (WAL, read pool, group-commit writer)"
+
+    def __init__(self, url):
+        self.read_engine = configure_sqlite(
+            create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                pool_size=READ_POOL_SIZE,
+                max_overflow=READ_POOL_SIZE
+            ),
+            read_only=True
+        )
+        self.write_engine = configure_sqlite(
+            create_engine(url, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0),
+            immediate=True
+        )
+        self.ReadSession = sessionmaker(bind=self.read_engine, autoflush=False)
+        self.writer = WriteQueue(
+            sessionmaker(bind=self.write_engine, autoflush=False, expire_on_commit=False)
+        )
+
+    def read(self):
+        with self.ReadSession() as db:
+            _read(db)
+
+    def write(self, patient_id):
+        self.writer.run(_write_tx, patient_id)
+
+    def close(self):
+        self.writer.stop()
+        self.read_engine.dispose()
+        self.write_engine.dispose()
+
+
+# =========================
+# RUNNER
+# =========================
+def run(setup_cls, threads, seconds, write_ratio):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    url = f"sqlite:///{path}"
+
+    _seed(url)
+    setup = setup_cls(url)
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def worker(n):
+        local = {"reads": 0, "writes": 0, "locked": 0}
+        rng = random.Random(n)
+        while time.perf_counter() < stop_at:
+            try:
+                if rng.random() < write_ratio:
+                    setup.write(f"PAT{n:03d}")
+                    local["writes"] += 1
+                else:
+                    setup.read()
+                    local["reads"] += 1
+            except (OperationalError, sqlite3.OperationalError):
+                local["locked"] += 1
+        with lock:
+            for k, v in local.items():
+                counts[k] += v
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    setup.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    total = counts["reads"] + counts["writes"]
+    print(
+        f"{setup_cls.name:<48} "
+        f"{total / elapsed:>9.0f} ops/s  "
+        f"reads {counts['reads'] / elapsed:>8.0f}/s  "
+        f"writes {counts['writes'] / elapsed:>7.0f}/s  "
+        f"locked errors {counts['locked']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.seconds:g}s, {args.write_ratio:.0%} writes\n")
+    for setup_cls in (Baseline, Tuned):
+        run(setup_cls, args.threads, args.seconds, args.write_ratio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,615 @@
+"""
+Synthetic pharmacy database for load and scale testing.
+
+Run from backend/:
+    python -m benchmarks.synthetic_data --db /tmp/synthetic.db --scale medium --seed 7
+    python -m benchmarks.synthetic_data --db /tmp/synthetic.db --products 1000000 --orders 5000000
+
+Then point the API at it:  DATABASE_URL=sqlite:////tmp/synthetic.db uvicorn app.main:app
+
+Produces a catalog with German / English descriptions, patients, order
+histories built from refill regimens (quantity, dosage frequency, adherence),
+prescriptions with their entitlements, and the refill alerts the scanner would
+raise. Every column is generated as a NumPy array and written with executemany
+in batches; only the current batch becomes Python objects, and wide string
+columns (names, timestamps) are built per batch. The same --seed and --as-of
+always give the same database.
+Integer references (patient_ref, medicine_id) are filled, so no startup
+backfill is needed — except canonical names / aliases with --no-aliases.
+"""
+
+import argparse
+import itertools
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from app.database import Base
+from app.medicine_index import aliases, canonical
+from app.models import (
+    Medicine, MedicineAlias, Order, Patient, Prescription, PrescriptionEntitlement, RefillAlert
+)
+from app.entitlements import PRESCRIPTION_VALID_DAYS
+
+
+# =========================
+# CONFIG
+# =========================
+# products, patients, orders
+SCALES = {
+    "tiny": (1_000, 500, 5_000),
+    "small": (10_000, 5_000, 50_000),
+    "medium": (100_000, 50_000, 500_000),
+    "large": (1_000_000, 500_000, 5_000_000),
+}
+
+BATCH_SIZE = 100_000
+
+HISTORY_DAYS = 365               # regimens end somewhere in the last year
+AVG_ORDERS_PER_REGIMEN = 4       # refills of one medicine by one patient
+GERMAN_DESCRIPTION_SHARE = 0.7
+PRODUCT_POPULARITY_SKEW = 0.8    # Zipf exponent — a few products take most orders
+REJECTED_PRESCRIPTION_SHARE = 0.08
+
+REFILL_DUE_DAYS = 2              # same lead time as services.scan_and_generate_refill_alerts
+
+# (German name, English name, route, unit, strengths, Rx, German purpose, English purpose)
+INGREDIENTS = [
+    ("Paracetamol", "Paracetamol (acetaminophen)", "oral", "mg", (250, 500, 1000), False,
+     "Bei leichten bis mäßigen Schmerzen und Fieber.", "For mild to moderate pain and fever."),
+    ("Ibuprofen", "Ibuprofen", "oral", "mg", (200, 400, 600), False,
+     "Lindert Schmerzen und Entzündungen.", "Relieves pain and inflammation."),
+    ("Acetylsalicylsäure", "Acetylsalicylic acid", "oral", "mg", (100, 500), False,
+     "Gegen Kopfschmerzen und Fieber.", "For headache and fever."),
+    ("Cetirizin", "Cetirizine", "oral", "mg", (10,), False,
+     "Bei Heuschnupfen und allergischen Beschwerden.", "For hay fever and allergy symptoms."),
+    ("Loratadin", "Loratadine", "oral", "mg", (10,), False,
+     "Antiallergikum ohne Müdigkeit.", "Non-drowsy antihistamine."),
+    ("Loperamid", "Loperamide", "oral", "mg", (2,), False,
+     "Bei akutem Durchfall.", "For acute diarrhoea."),
+    ("Omeprazol", "Omeprazole", "oral", "mg", (20,), False,
+     "Bei Sodbrennen und saurem Aufstoßen.", "For heartburn and acid reflux."),
+    ("Ambroxol", "Ambroxol", "oral", "mg", (30, 75), False,
+     "Löst festsitzenden Schleim.", "Loosens stubborn mucus."),
+    ("Magnesium", "Magnesium", "oral", "mg", (150, 300, 400), False,
+     "Unterstützt Muskeln und Nerven.", "Supports muscles and nerves."),
+    ("Vitamin D3", "Vitamin D3", "oral", "I.E.", (1000, 2000, 20000), False,
+     "Für Knochen und Immunsystem.", "For bones and the immune system."),
+    ("Zink", "Zinc", "oral", "mg", (10, 25), False,
+     "Trägt zur normalen Funktion des Immunsystems bei.", "Contributes to normal immune function."),
+    ("Pantoprazol", "Pantoprazole", "oral", "mg", (20, 40), True,
+     "Bei Magengeschwüren und Refluxkrankheit.", "For stomach ulcers and reflux disease."),
+    ("Ramipril", "Ramipril", "oral", "mg", (2.5, 5, 10), True,
+     "Zur Behandlung von Bluthochdruck.", "For high blood pressure."),
+    ("Metformin", "Metformin", "oral", "mg", (500, 850, 1000), True,
+     "Bei Typ-2-Diabetes.", "For type 2 diabetes."),
+    ("Simvastatin", "Simvastatin", "oral", "mg", (10, 20, 40), True,
+     "Senkt erhöhte Cholesterinwerte.", "Lowers high cholesterol."),
+    ("Amlodipin", "Amlodipine", "oral", "mg", (5, 10), True,
+     "Bei Bluthochdruck und Angina pectoris.", "For high blood pressure and angina."),
+    ("Bisoprolol", "Bisoprolol", "oral", "mg", (2.5, 5, 10), True,
+     "Betablocker für Herz und Kreislauf.", "Beta blocker for heart and circulation."),
+    ("L-Thyroxin", "Levothyroxine", "oral", "µg", (50, 75, 100), True,
+     "Bei Schilddrüsenunterfunktion.", "For an underactive thyroid."),
+    ("Amoxicillin", "Amoxicillin", "oral", "mg", (500, 750, 1000), True,
+     "Antibiotikum gegen bakterielle Infektionen.", "Antibiotic for bacterial infections."),
+    ("Diclofenac", "Diclofenac", "topical", "%", (1, 2), False,
+     "Bei Muskel- und Gelenkschmerzen.", "For muscle and joint pain."),
+    ("Dexpanthenol", "Dexpanthenol", "topical", "mg/g", (50,), False,
+     "Unterstützt die Wundheilung.", "Supports wound healing."),
+    ("Hydrocortison", "Hydrocortisone", "topical", "%", (0.25, 0.5), False,
+     "Bei entzündlichen Hauterkrankungen.", "For inflammatory skin conditions."),
+    ("Xylometazolin", "Xylometazoline", "nasal", "%", (0.05, 0.1), False,
+     "Abschwellend bei Schnupfen.", "Decongestant for a blocked nose."),
+    ("Meerwasser", "Sea water", "nasal", "ml", (10, 20), False,
+     "Befeuchtet die Nasenschleimhaut.", "Moisturises the nasal mucosa."),
+]
+
+# route → (German form, English form, package unit, package sizes)
+FORMS = {
+    "oral": [
+        ("Tabletten", "tablets", "st", (10, 20, 30, 50, 100)),
+        ("Filmtabletten", "film-coated tablets", "st", (20, 30, 50, 100)),
+        ("Kapseln", "capsules", "st", (20, 30, 60, 120)),
+        ("Brausetabletten", "effervescent tablets", "st", (10, 20, 40)),
+        ("Tropfen", "drops", "ml", (10, 20, 50)),
+        ("Saft", "syrup", "ml", (100, 200)),
+    ],
+    "topical": [
+        ("Creme", "cream", "g", (20, 50, 100)),
+        ("Salbe", "ointment", "g", (20, 50, 100)),
+        ("Gel", "gel", "g", (50, 100, 150)),
+        ("Spray", "spray", "ml", (30, 50)),
+    ],
+    "nasal": [
+        ("Nasenspray", "nasal spray", "ml", (10, 15, 20)),
+        ("Nasentropfen", "nasal drops", "ml", (10, 20)),
+    ],
+}
+
+BRANDS = [
+    "ratiopharm", "HEXAL", "1 A Pharma", "STADA", "AL", "Aristo", "Zentiva", "Heumann",
+    "Mylan", "AbZ", "apodiscounter", "Redcare", "Doppelherz", "Abtei", "Dr. Theiss", "Mivolis",
+]
+
+LINES = [
+    "", "", "", "akut", "forte", "Classic", "Duo", "Junior", "Plus", "Retard", "direkt",
+    "sensitiv", "Protect", "Complex", "Immun", "Nacht", "Mini", "Max", "Pro", "Aktiv",
+    "Rapid", "Balance", "Komfort", "Kids", "Vital", "Intens", "Mono", "Uno", "Extra", "Neo",
+]
+
+
+# =========================
+# HELPERS
+# =========================
+def _cat(*parts) -> np.ndarray:
+    """Element-wise string concatenation of arrays / scalars."""
+    out = np.asarray(parts[0]).astype(str)
+    for part in parts[1:]:
+        out = np.char.add(out, np.asarray(part).astype(str))
+    return out
+
+
+def _timestamps(values: np.ndarray) -> np.ndarray:
+    """datetime64 → the text SQLAlchemy's SQLite DateTime stores ("YYYY-MM-DD HH:MM:SS.ffffff")."""
+    return np.char.replace(np.datetime_as_string(values.astype("datetime64[us]"), unit="us"), "T", " ")
+
+
+def _strength_text(strengths: np.ndarray) -> np.ndarray:
+    # German decimal comma: 2.5 → "2,5"
+    return np.char.replace(np.char.mod("%g", strengths), ".", ",")
+
+
+class _Deferred:
+    """
+    A wide (string) column computed one insert batch at a time —
+    fn(source[rows]) — instead of held in memory for the whole table.
+    """
+
+    def __init__(self, fn, source: np.ndarray):
+        self.fn = fn
+        self.source = source
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, rows):
+        if isinstance(rows, slice):
+            return self.fn(self.source[rows])
+        return _Deferred(self.fn, self.source[rows])
+
+
+def _take(values: np.ndarray, rows: np.ndarray) -> _Deferred:
+    """values[rows], gathered per batch (e.g. product names repeated over millions of orders)."""
+    return _Deferred(values.__getitem__, rows)
+
+
+def _insert(conn, table, columns, batch_size: int) -> int:
+    """
+    Column arrays (dict) or an iterable of row tuples. Only one batch is
+    ever turned into Python objects, so batch_size bounds the memory.
+    """
+    if isinstance(columns, dict):
+        names = list(columns)
+        total = len(columns[names[0]])
+        batches = (
+            zip(*(np.asarray(columns[name][start:start + batch_size]).tolist() for name in names))
+            for start in range(0, total, batch_size)
+        )
+    else:
+        names = [column.name for column in table.columns]
+        rows = iter(columns)
+        batches = iter(lambda: list(itertools.islice(rows, batch_size)), [])
+
+    sql = f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+
+    count = 0
+    for batch in batches:
+        count += conn.executemany(sql, batch).rowcount
+
+    return count
+
+
+# =========================
+# GENERATORS
+# =========================
+def generate_catalog(rng, n: int) -> dict:
+    ingredients = np.arange(len(INGREDIENTS))
+    german = np.array([i[0] for i in INGREDIENTS])
+    english = np.array([i[1] for i in INGREDIENTS])
+    routes = np.array([i[2] for i in INGREDIENTS])
+    units = np.array([i[3] for i in INGREDIENTS])
+    rx = np.array([i[5] for i in INGREDIENTS])
+    purpose_de = np.array([i[6] for i in INGREDIENTS])
+    purpose_en = np.array([i[7] for i in INGREDIENTS])
+
+    # Flattened (ingredient, strength) variants
+    variant_ingredient = np.repeat(ingredients, [len(i[4]) for i in INGREDIENTS])
+    variant_strength = np.concatenate([np.array(i[4], dtype=float) for i in INGREDIENTS])
+
+    # Flattened forms per route, with their package sizes
+    form_rows = [(route, *form) for route, forms in FORMS.items() for form in forms]
+    form_route = np.array([f[0] for f in form_rows])
+    form_de = np.array([f[1] for f in form_rows])
+    form_en = np.array([f[2] for f in form_rows])
+    form_unit = np.array([f[3] for f in form_rows])
+    pack_sizes = [f[4] for f in form_rows]
+
+    variant = rng.integers(0, len(variant_ingredient), n)
+    ingredient = variant_ingredient[variant]
+    route = routes[ingredient]
+
+    # A form that fits the ingredient's route
+    form = np.empty(n, dtype=int)
+    for name in FORMS:
+        mask = route == name
+        candidates = np.flatnonzero(form_route == name)
+        form[mask] = candidates[rng.integers(0, len(candidates), mask.sum())]
+
+    pack_choice = rng.random(n)
+    pack_size = np.empty(n, dtype=int)
+    for f, sizes in enumerate(pack_sizes):
+        mask = form == f
+        pack_size[mask] = np.array(sizes)[(pack_choice[mask] * len(sizes)).astype(int)]
+
+    brand = np.array(BRANDS)[rng.integers(0, len(BRANDS), n)]
+    line = np.array(LINES)[rng.integers(0, len(LINES), n)]
+    strength = _cat(_strength_text(variant_strength[variant]), " ", units[ingredient])
+
+    # "Ibuprofen-ratiopharm akut 400 mg Filmtabletten" / "Ibuprofen HEXAL 400 mg Filmtabletten"
+    hyphenated = rng.random(n) < 0.5
+    line_part = np.where(line == "", "", np.char.add(" ", line))
+    names = np.where(
+        hyphenated,
+        _cat(german[ingredient], "-", brand, line_part, " ", strength, " ", form_de[form]),
+        _cat(german[ingredient], " ", brand, line_part, " ", strength, " ", form_de[form]),
+    )
+
+    # Real catalogs list a product once per name — number the rare repeats
+    order = np.argsort(names, kind="stable")
+    sorted_names = names[order]
+    group_start = np.r_[0, np.flatnonzero(sorted_names[1:] != sorted_names[:-1]) + 1]
+    occurrence = np.arange(n) - np.repeat(group_start, np.diff(np.r_[group_start, n]))
+    repeat = np.empty(n, dtype=int)
+    repeat[order] = occurrence
+    names = np.where(repeat > 0, _cat(names, " Nr. ", repeat + 1), names)
+
+    in_german = rng.random(n) < GERMAN_DESCRIPTION_SHARE
+    descriptions = np.where(
+        in_german,
+        _cat(form_de[form], " mit ", german[ingredient], " (", strength, "). ", purpose_de[ingredient]),
+        _cat(english[ingredient], " ", strength, " ", form_en[form], ". ", purpose_en[ingredient]),
+    )
+
+    prices = np.round(np.exp(rng.normal(2.6, 0.55, n)) * (1 + pack_size / 200), 2)
+    stock = rng.negative_binomial(3, 0.05, n)
+
+    return {
+        "id": np.arange(1, n + 1),
+        "name": names,
+        "price": prices,
+        "package_size": _cat(pack_size, " ", form_unit[form]),
+        "description": descriptions,
+        "stock": stock,
+        "prescription_required": rx[ingredient].astype(int),
+        "version": np.ones(n, dtype=int),
+    }
+
+
+def generate_patients(rng, n: int, now: np.datetime64) -> dict:
+    return {
+        "id": np.arange(1, n + 1),
+        "external_id": _cat("SYN", np.char.zfill(np.arange(1, n + 1).astype(str), 7)),
+        "age": np.clip(rng.normal(52, 17, n), 18, 95).astype(int),
+        "gender": np.where(rng.random(n) < 0.52, "F", "M"),
+        "created_at": _timestamps(now - rng.integers(HISTORY_DAYS, 3 * HISTORY_DAYS, n).astype("timedelta64[D]")),
+    }
+
+
+def generate_regimens(rng, n_orders: int, n_patients: int, n_products: int, now: np.datetime64) -> dict:
+    """
+    A regimen is one patient refilling one medicine. Each has a pack quantity,
+    a dosage frequency and an adherence factor; its orders are spaced by the
+    days one purchase lasts and end somewhere in the last HISTORY_DAYS.
+    """
+    # Zipf popularity over a random permutation of the catalog
+    weights = 1 / np.arange(1, n_products + 1) ** PRODUCT_POPULARITY_SKEW
+    popular = rng.permutation(n_products)
+
+    n = max(1, int(n_orders / AVG_ORDERS_PER_REGIMEN * 1.5))
+
+    while True:
+        quantity = rng.choice([1, 2, 3], n, p=[0.75, 0.18, 0.07])
+        dosage = rng.choice([1.0, 2.0, 3.0], n, p=[0.55, 0.3, 0.15])
+
+        # No regimen reaches back more than 2 × HISTORY_DAYS
+        cap = np.maximum(1, (2 * HISTORY_DAYS / (30 * quantity / dosage)).astype(int))
+        counts = np.minimum(rng.geometric(1 / AVG_ORDERS_PER_REGIMEN, n), cap)
+
+        if counts.sum() >= n_orders:
+            break
+        n *= 2
+
+    keep = np.searchsorted(np.cumsum(counts), n_orders) + 1
+    counts = counts[:keep]
+    counts[-1] -= counts.sum() - n_orders
+
+    return {
+        "patient": rng.integers(0, n_patients, keep),
+        "medicine": popular[rng.choice(n_products, keep, p=weights / weights.sum())],
+        "quantity": quantity[:keep],
+        "dosage_frequency": dosage[:keep],
+        "adherence": np.exp(rng.normal(0.1, 0.25, keep)),
+        "end": now - (rng.random(keep) * HISTORY_DAYS * 86_400).astype("timedelta64[s]"),
+        "orders": counts,
+    }
+
+
+def generate_orders(rng, regimens: dict, patients: dict, catalog: dict) -> dict:
+    group = np.repeat(np.arange(len(regimens["orders"])), regimens["orders"])
+
+    # One purchase lasts ~30 days per pack at once-daily dosing
+    gap_days = 30 * regimens["quantity"][group] / regimens["dosage_frequency"][group]
+    gap_days = gap_days * regimens["adherence"][group] * np.exp(rng.normal(0, 0.1, len(group)))
+    gap_seconds = (gap_days * 86_400).astype(np.int64)
+
+    # Days before the regimen's last order, counted backwards within each group
+    running = np.cumsum(gap_seconds)
+    last_in_group = np.cumsum(regimens["orders"]) - 1
+    before_last = np.repeat(running[last_in_group], regimens["orders"]) - running
+
+    purchase = regimens["end"][group] - before_last.astype("timedelta64[s]")
+
+    # Ids in purchase order, like a real order log
+    chronological = np.argsort(purchase, kind="stable")
+    group = group[chronological]
+    purchase = purchase[chronological]
+
+    patient = regimens["patient"][group]
+    medicine = regimens["medicine"][group]
+    quantity = regimens["quantity"][group]
+
+    return {
+        "columns": {
+            "id": np.arange(1, len(group) + 1),
+            "patient_id": _take(patients["external_id"], patient),
+            "patient_ref": patient + 1,
+            "patient_age": patients["age"][patient],
+            "patient_gender": patients["gender"][patient],
+            "purchase_date": _Deferred(_timestamps, purchase),
+            "product_name": _take(catalog["name"], medicine),
+            "medicine_id": medicine + 1,
+            "quantity": quantity,
+            "total_price": np.round(catalog["price"][medicine] * quantity, 2),
+            "dosage_frequency": regimens["dosage_frequency"][group],
+        },
+        "group": group,
+        "purchase": purchase,
+    }
+
+
+def generate_prescriptions(rng, regimens: dict, patients: dict, catalog: dict, first_purchase) -> tuple:
+    """One prescription per regimen on an Rx product, uploaded shortly before its first order."""
+    rx = np.flatnonzero(catalog["prescription_required"][regimens["medicine"]] == 1)
+    n = len(rx)
+
+    patient = regimens["patient"][rx]
+    medicine = regimens["medicine"][rx]
+    uploaded = first_purchase[rx] - (rng.random(n) * 5 * 86_400).astype("timedelta64[s]")
+    processed = uploaded + rng.integers(5, 300, n).astype("timedelta64[s]")
+    approved = rng.random(n) >= REJECTED_PRESCRIPTION_SHARE
+
+    content_hash = _cat(*(np.char.mod("%016x", rng.integers(0, 2 ** 63, n, dtype=np.int64)) for _ in range(4)))
+    ids = np.arange(1, n + 1)
+
+    prescriptions = {
+        "id": ids,
+        "patient_id": _take(patients["external_id"], patient),
+        "patient_ref": patient + 1,
+        "medicine_name": _take(catalog["name"], medicine),
+        "medicine_id": medicine + 1,
+        "file_path": _cat("uploaded_prescriptions/synthetic/", content_hash, ".jpg"),
+        "content_hash": content_hash,
+        "uploaded_at": _timestamps(uploaded),
+        "approved": approved.astype(int),
+        "status": np.where(approved, "approved", "rejected"),
+        "review_notes": np.where(approved, "Synthetic prescription", "Synthetic prescription: unreadable scan"),
+        "processed_at": _timestamps(processed),
+    }
+
+    entitlements = {
+        "id": np.arange(1, approved.sum() + 1),
+        "patient_id": prescriptions["patient_id"][approved],
+        "medicine_id": prescriptions["medicine_id"][approved],
+        "prescription_id": ids[approved],
+        "expires_at": _timestamps(uploaded[approved] + np.timedelta64(PRESCRIPTION_VALID_DAYS, "D")),
+    }
+
+    return prescriptions, entitlements
+
+
+def generate_refill_alerts(regimens: dict, patients: dict, catalog: dict, now: np.datetime64, limit=None) -> dict:
+    """
+    What the refill scanner would raise: one alert per (patient, medicine) whose
+    last purchase runs out within REFILL_DUE_DAYS (quantity / dosage_frequency days).
+    """
+    supply = (regimens["quantity"] / regimens["dosage_frequency"] * 86_400).astype("timedelta64[s]")
+    run_out = regimens["end"] + supply
+    due_at = run_out - np.timedelta64(REFILL_DUE_DAYS, "D")
+
+    # Several regimens can share a (patient, medicine) pair — keep the latest
+    pair = regimens["patient"].astype(np.int64) * len(catalog["id"]) + regimens["medicine"]
+    latest = np.lexsort((regimens["end"], pair))
+    last_of_pair = np.r_[pair[latest][1:] != pair[latest][:-1], True]
+    chosen = latest[last_of_pair]
+    chosen = chosen[due_at[chosen] <= now]
+
+    if limit is not None:
+        chosen = chosen[np.argsort(run_out[chosen], kind="stable")[::-1][:limit]]
+
+    patient = regimens["patient"][chosen]
+    medicine = regimens["medicine"][chosen]
+
+    return {
+        "id": np.arange(1, len(chosen) + 1),
+        "patient_id": _take(patients["external_id"], patient),
+        "patient_ref": patient + 1,
+        "medicine_name": _take(catalog["name"], medicine),
+        "medicine_id": medicine + 1,
+        "expected_run_out": _Deferred(_timestamps, run_out[chosen]),
+        "alert_generated_at": _Deferred(_timestamps, due_at[chosen]),
+    }
+
+
+def canonical_names(catalog: dict) -> np.ndarray:
+    """canonical_name per product (same rule as the app)."""
+    return np.array([canonical(name) for name in catalog["name"].tolist()])
+
+
+def alias_rows(catalog: dict):
+    """
+    medicine_aliases rows (id, medicine_id, alias, kind), same rules as the
+    app — yielded lazily, so they are built batch by batch as they are inserted.
+    """
+    alias_id = itertools.count(1)
+    names = catalog["name"]
+
+    for start in range(0, len(names), BATCH_SIZE):
+        chunk = zip(catalog["id"][start:start + BATCH_SIZE].tolist(), names[start:start + BATCH_SIZE].tolist())
+        for medicine_id, name in chunk:
+            for alias, kind in aliases(name):
+                yield next(alias_id), medicine_id, alias, kind
+
+
+# =========================
+# RUNNER
+# =========================
+def build(path, products, patients, orders, seed, as_of=None, refill_alerts=None,
+          with_aliases=True, batch_size=BATCH_SIZE):
+    rng = np.random.default_rng(seed)
+
+    # Dates are relative to `as_of` (default: today) — same seed + as_of → same database
+    now = np.datetime64(as_of or datetime.utcnow().date(), "s")
+
+    timings = {}
+
+    def timed(label, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings[label] = time.perf_counter() - started
+        return result
+
+    catalog = timed("catalog", generate_catalog, rng, products)
+    people = timed("patients", generate_patients, rng, patients, now)
+    regimens = timed("regimens", generate_regimens, rng, orders, patients, products, now)
+    order_rows = timed("orders", generate_orders, rng, regimens, people, catalog)
+
+    first_purchase = np.empty(len(regimens["orders"]), dtype="datetime64[s]")
+    first_purchase[order_rows["group"][::-1]] = order_rows["purchase"][::-1]
+
+    prescriptions, entitlements = timed(
+        "prescriptions", generate_prescriptions, rng, regimens, people, catalog, first_purchase
+    )
+    alerts = timed("refill_alerts", generate_refill_alerts, regimens, people, catalog, now, refill_alerts)
+
+    if with_aliases:
+        catalog["canonical_name"] = timed("canonical names", canonical_names, catalog)
+
+    tables = [
+        (Medicine, catalog),
+        (Patient, people),
+        (Order, order_rows["columns"]),
+        (Prescription, prescriptions),
+        (PrescriptionEntitlement, entitlements),
+        (RefillAlert, alerts),
+    ]
+    if with_aliases:
+        # Generated while inserting — timed as "insert medicine_aliases"
+        tables.append((MedicineAlias, alias_rows(catalog)))
+
+    # Tables first, indexes after the load — one sorted build instead of per-row updates
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    indexes = [index for model, _ in tables for index in model.__table__.indexes]
+    with engine.begin() as connection:
+        for index in indexes:
+            index.drop(connection)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    counts = {}
+    for model, columns in tables:
+        started = time.perf_counter()
+        with conn:
+            counts[model.__tablename__] = _insert(conn, model.__table__, columns, batch_size)
+        timings[f"insert {model.__tablename__}"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    with engine.begin() as connection:
+        for index in indexes:
+            index.create(connection)
+        connection.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    timings["indexes + analyze"] = time.perf_counter() - started
+
+    return counts, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", required=True, help="SQLite file to create")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--products", type=int, help="override the scale's catalog size")
+    parser.add_argument("--patients", type=int, help="override the scale's patient count")
+    parser.add_argument("--orders", type=int, help="override the scale's order count")
+    parser.add_argument("--refill-alerts", type=int, help="cap on refill alerts (default: every due pair)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", help="YYYY-MM-DD the history ends at (default: today)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--no-aliases", action="store_true",
+                        help="skip canonical names / aliases (filled by the app's startup backfill)")
+    parser.add_argument("--force", action="store_true", help="replace an existing file")
+    args = parser.parse_args()
+
+    products, patients, orders = SCALES[args.scale]
+    products = args.products or products
+    patients = args.patients or patients
+    orders = args.orders or orders
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} exists — pass --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    print(f"{products:,} products, {patients:,} patients, {orders:,} orders, seed {args.seed}\n")
+
+    started = time.perf_counter()
+    counts, timings = build(
+        args.db, products, patients, orders, args.seed,
+        as_of=args.as_of,
+        refill_alerts=args.refill_alerts,
+        with_aliases=not args.no_aliases,
+        batch_size=args.batch_size,
+    )
+
+    for table, count in counts.items():
+        print(f"{table:<34} {count:>12,} rows")
+    print()
+    for label, seconds in timings.items():
+        print(f"{label:<34} {seconds:>10.2f} s")
+    print(f"\n{'total':<34} {time.perf_counter() - started:>10.2f} s  → {args.db}")
+
+
+if __name__ == "__main__":
+    main()
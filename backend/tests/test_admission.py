@@ -0,0 +1,219 @@
+"""
+AdmissionController in front of /chat: the concurrency cap, shedding at a
+full queue, waiters that time out or go away without leaking their slot,
+the per-user token bucket, and emergencies answered without admission.
+
+Run from backend/:  python -m pytest tests
+"""
+import asyncio
+import os
+import tempfile
+
+# Own throwaway database — must be set before app.database is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/pharmacy.db"
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import admission, routes
+from app.admission import AdmissionController, Busy
+
+
+def make_controller(**overrides):
+    # Rate limit out of the way unless the test is about it
+    settings = dict(max_concurrent=2, max_queued=2, queue_timeout=1.0, user_rate=1000, user_burst=1000)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+def assert_idle(gate):
+    assert gate.stats()["active"] == 0
+    assert gate.stats()["queued"] == 0
+
+
+# =========================
+# SLOTS AND QUEUE
+# =========================
+def test_never_runs_more_than_max_concurrent():
+    gate = make_controller(max_concurrent=2, max_queued=10)
+    running = peak = 0
+
+    async def chat(user_id):
+        nonlocal running, peak
+        async with gate.admit(user_id):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def burst():
+        await asyncio.gather(*(chat(f"PAT{i}") for i in range(8)))
+
+    asyncio.run(burst())
+
+    assert peak == 2
+    assert gate.counts["admitted"] == 8
+    assert gate.counts["waited"] == 6
+    assert_idle(gate)
+
+
+def test_sheds_when_queue_is_full():
+    gate = make_controller(max_concurrent=1, max_queued=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold(user_id):
+            async with gate.admit(user_id):
+                await release.wait()
+
+        holder = asyncio.create_task(hold("PAT1"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold("PAT2"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Busy) as busy:
+            async with gate.admit("PAT3"):
+                pass
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return busy.value
+
+    busy = asyncio.run(scenario())
+
+    assert busy.reason == "overloaded"
+    assert busy.retry_after == admission.BUSY_RETRY_SECONDS
+    assert gate.counts["overloaded"] == 1
+    assert gate.counts["admitted"] == 2
+    assert_idle(gate)
+
+
+# =========================
+# NO SLOT LEAKS
+# =========================
+def test_timeout_with_late_handoff_passes_the_slot_on(monkeypatch):
+    gate = make_controller(max_concurrent=1, queue_timeout=0.01)
+    real_wait = asyncio.wait
+
+    async def wait_then_handoff(futures, timeout=None):
+        done, pending = await real_wait(futures, timeout=timeout)
+        # The holder finishes just as the wait times out: the waiter is
+        # handed the slot after it has already decided to give up
+        gate._release()
+        return done, pending
+
+    async def scenario():
+        await gate._acquire()                      # the holder
+        monkeypatch.setattr(admission.asyncio, "wait", wait_then_handoff)
+
+        with pytest.raises(Busy) as busy:
+            async with gate.admit("PAT2"):
+                pass
+
+        monkeypatch.setattr(admission.asyncio, "wait", real_wait)
+        return busy.value
+
+    busy = asyncio.run(scenario())
+
+    assert busy.reason == "overloaded"
+    assert gate.counts["timed_out"] == 1
+    assert_idle(gate)
+
+
+def test_client_cancelled_while_waiting():
+    gate = make_controller(max_concurrent=1)
+
+    async def scenario():
+        await gate._acquire()                      # the holder
+
+        waiter = asyncio.create_task(gate._acquire())
+        await asyncio.sleep(0)
+        assert gate.stats()["queued"] == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert gate.stats()["queued"] == 0
+
+        # The holder's slot is freed, not handed to the cancelled waiter
+        gate._release()
+
+    asyncio.run(scenario())
+    assert_idle(gate)
+
+
+def test_client_cancelled_right_after_handoff():
+    gate = make_controller(max_concurrent=1)
+
+    async def scenario():
+        await gate._acquire()                      # the holder
+
+        waiter = asyncio.create_task(gate._acquire())
+        await asyncio.sleep(0)
+
+        # Slot handed over, then the client disconnects before the waiter resumes
+        gate._release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(scenario())
+    assert_idle(gate)
+
+
+# =========================
+# /chat
+# =========================
+@pytest.fixture
+def chat_client(monkeypatch):
+    app = FastAPI()
+    app.include_router(routes.router)
+
+    agent_calls = []
+
+    def fake_agent(db, user_id, message):
+        agent_calls.append(message)
+        return {"message": "ok", "trace": []}
+
+    monkeypatch.setattr(routes, "run_pharmacy_agent", fake_agent)
+
+    def install(gate):
+        monkeypatch.setattr(admission, "controller", gate)
+        return TestClient(app), agent_calls
+
+    return install
+
+
+def test_rate_limited_user_gets_429_with_retry_after(chat_client):
+    client, agent_calls = chat_client(make_controller(user_rate=0.5, user_burst=1))
+
+    first = client.post("/chat", params={"user_id": "PAT1", "message": "paracetamol 2"})
+    second = client.post("/chat", params={"user_id": "PAT1", "message": "paracetamol 2"})
+    other_user = client.post("/chat", params={"user_id": "PAT2", "message": "paracetamol 2"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "2"     # one token at 0.5/s
+    assert second.json()["reason"] == "rate_limited"
+    assert other_user.status_code == 200
+    assert agent_calls == ["paracetamol 2", "paracetamol 2"]
+
+
+def test_emergency_bypasses_admission(chat_client):
+    # No slots and no queue: every ordinary message is shed
+    gate = make_controller(max_concurrent=0, max_queued=0)
+    client, agent_calls = chat_client(gate)
+
+    shed = client.post("/chat", params={"user_id": "PAT1", "message": "paracetamol 2"})
+    emergency = client.post("/chat", params={"user_id": "PAT1", "message": "I have chest pain"})
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == str(admission.BUSY_RETRY_SECONDS)
+    assert emergency.status_code == 200
+    assert "emergency" in emergency.json()["message"].lower()
+    assert agent_calls == []
+    assert gate.counts["admitted"] == 0
+    assert gate.counts["overloaded"] == 1
@@ -0,0 +1,124 @@
+"""
+One order turn through run_pharmacy_agent resolves its medicine once and
+hands the snapshot to every stage — this pins the SQL it issues.
+
+Run from backend/:  python -m pytest tests
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Own throwaway database — must be set before app.database is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/pharmacy.db"
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import pytest
+from sqlalchemy import event
+
+# Registers the catalog version stamp on product writes, as the app does
+from app import catalog, services
+from app.agents import orchestrator
+from app.database import Base, SessionLocal, engine, write_engine, writer
+from app.medicine_index import index
+from app.models import Medicine
+
+
+# Request session: pending order, medicine snapshot, recent-purchase check
+MAX_READ_STATEMENTS = 3
+
+# Snapshot read + the writer loading the row it deducts stock from
+MAX_MEDICINE_LOOKUPS = 2
+
+
+def medicine_lookup(statement):
+    # Reads of medicine rows — not the catalog's max(version) stamp on write
+    return "FROM medicines" in statement and "max(medicines.version)" not in statement
+
+
+@contextmanager
+def statements(*engines):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    for e in engines:
+        event.listen(e, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", record)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def catalog():
+    Base.metadata.create_all(bind=engine)
+
+    def seed(db):
+        db.add_all([
+            Medicine(name="Paracetamol apodiscounter 500 mg Tabletten", price=2.5, stock=50),
+            Medicine(name="Nurofen 200 mg Schmelztabletten Lemon", price=6.0, stock=50),
+            Medicine(name="Ramipril - 1 A Pharma® 10 mg Tabletten", price=9.0, stock=50,
+                     prescription_required=True),
+        ])
+
+    writer.run(seed)
+
+    # Alias index is loaded once per process, not per request
+    with SessionLocal() as db:
+        index.lookup(db, "paracetamol")
+
+
+@pytest.fixture
+def intent(monkeypatch):
+    monkeypatch.setattr(services, "notify_warehouse", lambda *args: None)
+
+    def set_intent(medicine, quantity):
+        monkeypatch.setattr(orchestrator, "detect_intent", lambda message: {
+            "intent": "order", "medicine": medicine, "quantity": quantity, "dosage_frequency": 1
+        })
+
+    return set_intent
+
+
+def run_turn(user_id, message):
+    db = SessionLocal()
+    try:
+        with statements(engine) as reads, statements(engine, write_engine) as total:
+            result = orchestrator.run_pharmacy_agent(db, user_id, message)
+        return result, reads, total
+    finally:
+        db.close()
+
+
+def test_order_turn_resolves_medicine_once(intent):
+    intent("acetaminophen", 2)
+
+    result, reads, total = run_turn("PAT900", "I need 2 acetaminophen")
+
+    assert result["message"] == "Order placed successfully for Paracetamol apodiscounter 500 mg Tabletten."
+    assert len(reads) <= MAX_READ_STATEMENTS, reads
+    assert sum("FROM medicines" in s for s in reads) == 1, reads
+    assert sum(medicine_lookup(s) for s in total) <= MAX_MEDICINE_LOOKUPS, total
+
+
+def test_blocked_turn_uses_same_snapshot(intent):
+    intent("ibuprofen", 1)
+    run_turn("PAT901", "ibuprofen 1")
+
+    # Second order within the recent-purchase window
+    result, reads, _ = run_turn("PAT901", "ibuprofen 1")
+
+    assert "blocked" in result["message"].lower()
+    assert len(reads) <= MAX_READ_STATEMENTS, reads
+
+
+def test_prescription_medicine_blocked_without_entitlement(intent):
+    intent("ramipril", 1)
+
+    result, reads, _ = run_turn("PAT902", "ramipril 1")
+
+    assert "blocked" in result["message"].lower()
+    # + the patient's entitlements (cached after this)
+    assert len(reads) <= MAX_READ_STATEMENTS + 1, reads
@@ -0,0 +1,98 @@
+"""
+WriteQueue group commit: jobs queued together share one transaction, each
+in its own SAVEPOINT, so a failing job is rolled back alone and its caller
+gets the exception while the rest of the batch commits.
+
+Run from backend/:  python -m pytest tests
+"""
+import asyncio
+import os
+import tempfile
+
+# Own throwaway database — must be set before app.database is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/pharmacy.db"
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.database import Base, ReadSessionLocal, WriteSessionLocal, WriteQueue, engine
+from app.models import Patient
+
+
+class Boom(Exception):
+    pass
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def queue():
+    # Long batch window so every job submitted below lands in one batch
+    write_queue = WriteQueue(WriteSessionLocal, batch_size=10, batch_wait=0.5)
+    yield write_queue
+    write_queue.stop()
+
+
+def add_patient(external_id, sessions):
+    def job(db):
+        sessions.append(db)
+        db.add(Patient(external_id=external_id))
+        db.flush()
+        return external_id
+    return job
+
+
+def add_patient_then_fail(external_id, sessions):
+    def job(db):
+        sessions.append(db)
+        db.add(Patient(external_id=external_id))
+        db.flush()
+        raise Boom(f"{external_id} failed after writing")
+    return job
+
+
+def stored_patients():
+    with ReadSessionLocal() as db:
+        return set(db.scalars(select(Patient.external_id)))
+
+
+def test_failing_job_rolls_back_only_its_savepoint(queue):
+    sessions = []
+    queue.run(add_patient("PAT100", []))
+
+    futures = [
+        queue.submit(add_patient("PAT101", sessions)),
+        queue.submit(add_patient_then_fail("PAT102", sessions)),
+        queue.submit(add_patient("PAT100", sessions)),        # unique external_id
+        queue.submit(add_patient("PAT103", sessions)),
+    ]
+
+    assert futures[0].result() == "PAT101"
+    with pytest.raises(Boom):
+        futures[1].result()
+    with pytest.raises(IntegrityError):
+        futures[2].result()
+    assert futures[3].result() == "PAT103"
+
+    # One batch, one transaction — yet only the failing jobs' rows are gone
+    assert len(sessions) == 4
+    assert all(s is sessions[0] for s in sessions)
+    assert stored_patients() >= {"PAT100", "PAT101", "PAT103"}
+    assert "PAT102" not in stored_patients()
+
+
+def test_run_reraises_the_job_exception(queue):
+    with pytest.raises(Boom, match="PAT200 failed after writing"):
+        queue.run(add_patient_then_fail("PAT200", []))
+
+    with pytest.raises(Boom, match="PAT201 failed after writing"):
+        asyncio.run(queue.run_async(add_patient_then_fail("PAT201", [])))
+
+    # The writer keeps going after a failed job
+    assert queue.run(add_patient("PAT202", [])) == "PAT202"
+    assert stored_patients().isdisjoint({"PAT200", "PAT201"})
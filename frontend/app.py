@@ -23,6 +23,7 @@ from components.emergency_alert import render_emergency_alert
 from components.prescription_upload import render_prescription_upload
 from components.receipt import render_receipt
 from styles.injector import inject_global_css
+from utils import profiler
 
 # ── Services ──────────────────────────────────────────
 from services.api_client import (
@@ -59,38 +60,53 @@ st.markdown("""
 # ═══════════════════════════════════════════════════════
 
 init_session()
-inject_global_css()
+profiler.begin_rerun()
+
+with profiler.section("inject_global_css"):
+    inject_global_css()
 
 if st.session_state.ui_phase == "onboarding":
-    render_onboarding()
+    with profiler.section("onboarding"):
+        render_onboarding()
+    profiler.end_rerun()
     st.stop()
 
-render_sidebar()
+with profiler.section("sidebar"):
+    render_sidebar()
 
 # ═══════════════════════════════════════════════════════
 # 🚨 SPECIAL ROUTES
 # ═══════════════════════════════════════════════════════
 
 if st.session_state.ui_phase == "emergency_alert":
-    render_emergency_alert(st.session_state.get("last_user_input", ""))
+    with profiler.section("emergency_alert"):
+        render_emergency_alert(st.session_state.get("last_user_input", ""))
+    profiler.end_rerun()
     st.stop()
 
 if st.session_state.ui_phase == "prescription_upload":
-    render_prescription_upload()
+    with profiler.section("prescription_upload"):
+        render_prescription_upload()
+    profiler.end_rerun()
     st.stop()
 
 if st.session_state.ui_phase == "storefront":
     from components.storefront import render_storefront
-    render_storefront()
+    with profiler.section("storefront"):
+        render_storefront()
+    profiler.end_rerun()
     st.stop()
 
 # ═══════════════════════════════════════════════════════
 # 💬 NORMAL CHAT FLOW
 # ═══════════════════════════════════════════════════════
 
-clicked_prompt = render_quick_actions()
-render_chat_history()
-render_receipt()
+with profiler.section("quick_actions"):
+    clicked_prompt = render_quick_actions()
+with profiler.section("chat_history"):
+    render_chat_history()
+with profiler.section("receipt"):
+    render_receipt()
 
 # 🎙️ Voice Input
 voice_text = None
@@ -142,7 +158,8 @@ if llm_input and display_input:
     })
 
     # Call backend normally (validation phase)
-    backend_response = safe_call(call_final_streamed, llm_input)
+    with profiler.section("backend_validation"):
+        backend_response = safe_call(call_final_streamed, llm_input)
 
     # 🟢 READY TO CONFIRM ORDER
     if isinstance(backend_response, dict) and backend_response.get("status") == "ready_to_confirm":
@@ -157,9 +174,10 @@ if llm_input and display_input:
         st.rerun()
 
     # 🟢 NORMAL STREAMING RESPONSE
-    full_response = render_streaming_response(
-        call_final_streamed(llm_input)
-    )
+    with profiler.section("streaming_response"):
+        full_response = render_streaming_response(
+            call_final_streamed(llm_input)
+        )
 
     st.session_state.messages.append({
         "role": "assistant",
@@ -192,4 +210,6 @@ if st.session_state.get("pending_order"):
 
         st.session_state.pending_order = None
 
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+profiler.end_rerun()
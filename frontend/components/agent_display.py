@@ -4,6 +4,9 @@ components/agent_display.py
 Renders Grok-style st.status blocks for each agent.
 Shows live "thinking" state then collapses cleanly once done.
 
+Agents run concurrently in a thread pool — each block fills in as soon as
+its agent answers, so the wait is the slowest agent, not the sum.
+
 Modifies session_state:
     - st.session_state.consultation_summary  (appends agent findings)
     - st.session_state.pending_prescription  (set if restricted drug found)
@@ -14,8 +17,12 @@ When backend is ready:
 """
 
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
 import streamlit as st
 
+from config import AGENT_DEADLINE_SECONDS
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 🔧 DUMMY RESPONSES — Replace these when backend is ready
@@ -64,23 +71,26 @@ def _enrich_input(user_input: str) -> str:
     # When backend supports patient profiles:
     #   return user_input  (and pass patient_id as a separate param instead)
 
-def _call_pharmacist(user_input: str) -> str:
-    return _dummy_pharmacist(_enrich_input(user_input))
+# These run in worker threads — they get the already-enriched text and
+# must not touch st.session_state or draw anything.
+
+def _call_pharmacist(text: str) -> str:
+    return _dummy_pharmacist(text)
     # 🔌 SWAP THIS — when backend is ready, replace above line with:
     # from services.api_client import call_pharmacist
-    # return call_pharmacist(_enrich_input(user_input))
+    # return call_pharmacist(text)
 
-def _call_safety(user_input: str) -> str:
-    return _dummy_safety(_enrich_input(user_input))
+def _call_safety(text: str) -> str:
+    return _dummy_safety(text)
     # 🔌 SWAP THIS — when backend is ready, replace above line with:
     # from services.api_client import call_safety
-    # return call_safety(_enrich_input(user_input))
+    # return call_safety(text)
 
-def _call_fulfillment(user_input: str) -> str:
-    return _dummy_fulfillment(_enrich_input(user_input))
+def _call_fulfillment(text: str) -> str:
+    return _dummy_fulfillment(text)
     # 🔌 SWAP THIS — when backend is ready, replace above line with:
     # from services.api_client import call_fulfillment
-    # return call_fulfillment(_enrich_input(user_input))
+    # return call_fulfillment(text)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -113,20 +123,23 @@ AGENTS = [
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-# 🧠 SINGLE AGENT RUNNER
+# 🧠 STATUS BLOCKS
 # ══════════════════════════════════════════════════════════════════════════════
 
-def _run_agent(agent: dict, user_input: str) -> str:
+@st.cache_resource
+def _agent_pool() -> ThreadPoolExecutor:
+    """Shared by all sessions — 3 agents per query, a few queries at once."""
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="agent")
+
+
+def _open_status(agent: dict):
     """
-    Runs one agent inside a st.status block.
-    Shows thinking state → runs call → collapses with result.
-    Returns the agent's output string.
+    Draws the agent's st.status block in its "thinking" state and returns it,
+    so the result can be written into it later.
     """
-    result = ""
-
-    with st.status(agent["label"], expanded=True) as status:
+    status = st.status(agent["label"], expanded=True)
 
-        # Thinking state
+    with status:
         st.markdown(
             f"""
             <div style="
@@ -140,19 +153,12 @@ def _run_agent(agent: dict, user_input: str) -> str:
             unsafe_allow_html=True,
         )
 
-        # Run the actual call (dummy or real)
-        try:
-            result = agent["call"](user_input)
-        except Exception as e:
-            result = f"⚠️ Agent failed: {str(e)}"
-            status.update(
-                label=f"{agent['label']} — Error",
-                state="error",
-                expanded=False,
-            )
-            return result
-
-        # Show result inside the status block
+    return status
+
+
+def _show_result(agent: dict, status, result: str):
+    """Writes the result inside the status block and collapses it."""
+    with status:
         st.markdown(
             f"""
             <div style="
@@ -173,58 +179,93 @@ def _run_agent(agent: dict, user_input: str) -> str:
             unsafe_allow_html=True,
         )
 
-        # Collapse cleanly once done
-        status.update(
-            label=f"{agent['label']} ✓",
-            state="complete",
-            expanded=False,
-        )
+    # Collapse cleanly once done
+    status.update(
+        label=f"{agent['label']} ✓",
+        state="complete",
+        expanded=False,
+    )
+
 
-    return result
+def _show_error(agent: dict, status, suffix: str = "Error"):
+    status.update(
+        label=f"{agent['label']} — {suffix}",
+        state="error",
+        expanded=False,
+    )
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 🚀 MAIN PUBLIC FUNCTION
 # ══════════════════════════════════════════════════════════════════════════════
 
-def run_all_agents(user_input: str) -> list:
+def run_all_agents(user_input: str, deadline: float = AGENT_DEADLINE_SECONDS) -> list:
     """
     Public entry point. Call this from app.py after emergency/drug checks pass.
 
-    Runs all 3 agents sequentially with live st.status blocks.
+    Runs all 3 agents concurrently with live st.status blocks — each block
+    completes as its agent answers. Agents still running after `deadline`
+    seconds are marked as timed out.
     Updates st.session_state.consultation_summary with findings.
 
     Returns:
-        agent_logs — list of {agent, log} dicts (for attaching to messages)
+        agent_logs — list of {agent, log} dicts (for attaching to messages),
+                     always in AGENTS order
 
     Usage in app.py:
         from components.agent_display import run_all_agents
         agent_logs = run_all_agents(user_input)
     """
-    agent_logs = []
-
     st.markdown(
         "<p style='font-size:0.78rem; color:#6B7280; margin-bottom:6px;'>"
         "🤖 Running agents...</p>",
         unsafe_allow_html=True,
     )
 
-    for agent in AGENTS:
-        result = _run_agent(agent, user_input)
+    # session_state is only readable on this (script) thread — enrich before fanning out
+    text = _enrich_input(user_input)
+
+    statuses = [_open_status(agent) for agent in AGENTS]
+    futures = {
+        _agent_pool().submit(agent["call"], text): index
+        for index, agent in enumerate(AGENTS)
+    }
+    results = [None] * len(AGENTS)
+
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            index = futures[future]
+            agent = AGENTS[index]
+            try:
+                results[index] = future.result()
+                _show_result(agent, statuses[index], results[index])
+            except Exception as e:
+                results[index] = f"⚠️ Agent failed: {str(e)}"
+                _show_error(agent, statuses[index])
+
+    except FuturesTimeout:
+        for future, index in futures.items():
+            if results[index] is None:
+                future.cancel()
+                results[index] = f"⚠️ Agent timed out after {deadline:g}s"
+                _show_error(AGENTS[index], statuses[index], "Timed out")
+
+    agent_logs = []
+    timestamp = time.strftime("%H:%M:%S")
+
+    for agent, result in zip(AGENTS, results):
 
         # Build log entry for chat history
-        log_entry = {
+        agent_logs.append({
             "agent": agent["label"],
             "log":   result,
-        }
-        agent_logs.append(log_entry)
+        })
 
         # Update consultation summary for receipt/PDF later
-        timestamp = time.strftime("%H:%M:%S")
         st.session_state.consultation_summary.append({
             "agent":     agent["label"],
             "finding":   result,
             "timestamp": timestamp,
         })
 
-    return agent_logs
\ No newline at end of file
+    return agent_logs
@@ -12,11 +12,18 @@ Message structure expected:
         ]
     }
 
+Only the last CHAT_PAGE_SIZE messages are drawn; older ones load a page at
+a time on demand (a fragment rerun, not a full app rerun). Bubble HTML is
+cached per message text and the chat CSS is added to the page once per session.
+
 Rules:
-- Never modifies session_state
+- Never modifies session_state (apart from its own view state: chat_pages, _chat_css_injected)
 - UI only — no API calls, no logic
 """
 
+import json
+from functools import lru_cache
+
 import streamlit as st
 
 
@@ -27,9 +34,13 @@ AGENT_COLORS = {
 }
 DEFAULT_AGENT_COLOR = "#6B7280"
 
+# Messages drawn per page of history
+CHAT_PAGE_SIZE = 20
 
-def _inject_chat_css():
-    st.markdown("""
+# Rendered bubbles kept (shared by all sessions; keyed by message text)
+HTML_CACHE_SIZE = 2048
+
+CHAT_CSS = """
         <style>
         @import url('https://fonts.googleapis.com/css2?family=Sora:wght@300;400;500;600&display=swap');
 
@@ -110,7 +121,33 @@ def _inject_chat_css():
         @keyframes fadeInUp { from { opacity:0; transform:translateY(12px); } to { opacity:1; transform:translateY(0); } }
         @keyframes blink { 0%,100% { opacity:1; } 50% { opacity:0; } }
         </style>
-    """, unsafe_allow_html=True)
+"""
+
+
+def _inject_chat_css():
+    """
+    Adds CHAT_CSS to the page <head> once per session. A <style> written with
+    st.markdown is dropped by any rerun that doesn't re-send it; one in <head>
+    lasts as long as the browser tab.
+    """
+    if st.session_state.get("_chat_css_injected"):
+        return
+
+    st.html(
+        f"""
+        <script>
+        if (!document.getElementById("chat-css")) {{
+            const holder = document.createElement("div");
+            holder.innerHTML = {json.dumps(CHAT_CSS)};
+            const style = holder.querySelector("style");
+            style.id = "chat-css";
+            document.head.appendChild(style);
+        }}
+        </script>
+        """,
+        unsafe_allow_javascript=True,
+    )
+    st.session_state._chat_css_injected = True
 
 
 def _agent_color(agent_name: str) -> str:
@@ -137,8 +174,14 @@ def _render_agent_logs(agent_logs: list) -> None:
         color      = _agent_color(agent_name)
 
         with st.expander(agent_name, expanded=False):
-            st.markdown(
-                f"""
+            st.markdown(_agent_log_html(log_text, color), unsafe_allow_html=True)
+
+
+# ── Cached bubble HTML ───────────────────────────────────────────────────────
+
+@lru_cache(maxsize=HTML_CACHE_SIZE)
+def _agent_log_html(log_text: str, color: str) -> str:
+    return f"""
                 <div style="
                     background: linear-gradient(135deg, rgba(124,58,237,0.08), rgba(0,0,0,0.2));
                     border-left: 3px solid {color};
@@ -153,19 +196,12 @@ def _render_agent_logs(agent_logs: list) -> None:
                 ">
                 {log_text}
                 </div>
-                """,
-                unsafe_allow_html=True,
-            )
-
+                """
 
-def _render_message(message: dict, index: int) -> None:
-    role       = message.get("role", "user")
-    content    = message.get("content", "")
-    agent_logs = message.get("agent_logs", [])
 
-    if role == "user":
-        st.markdown(
-            f"""
+@lru_cache(maxsize=HTML_CACHE_SIZE)
+def _user_html(content: str) -> str:
+    return f"""
             <div style="
                 display:flex; justify-content:flex-end;
                 width:100%; padding:4px 0;
@@ -187,14 +223,12 @@ def _render_message(message: dict, index: int) -> None:
                 {content}
                 </div>
             </div>
-            """,
-            unsafe_allow_html=True,
-        )
+            """
 
-    elif role == "assistant":
-        with st.chat_message("assistant"):
-            st.markdown(
-                f"""
+
+@lru_cache(maxsize=HTML_CACHE_SIZE)
+def _assistant_html(content: str) -> str:
+    return f"""
                 <div style="
                     background: linear-gradient(135deg, rgba(255,255,255,0.04), rgba(124,58,237,0.05));
                     backdrop-filter: blur(10px);
@@ -212,29 +246,65 @@ def _render_message(message: dict, index: int) -> None:
                 ">
                 {content}
                 </div>
-                """,
-                unsafe_allow_html=True,
-            )
+                """
+
+
+def _render_message(message: dict, index: int) -> None:
+    role       = message.get("role", "user")
+    content    = message.get("content", "")
+    agent_logs = message.get("agent_logs", [])
+
+    if role == "user":
+        st.markdown(_user_html(content), unsafe_allow_html=True)
+
+    elif role == "assistant":
+        with st.chat_message("assistant"):
+            st.markdown(_assistant_html(content), unsafe_allow_html=True)
             if agent_logs:
                 st.markdown("<div style='margin-top:6px;'></div>", unsafe_allow_html=True)
                 _render_agent_logs(agent_logs)
 
 
+# ── Windowed history ─────────────────────────────────────────────────────────
+
+def _show_earlier() -> None:
+    st.session_state.chat_pages = st.session_state.get("chat_pages", 1) + 1
+
+
+@st.fragment
+def _render_window() -> None:
+    """
+    Last `chat_pages` × CHAT_PAGE_SIZE messages. Older ones are not drawn at
+    all until asked for; the button reruns only this fragment.
+    """
+    messages: list = st.session_state.get("messages", [])
+    shown  = min(len(messages), st.session_state.get("chat_pages", 1) * CHAT_PAGE_SIZE)
+    hidden = len(messages) - shown
+
+    if hidden:
+        st.button(
+            f"⬆ Show {min(hidden, CHAT_PAGE_SIZE)} earlier messages ({hidden} hidden)",
+            key="chat_show_earlier",
+            on_click=_show_earlier,
+            use_container_width=True,
+        )
+
+    for i in range(hidden, len(messages)):
+        _render_message(messages[i], index=i)
+
+
 def render_chat_history() -> None:
     """
-    Public entry point. Call from app.py to render full chat.
+    Public entry point. Call from app.py to render the chat (windowed).
     Reads from st.session_state.messages — never modifies it.
     """
     _inject_chat_css()
 
-    messages: list = st.session_state.get("messages", [])
-
-    if not messages:
+    if not st.session_state.get("messages"):
         st.info("No messages yet. Start chatting below!")
         return
 
-    for i, message in enumerate(messages):
-        _render_message(message, index=i)
+    _render_window()
 
 
 def render_streaming_response(stream_generator) -> str:
@@ -9,16 +9,23 @@ Rules:
     - No API calls
     - No session_state writes
 
+The PDF is built once per distinct receipt content, in a background thread
+as soon as the receipt is drawn; the download button serves the cached bytes.
+
 Usage in app.py:
     from components.receipt import render_receipt
     render_receipt()
 """
 
-import io
-import time
-import streamlit as st
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
+import streamlit as st
+
 # 🔌 SWAP THIS — PDF generation uses fpdf2 (pure Python, no backend needed).
 # Install it: pip install fpdf2
 # Add to requirements.txt: fpdf2
@@ -33,27 +40,26 @@ except ImportError:
 # ══════════════════════════════════════════════════════════════════════════════
 # 📄 PDF GENERATOR
 # ══════════════════════════════════════════════════════════════════════════════
+# Unicode characters that crash FPDF's core fonts → ASCII stand-ins
+_PDF_TRANSLATION = str.maketrans({
+    "–": "-",   # en-dash
+    "—": "--",  # em-dash
+    "‘": "'",   # smart single quotes
+    "’": "'",
+    "“": '"',   # smart double quotes
+    "”": '"',
+    "•": "*",   # bullet points
+    "…": "...", # ellipsis
+})
+
+
 def _sanitize_for_pdf(text: str) -> str:
     """Quick fix to replace Unicode characters that crash FPDF."""
     if not text:
         return ""
-        
-    replacements = {
-        "–": "-",   # en-dash
-        "—": "--",  # em-dash
-        "‘": "'",   # smart single quotes
-        "’": "'",
-        "“": '"',   # smart double quotes
-        "”": '"',
-        "•": "*",   # bullet points
-        "…": "...", # ellipsis
-    }
-    
-    for bad_char, good_char in replacements.items():
-        text = text.replace(bad_char, good_char)
-        
+
     # Brutal fallback: force it to ascii, replacing anything else weird with '?'
-    return text.encode('ascii', 'replace').decode('ascii')
+    return text.translate(_PDF_TRANSLATION).encode('ascii', 'replace').decode('ascii')
 
 
 def _generate_pdf(
@@ -173,6 +179,52 @@ def _generate_pdf(
     return bytes(pdf.output())
 
 
+# ══════════════════════════════════════════════════════════════════════════════
+# 🗄️ PDF CACHE
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Distinct receipts kept in memory (shared by all sessions)
+PDF_CACHE_SIZE = 32
+
+
+class _PdfCache:
+    """
+    content hash → Future[bytes]. A receipt is generated once, in the
+    background; later reruns (and other sessions) reuse the same Future.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="receipt-pdf")
+        self._jobs: OrderedDict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, *args) -> Future:
+        with self._lock:
+            future = self._jobs.get(key)
+
+            if future is None or (future.done() and future.exception()):
+                future = self._pool.submit(_generate_pdf, *args)
+                self._jobs[key] = future
+
+            self._jobs.move_to_end(key)
+            while len(self._jobs) > PDF_CACHE_SIZE:
+                self._jobs.popitem(last=False)
+
+            return future
+
+
+@st.cache_resource
+def _pdf_cache() -> _PdfCache:
+    return _PdfCache()
+
+
+def _receipt_key(patient_name: str, summary: list, messages: list) -> str:
+    """Hash of everything that ends up in the PDF."""
+    questions = [m.get("content", "") for m in messages if m.get("role") == "user"]
+    payload = json.dumps([patient_name, summary, questions], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # 🚀 MAIN PUBLIC FUNCTION
 # ══════════════════════════════════════════════════════════════════════════════
@@ -286,16 +338,21 @@ def render_receipt() -> None:
 
         # ── PDF download button ───────────────────────────────────────────────
         if PDF_AVAILABLE:
-            pdf_bytes = _generate_pdf(patient_name, summary, messages)
-            if pdf_bytes:
-                filename = f"atharva_receipt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                st.download_button(
-                    label     = "⬇️ Download PDF Receipt",
-                    data      = pdf_bytes,
-                    file_name = filename,
-                    mime      = "application/pdf",
-                    use_container_width=True,
-                )
+            # Starts (or reuses) the background build — never blocks this rerun.
+            # The button resolves the bytes only when clicked.
+            pdf_job = _pdf_cache().get(
+                _receipt_key(patient_name, summary, messages),
+                patient_name, list(summary), list(messages),
+            )
+            filename = f"atharva_receipt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            st.download_button(
+                label     = "⬇️ Download PDF Receipt",
+                data      = pdf_job.result,
+                file_name = filename,
+                mime      = "application/pdf",
+                on_click  = "ignore",
+                use_container_width=True,
+            )
         else:
             # ⚠️ DEMO SAFETY: if fpdf2 not installed, show install instruction
             st.warning(
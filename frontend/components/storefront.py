@@ -1,208 +1,276 @@
+import math
+
 import streamlit as st
-import requests
 
-BACKEND_URL = "http://127.0.0.1:8000"
+# 🔄 Live inventory — pooled, cached (CATALOG_TTL) and ETag-revalidated
+from services.api_client import cached_get, CATALOG_TTL
+
+
+# Product cards drawn per grid page
+GRID_PAGE_SIZE = 12
+
+# Fragment keys — a callback can rerun just one of them with st.rerun(key)
+GRID_FRAGMENT = "storefront_grid"
+CART_FRAGMENT = "storefront_cart"
 
 
 # ─────────────────────────────────────────────
-# 🔄 Fetch Live Inventory From Backend
+# 📚 Catalog snapshot
 # ─────────────────────────────────────────────
-def fetch_products():
-    try:
-        response = requests.get(f"{BACKEND_URL}/products")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return []
-    except:
-        return []
+@st.cache_resource(ttl=CATALOG_TTL, show_spinner=False)
+def _catalog_snapshot() -> tuple:
+    """
+    (products, lowercase search keys) shared read-only by every session and
+    rerun — no per-rerun copy or refetch. Raises when the backend is down,
+    so an empty catalog is never cached.
+    """
+    products = cached_get("/products")
+    keys = [f"{p['name']} {p.get('description') or ''}".lower() for p in products]
+    return products, keys
+
+
+def _filtered(products: list, keys: list, query: str, in_stock: bool, otc_only: bool) -> list:
+    query = query.strip().lower()
+    return [
+        product
+        for product, key in zip(products, keys)
+        if (not query or query in key)
+        and (not in_stock or product["stock"] > 0)
+        and (not otc_only or not product.get("prescription_required"))
+    ]
 
 
 # ─────────────────────────────────────────────
-# 🛒 Storefront UI
+# 🛍️ Cart mutations (callbacks)
 # ─────────────────────────────────────────────
-def render_storefront():
+def _add_to_cart(product: dict):
+    for item in st.session_state.cart:
+        if item["name"] == product["name"]:
+            item["quantity"] += 1
+            break
+    else:
+        st.session_state.cart.append({
+            "id": product["id"],
+            "name": product["name"],
+            "price": product["price"],
+            "quantity": 1
+        })
 
-    st.title("🛒 Pharmacy Storefront")
-    st.write("Browse over-the-counter medications. All checkouts are reviewed by our AI Safety Agent.")
+    st.session_state.payment_link = None
 
-    if st.button("← Back to Chat"):
-        st.session_state.ui_phase = "chatting"
-        st.rerun()
+    # Only the cart panel changes — don't redraw the grid
+    st.rerun(CART_FRAGMENT)
 
-    # 🔥 LIVE PRODUCTS FROM DATABASE
-    products = fetch_products()
 
-    col_products, col_cart = st.columns([2, 1])
+def _change_quantity(index: int, delta: int):
+    cart = st.session_state.cart
+    cart[index]["quantity"] += delta
+    if cart[index]["quantity"] <= 0:
+        cart.pop(index)
+    st.session_state.payment_link = None
 
-    # ─────────────────────────────
-    # 📦 PRODUCTS GRID
-    # ─────────────────────────────
-    with col_products:
-        st.subheader("Available Products")
 
-        if not products:
-            st.warning("Unable to load inventory.")
-            return
+def _clear_cart():
+    st.session_state.cart = []
+    st.session_state.payment_link = None
 
-        grid_cols = st.columns(2)
 
-        for index, product in enumerate(products):
+def _reset_page():
+    st.session_state.store_page = 0
 
-            with grid_cols[index % 2]:
-                with st.container(border=True):
 
-                    st.markdown(f"**{product['name']}**")
-                    st.write(f"Price: ${product['price']:.2f}")
+def _turn_page(page: int):
+    st.session_state.store_page = page
 
-                    # Optional category fallback
-                    category = product.get("category", "General")
-                    st.write(f"Category: {category}")
 
-                    # 🛑 Out of Stock
-                    if product["stock"] <= 0:
-                        st.error("Out of Stock")
+# ─────────────────────────────────────────────
+# 📦 Products grid
+# ─────────────────────────────────────────────
+@st.fragment(key=GRID_FRAGMENT)
+def _render_grid():
+    st.subheader("Available Products")
 
-                    # 🛡️ Prescription Required
-                    elif product.get("prescription_required"):
-                        st.warning("Prescription Required")
-                        if st.button("Upload Rx", key=f"rx_{index}"):
-                            st.session_state.pending_prescription = product["name"]
-                            st.session_state.ui_phase = "prescription_upload"
-                            st.rerun()
+    try:
+        products, keys = _catalog_snapshot()
+    except Exception as e:
+        print("⚠️ Storefront catalog failed:", e)
+        products, keys = [], []
 
-                    # ✅ In Stock
-                    else:
-                        st.success(f"In Stock: {product['stock']}")
+    if not products:
+        st.warning("Unable to load inventory.")
+        return
 
-                        if st.button("Add to Cart", key=f"add_{index}"):
+    # Filtering runs over the cached snapshot — no backend call per keystroke
+    col_search, col_stock, col_otc = st.columns([3, 1, 1])
+    query = col_search.text_input("Search", key="store_query", placeholder="Search products...",
+                                  label_visibility="collapsed", on_change=_reset_page)
+    in_stock = col_stock.checkbox("In stock", key="store_in_stock", on_change=_reset_page)
+    otc_only = col_otc.checkbox("OTC only", key="store_otc_only", on_change=_reset_page)
 
-                            found = False
-                            for item in st.session_state.cart:
-                                if item["name"] == product["name"]:
-                                    item["quantity"] += 1
-                                    found = True
-                                    break
+    matches = _filtered(products, keys, query, in_stock, otc_only)
 
-                            if not found:
-                                new_item = {
-                                    "id": product["id"],
-                                    "name": product["name"],
-                                    "price": product["price"],
-                                    "quantity": 1
-                                }
-                                st.session_state.cart.append(new_item)
+    if not matches:
+        st.info("No products match your search.")
+        return
 
-                            st.rerun()
+    pages = math.ceil(len(matches) / GRID_PAGE_SIZE)
+    page = min(st.session_state.get("store_page", 0), pages - 1)
+    start = page * GRID_PAGE_SIZE
 
-    # ─────────────────────────────
-    # 🛍️ CART SECTION
-    # ─────────────────────────────
-    with col_cart:
-        st.subheader("Your Cart")
+    grid_cols = st.columns(2)
 
-        if not st.session_state.cart:
-            st.info("Cart is empty.")
-        else:
-            total = 0.0
+    for index, product in enumerate(matches[start:start + GRID_PAGE_SIZE]):
 
-            for item in st.session_state.cart:
-                item_total = item["price"] * item["quantity"]
-                st.write(f"- **{item['name']}** (x{item['quantity']}) : ${item_total:.2f}")
-                total += item_total
+        with grid_cols[index % 2]:
+            with st.container(border=True):
 
-            st.markdown("---")
-            st.markdown(f"**Total: ${total:.2f}**")
+                st.markdown(f"**{product['name']}**")
+                st.write(f"Price: ${product['price']:.2f}")
 
-            # 💳 Generate Payment Link
-            if st.button("💳 Generate Payment Link", use_container_width=True, type="primary"):
+                # Optional category fallback
+                category = product.get("category", "General")
+                st.write(f"Category: {category}")
 
-                from services.api_client import call_create_payment_link
-                name = st.session_state.get("patient_name", "Guest")
+                # 🛑 Out of Stock
+                if product["stock"] <= 0:
+                    st.error("Out of Stock")
 
-                with st.spinner("Connecting to Paypal..."):
-                    link = call_create_payment_link(total, name)
+                # 🛡️ Prescription Required
+                elif product.get("prescription_required"):
+                    st.warning("Prescription Required")
+                    if st.button("Upload Rx", key=f"rx_{product['id']}"):
+                        st.session_state.pending_prescription = product["name"]
+                        st.session_state.ui_phase = "prescription_upload"
+                        st.rerun()
 
-                    if link:
-                        st.session_state.payment_link = link
-                    else:
-                        st.error("Payment gateway unavailable.")
+                # ✅ In Stock
+                else:
+                    st.success(f"In Stock: {product['stock']}")
+                    st.button("Add to Cart", key=f"add_{product['id']}",
+                              on_click=_add_to_cart, args=(product,))
 
-            # 🔗 Show Pay Button
-            if st.session_state.get("payment_link"):
-                st.success("Payment link generated securely!")
+    # Pager — reruns only this fragment
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    col_prev.button("← Prev", key="store_prev", disabled=page == 0, use_container_width=True,
+                    on_click=_turn_page, args=(page - 1,))
+    col_page.caption(f"Page {page + 1} of {pages} · {len(matches)} products")
+    col_next.button("Next →", key="store_next", disabled=page >= pages - 1, use_container_width=True,
+                    on_click=_turn_page, args=(page + 1,))
 
-                st.link_button(
-                    "Redirect to Paypal Checkout ↗",
-                    st.session_state.payment_link,
-                    type="secondary",
-                    use_container_width=True
-                )
 
-                # ✅ After Payment → Trigger AI Review
-                if st.button("✅ I have completed the payment", use_container_width=True, type="primary"):
-                     from services.api_client import call_finalize_checkout
+# ─────────────────────────────────────────────
+# 🛍️ Cart panel
+# ─────────────────────────────────────────────
+@st.fragment(key=CART_FRAGMENT)
+def _render_cart():
+    st.subheader("Your Cart")
+
+    if not st.session_state.cart:
+        st.info("Cart is empty.")
+        return
+
+    total = 0.0
 
-                     cart_payload = [
-                         {"name": item["name"], "quantity": item["quantity"]}
-                        for item in st.session_state.cart
+    for index, item in enumerate(st.session_state.cart):
+        item_total = item["price"] * item["quantity"]
+        col_item, col_minus, col_plus = st.columns([4, 1, 1])
+        col_item.write(f"- **{item['name']}** (x{item['quantity']}) : ${item_total:.2f}")
+        col_minus.button("−", key=f"cart_minus_{item['name']}", on_click=_change_quantity, args=(index, -1))
+        col_plus.button("+", key=f"cart_plus_{item['name']}", on_click=_change_quantity, args=(index, 1))
+        total += item_total
+
+    st.markdown("---")
+    st.markdown(f"**Total: ${total:.2f}**")
+
+    # 💳 Generate Payment Link
+    if st.button("💳 Generate Payment Link", use_container_width=True, type="primary"):
+
+        from services.api_client import call_create_payment_link
+        name = st.session_state.get("patient_name", "Guest")
+
+        with st.spinner("Connecting to Paypal..."):
+            link = call_create_payment_link(total, name)
+
+            if link:
+                st.session_state.payment_link = link
+            else:
+                st.error("Payment gateway unavailable.")
+
+    # 🔗 Show Pay Button
+    if st.session_state.get("payment_link"):
+        st.success("Payment link generated securely!")
+
+        st.link_button(
+            "Redirect to Paypal Checkout ↗",
+            st.session_state.payment_link,
+            type="secondary",
+            use_container_width=True
+        )
+
+        # ✅ After Payment → Trigger AI Review
+        if st.button("✅ I have completed the payment", use_container_width=True, type="primary"):
+            from services.api_client import call_finalize_checkout
+
+            cart_payload = [
+                {"name": item["name"], "quantity": item["quantity"]}
+                for item in st.session_state.cart
+            ]
+
+            with st.spinner("Finalizing checkout and validating safety..."):
+                result = call_finalize_checkout(
+                    st.session_state.get("patient_id", "PAT001"),
+                    cart_payload
+                )
+
+            if result.get("status") == "success":
+                purchased_items = [
+                    f"{item['name']} x{item['quantity']}"
+                    for item in st.session_state.cart
                 ]
 
-                with st.spinner("Finalizing checkout and validating safety..."):
-                             result = call_finalize_checkout(
-                                 st.session_state.get("patient_id", "PAT001"),
-                             cart_payload
-                        )
-
-                if result.get("status") == "success":
-                    purchased_items = [
-                        f"{item['name']} x{item['quantity']}"
-                        for item in st.session_state.cart
-                    ]
-
-                    total_amount = sum(
-                        item["price"] * item["quantity"]
-                        for item in st.session_state.cart
-                    )
-
-    # Build AI prompt for receipt + validation summary
-                    checkout_prompt = (
+                # Build AI prompt for receipt + validation summary
+                checkout_prompt = (
                     f"I have completed payment for the following medicines: "
                     f"{', '.join(purchased_items)}. "
-                    f"Total amount paid: ${total_amount:.2f}. "
+                    f"Total amount paid: ${total:.2f}. "
                     f"Please generate a purchase summary, dosage instructions, "
                     f"safety advice, and consultation receipt."
                 )
 
-    # Clear cart AFTER building summary
-                st.session_state.cart = []
-                st.session_state.payment_link = None
+                # Clear cart AFTER building summary
+                _clear_cart()
 
-    # Send to chat system
+                # Send to chat system (full app rerun — leaves the storefront)
                 st.session_state.checkout_prompt = checkout_prompt
                 st.session_state.ui_phase = "chatting"
 
                 st.rerun()
 
-        # Clear cart
-                st.session_state.cart = []
-                st.session_state.payment_link = None
+            else:
+                st.error(result.get("message", "Checkout failed."))
 
-        # Refresh stock
-                st.rerun()
+    st.button("Clear Cart", use_container_width=True, on_click=_clear_cart)
 
-            else:
 
-                    st.error(result.get("message", "Checkout failed."))
-                     
-                     
+# ─────────────────────────────────────────────
+# 🛒 Storefront UI
+# ─────────────────────────────────────────────
+def render_storefront():
+    """
+    Grid and cart are independent fragments: paging / filtering reruns only
+    the grid, cart changes (including "Add to Cart") rerun only the cart.
+    """
+    st.title("🛒 Pharmacy Storefront")
+    st.write("Browse over-the-counter medications. All checkouts are reviewed by our AI Safety Agent.")
 
-    
+    if st.button("← Back to Chat"):
+        st.session_state.ui_phase = "chatting"
+        st.rerun()
 
+    col_products, col_cart = st.columns([2, 1])
 
-   
+    with col_products:
+        _render_grid()
 
-            if st.button("Clear Cart", use_container_width=True):
-                st.session_state.cart = []
-                st.session_state.payment_link = None
-                st.rerun()
\ No newline at end of file
+    with col_cart:
+        _render_cart()
@@ -7,6 +7,13 @@ load_dotenv()
 APP_NAME = "Pharmacy_Assistant"
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+# Agents run in parallel; any still running after this many seconds are shown as timed out
+AGENT_DEADLINE_SECONDS = float(os.getenv("AGENT_DEADLINE_SECONDS", 20))
+
+# Developer rerun profiler (utils/profiler.py) — also enabled per tab with ?profile=1
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "0") == "1"
+PROFILE_HISTORY = 50           # reruns kept per session for the rolling breakdown
+
 # Emergency keywords — triggers Red Route, bypasses LLM entirely
 EMERGENCY_KEYWORDS = [
     "chest pain", "can't breathe", "cannot breathe",
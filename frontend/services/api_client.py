@@ -10,16 +10,27 @@ When backend is ready:
     - Test each function individually using test_api_client.py
 
 Backend base URL: http://localhost:8000 (set in .env as BACKEND_URL)
+
+All calls share one pooled keep-alive requests.Session (see HTTP LAYER),
+with connect/read timeouts, jittered retries for idempotent requests and
+per-call latency logging. Catalog-type GETs are cached with st.cache_data.
 """
 
+import logging
 import os
+import random
 import time
 import requests
+import streamlit as st
 from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth # ← Add this if it's missing
+from requests.adapters import HTTPAdapter
+
+from utils import profiler
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # 🔌 SWAP THIS — BACKEND_URL comes from .env file.
 # When backend is deployed (not just localhost), update .env:
 #   BACKEND_URL=https://your-deployed-backend.com
@@ -28,7 +39,167 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
 # How long to wait for backend before giving up (seconds)
 # 🔌 SWAP THIS — increase timeout if your agents are slow on the real backend
-TIMEOUT = 30
+TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", 30))
+
+# Failing to even connect should not take 30s
+CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", 3))
+
+# Retries for idempotent calls (GET) on connection errors / 502 / 503 / 504
+MAX_RETRIES = int(os.getenv("BACKEND_MAX_RETRIES", 2))
+RETRY_BACKOFF = 0.3            # base delay (s), doubled per attempt, then jittered
+RETRY_STATUSES = {502, 503, 504}
+
+# Keep-alive connections held per host
+POOL_SIZE = 20
+
+# How long catalog-type responses (products, inventory) are reused across reruns
+CATALOG_TTL = 30
+
+# Admin dashboard data — short TTL so tabs refreshing on an interval share one call
+ADMIN_STATS_TTL = 10
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 🔗 HTTP LAYER
+# ══════════════════════════════════════════════════════════════════════════════
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    One pooled Session for the whole Streamlit server — reruns and browser
+    tabs reuse the same keep-alive connections instead of a new TCP handshake per call.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: spreads retries from many reruns instead of retrying in lockstep
+    return random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+
+
+def api_request(method: str, url: str, *, timeout=None, retries=None, **kwargs) -> requests.Response:
+    """
+    Send one request through the shared session.
+
+    Args:
+        method:   "GET", "POST", ...
+        url:      full URL, or a path like "/products" (prefixed with BACKEND_URL)
+        timeout:  read timeout in seconds (default TIMEOUT)
+        retries:  retry count; defaults to MAX_RETRIES for GET/HEAD and 0 otherwise,
+                  so an order is never submitted twice
+
+    Returns:
+        requests.Response (status is NOT checked — call raise_for_status() if needed)
+    """
+    path = url
+    if url.startswith("/"):
+        url = f"{BACKEND_URL}{url}"
+
+    if retries is None:
+        retries = MAX_RETRIES if method.upper() in ("GET", "HEAD") else 0
+
+    timeout = (CONNECT_TIMEOUT, timeout or TIMEOUT)
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            elapsed = (time.perf_counter() - started) * 1000
+            profiler.record_call(method, path, None, elapsed)
+            logger.warning("%s %s failed after %.0f ms (attempt %d): %s", method, url, elapsed, attempt + 1, e)
+            if attempt == retries:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+
+        elapsed = (time.perf_counter() - started) * 1000
+        profiler.record_call(method, path, response.status_code, elapsed)
+        logger.info("%s %s → %s in %.0f ms", method, url, response.status_code, elapsed)
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            time.sleep(_backoff(attempt))
+            continue
+
+        return response
+
+
+# ETag → last body, per URL + params. Lets a cache miss still cost only a 304.
+_etags = {}
+
+
+def api_get_json(path: str, params=None, **kwargs):
+    """
+    GET + raise_for_status + .json(), revalidating with If-None-Match when
+    the backend sent an ETag last time (e.g. /products, /search).
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    headers = dict(kwargs.pop("headers", None) or {})
+
+    cached = _etags.get(key)
+    if cached:
+        headers["If-None-Match"] = cached[0]
+
+    response = api_request("GET", path, params=params, headers=headers, **kwargs)
+
+    if response.status_code == 304 and cached:
+        return cached[1]
+
+    response.raise_for_status()
+    data = response.json()
+
+    etag = response.headers.get("ETag")
+    if etag:
+        _etags[key] = (etag, data)
+
+    return data
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 🛍️ CATALOG (cached)
+# ══════════════════════════════════════════════════════════════════════════════
+
+@st.cache_data(ttl=CATALOG_TTL, show_spinner=False)
+def cached_get(path: str):
+    """
+    api_get_json shared across reruns and sessions for CATALOG_TTL seconds.
+    Raises on failure, so errors are never cached.
+    """
+    return api_get_json(path)
+
+
+def fetch_products() -> list:
+    """
+    Live product list for the storefront — reruns (every button click)
+    reuse the cached copy instead of refetching the catalog.
+    Returns [] if the backend is unreachable.
+    """
+    try:
+        return cached_get("/products")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning("Could not load products: %s", e)
+        return []
+
+
+@st.cache_data(ttl=ADMIN_STATS_TTL, show_spinner=False)
+def call_admin_stats(window_minutes: int = 60) -> dict:
+    """
+    Everything the admin dashboard shows (trace rollups, stock, PDC,
+    prescription queue) from one GET /admin/stats call.
+    Raises on failure, so errors are never cached.
+    """
+    return api_get_json("/admin/stats", params={"window": window_minutes})
+
+
+def refresh_catalog():
+    """
+    Drop cached catalog data (call after a checkout changes stock).
+    """
+    cached_get.clear()
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -202,14 +373,12 @@ def call_final_streamed(text: str):
 # 🎙️ VOICE TRANSCRIPTION
 # ══════════════════════════════════════════════════════════════════════════════
 
-
-BACKEND_URL = "http://127.0.0.1:8000"
-
 def call_finalize_checkout(patient_id, items):
 
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/finalize-checkout",
+        response = api_request(
+            "POST",
+            "/finalize-checkout",
             json={
                 "patient_id": patient_id,
                 "items": items
@@ -217,10 +386,11 @@ def call_finalize_checkout(patient_id, items):
         )
 
         if response.status_code == 200:
+            refresh_catalog()
             return response.json()
         else:
             return {"status": "error", "message": response.json().get("detail")}
-    except:
+    except (requests.exceptions.RequestException, ValueError):
         return {"status": "error", "message": "Backend unreachable"}
 
 def call_transcribe(audio_bytes: bytes) -> str:
@@ -252,17 +422,6 @@ def call_transcribe(audio_bytes: bytes) -> str:
     # 🔌 SWAP THIS — delete this line and uncomment the block above
     return "I have a headache and mild fever. What can I take?"
 
-import requests
-
-BASE_URL = "http://127.0.0.1:8000"
-
-def call_finalize_checkout(user_id, order_data):
-    response = requests.post(
-        f"{BASE_URL}/finalize-checkout",
-        params={"user_id": user_id},
-        json=order_data
-    )
-    return response.json()
 # ══════════════════════════════════════════════════════════════════════════════
 # 📊 REFILL CHECK
 # ══════════════════════════════════════════════════════════════════════════════
@@ -306,9 +465,7 @@ def call_refill_check(patient_id: str, medication: str) -> dict:
 def call_inventory() -> list:
     # This expects the backend to return: {"products": [ {name, price, stock, category, restricted}, ... ]}
     try:
-        res = requests.get(f"{BACKEND_URL}/inventory", timeout=TIMEOUT)
-        res.raise_for_status()
-        return res.json().get("products", [])
+        return cached_get("/inventory").get("products", [])
     except Exception as e:
         # If backend is down, return empty list so the app doesn't crash during the demo
         return []
@@ -318,12 +475,6 @@ def call_inventory() -> list:
 # 💳 PAYPAL PAYMENT GATEWAY (SANDBOX)
 # ══════════════════════════════════════════════════════════════════════════════
 
-# ... (after call_inventory)
-
-import requests
-import requests.auth
-import os
-
 # Ensure these match your .env exactly
 PP_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
 PP_SECRET = os.getenv("PAYPAL_SECRET")
@@ -333,10 +484,11 @@ def get_paypal_token():
     data = {"grant_type": "client_credentials"}
     try:
         # Use requests.auth.HTTPBasicAuth to fix the yellow line warning
-        res = requests.post(
-            url, 
-            data=data, 
-            auth=requests.auth.HTTPBasicAuth(PP_CLIENT_ID, PP_SECRET), 
+        res = api_request(
+            "POST",
+            url,
+            data=data,
+            auth=requests.auth.HTTPBasicAuth(PP_CLIENT_ID, PP_SECRET),
             timeout=10
         )
         res.raise_for_status()
@@ -376,7 +528,7 @@ def call_create_payment_link(amount_usd: float, patient_name: str) -> str:
     }
 
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = api_request("POST", url, json=payload, headers=headers, timeout=10)
         # If this fails, it will print the exact reason in your terminal
         if response.status_code != 201:
             print(f"PayPal Order Error: {response.text}")
@@ -389,19 +541,6 @@ def call_create_payment_link(amount_usd: float, patient_name: str) -> str:
         print(f"Request Exception: {e}")
     
     return "https://www.paypal.com/checkoutnow"
-    
-
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        for link in data.get("links", []):
-            if link["rel"] == "approve":
-                return link["href"]
-    except Exception as e:
-        print(f"PayPal Order Error: {e}")
-    
-    return "https://www.paypal.com/checkoutnow"
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 🛡️ ERROR HANDLER — wraps any api call safely
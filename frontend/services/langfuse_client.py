@@ -15,14 +15,52 @@ Usage:
     trace = start_trace(user_input)
     log_span(trace, agent="🩺 Pharmacist", input=user_input, output=result)
     end_trace(trace)
+
+None of these touch the network. start_trace() decides up front whether the
+interaction is sampled; end_trace() only puts the finished trace on a bounded
+in-memory queue. A background thread exports queued traces in batches
+(every LANGFUSE_FLUSH_INTERVAL seconds or LANGFUSE_BATCH_SIZE traces). If
+Langfuse is unreachable, batches are appended to LANGFUSE_SPILL_PATH (JSONL)
+and replayed once it is reachable again; an interrupted replay resumes after
+the last batch Langfuse accepted.
 """
 
+import atexit
+import itertools
+import json
 import os
+import queue
+import random
+import threading
 import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Fraction of interactions traced (head-based: decided in start_trace)
+SAMPLE_RATE = float(os.getenv("LANGFUSE_SAMPLE_RATE", 1.0))
+
+# Export when this many traces are queued, or every FLUSH_INTERVAL seconds
+BATCH_SIZE = int(os.getenv("LANGFUSE_BATCH_SIZE", 20))
+FLUSH_INTERVAL = float(os.getenv("LANGFUSE_FLUSH_INTERVAL", 5))
+
+# Traces waiting for export; beyond this new traces are dropped, never blocking the UI
+QUEUE_SIZE = int(os.getenv("LANGFUSE_QUEUE_SIZE", 1000))
+
+# Where batches go while Langfuse is unreachable
+SPILL_PATH = os.getenv("LANGFUSE_SPILL_PATH", "langfuse_spill.jsonl")
+
+# The spill being replayed, and how far into it (bytes) has been sent
+REPLAY_PATH = SPILL_PATH + ".replaying"
+REPLAY_OFFSET_PATH = REPLAY_PATH + ".offset"
+
+# After a successful export, skip the reachability check for this long;
+# after a failed one, don't retry Langfuse for RETRY_AFTER seconds
+HEALTHY_FOR = 60
+RETRY_AFTER = 30
+
 # ══════════════════════════════════════════════════════════════════════════════
 # 🔧 LANGFUSE INIT
 # Created once at module level — do not re-create inside functions.
@@ -40,6 +78,207 @@ _langfuse = Langfuse(
 )
 
 
+# ══════════════════════════════════════════════════════════════════════════════
+# 🧾 LOCAL TRACE RECORD
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _Trace:
+    """
+    Plain in-memory trace — same span()/update() calls as the Langfuse
+    trace object, but nothing is sent until the exporter picks it up.
+    """
+    def __init__(self, name: str, input, metadata: dict):
+        self.record = {
+            "id":        str(uuid.uuid4()),
+            "name":      name,
+            "input":     input,
+            "output":    None,
+            "metadata":  metadata,
+            "timestamp": _now(),
+            "spans":     [],
+        }
+
+    def span(self, **kwargs):
+        self.record["spans"].append(kwargs)
+
+    def update(self, **kwargs):
+        self.record.update(kwargs)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 📤 BACKGROUND EXPORTER
+# ══════════════════════════════════════════════════════════════════════════════
+
+class _Exporter:
+    """
+    One daemon thread draining a bounded queue into Langfuse in batches.
+    Started on first use.
+    """
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._healthy_until = 0.0
+        self._down_until = 0.0
+
+    def submit(self, record: dict):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._loop, name="langfuse-exporter", daemon=True
+                    )
+                    self._thread.start()
+
+    def _next_batch(self, deadline: float) -> list:
+        batch = []
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch(time.monotonic() + FLUSH_INTERVAL)
+            if batch:
+                self.export(batch)
+            elif self._spill_pending():
+                self._replay_spill()
+
+    def drain(self):
+        """Export (or spill) whatever is still queued — used at exit."""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.export(batch)
+
+    # ── Langfuse I/O (exporter thread only) ──────────────────────────────────
+
+    def _reachable(self) -> bool:
+        if time.monotonic() < self._healthy_until:
+            return True
+        if time.monotonic() < self._down_until:
+            return False
+        try:
+            _langfuse.auth_check()
+        except Exception as e:
+            print(f"[Langfuse] unreachable, spilling to {SPILL_PATH}: {e}")
+            self._down_until = time.monotonic() + RETRY_AFTER
+            return False
+        self._healthy_until = time.monotonic() + HEALTHY_FOR
+        return True
+
+    def _send(self, batch: list):
+        for record in batch:
+            trace = _langfuse.trace(
+                id        = record["id"],
+                name      = record["name"],
+                input     = record["input"],
+                output    = record["output"],
+                metadata  = record["metadata"],
+                timestamp = datetime.fromisoformat(record["timestamp"]),
+            )
+            for span in record["spans"]:
+                trace.span(
+                    **{k: v for k, v in span.items() if k not in ("start_time", "end_time")},
+                    start_time = datetime.fromisoformat(span["start_time"]),
+                    end_time   = datetime.fromisoformat(span["end_time"]),
+                )
+        _langfuse.flush()
+
+    def export(self, batch: list) -> bool:
+        try:
+            if self._reachable():
+                self._send(batch)
+                self._replay_spill()
+                return True
+        except Exception as e:
+            print(f"[Langfuse] export failed, spilling {len(batch)} traces: {e}")
+            self._healthy_until = 0.0
+        self._spill(batch)
+        return False
+
+    # ── Offline spill ────────────────────────────────────────────────────────
+
+    def _spill(self, batch: list):
+        try:
+            with open(SPILL_PATH, "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"[Langfuse] could not spill {len(batch)} traces: {e}")
+
+    @staticmethod
+    def _spill_pending() -> bool:
+        # An interrupted replay counts even if nothing was spilled since
+        return os.path.exists(REPLAY_PATH) or os.path.exists(SPILL_PATH)
+
+    @staticmethod
+    def _replay_offset() -> int:
+        try:
+            with open(REPLAY_OFFSET_PATH, encoding="utf-8") as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _save_replay_offset(offset: int):
+        # Write-then-rename, so a crash never leaves a half-written offset
+        with open(REPLAY_OFFSET_PATH + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(offset))
+        os.replace(REPLAY_OFFSET_PATH + ".tmp", REPLAY_OFFSET_PATH)
+
+    def _replay_spill(self):
+        if not self._spill_pending() or not self._reachable():
+            return
+
+        # Finish an interrupted replay before claiming new spills; claiming
+        # moves the file, so spills during the replay go to a fresh one
+        if not os.path.exists(REPLAY_PATH):
+            os.replace(SPILL_PATH, REPLAY_PATH)
+
+        try:
+            with open(REPLAY_PATH, "rb") as f:
+                f.seek(self._replay_offset())
+                while True:
+                    lines = list(itertools.islice(f, BATCH_SIZE))
+                    if not lines:
+                        break
+                    self._send([json.loads(line) for line in lines if line.strip()])
+                    # A retry resumes after the last batch Langfuse accepted
+                    self._save_replay_offset(f.tell())
+        except Exception as e:
+            print(f"[Langfuse] replay failed, will retry: {e}")
+            self._healthy_until = 0.0
+            return
+
+        os.remove(REPLAY_PATH)
+        if os.path.exists(REPLAY_OFFSET_PATH):
+            os.remove(REPLAY_OFFSET_PATH)
+
+
+_exporter = _Exporter()
+atexit.register(_exporter.drain)
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # 🚀 PUBLIC FUNCTIONS
 # ══════════════════════════════════════════════════════════════════════════════
@@ -55,27 +294,23 @@ def start_trace(user_input: str, patient_name: str = "Guest Patient"):
 
     Returns:
         trace object — pass this into log_span() and end_trace()
+        (a no-op trace when this interaction is not sampled)
 
     Usage in app.py:
         trace = start_trace(user_input, st.session_state.patient_name)
     """
-    try:
-        trace = _langfuse.trace(
-            name     = "pharmacy-assistant-interaction",
-            input    = user_input,
-            metadata = {
-                "patient": patient_name,
-                "app":     "Atharva",
-            },
-        )
-        return trace
-
-    except Exception as e:
-        # ⚠️ DEMO SAFETY: if Langfuse is unreachable, return a dummy trace
-        # so the rest of the app doesn't crash. Observability fails silently.
-        print(f"[Langfuse] start_trace failed: {e}")
+    if random.random() >= SAMPLE_RATE:
         return _DummyTrace()
 
+    return _Trace(
+        name     = "pharmacy-assistant-interaction",
+        input    = user_input,
+        metadata = {
+            "patient": patient_name,
+            "app":     "Atharva",
+        },
+    )
+
 
 def log_span(
     trace,
@@ -102,11 +337,14 @@ def log_span(
         log_span(trace, "🩺 Pharmacist Agent", user_input, result, latency)
     """
     try:
+        ended = datetime.now(timezone.utc)
         trace.span(
-            name     = agent,
-            input    = input,
-            output   = output,
-            metadata = {
+            name       = agent,
+            input      = input,
+            output     = output,
+            start_time = (ended - timedelta(seconds=latency)).isoformat(),
+            end_time   = ended.isoformat(),
+            metadata   = {
                 "agent":         agent,
                 "latency_secs":  round(latency, 3),
             },
@@ -119,8 +357,8 @@ def log_span(
 
 def end_trace(trace, final_response: str = ""):
     """
-    Finalizes the trace with the assistant's final response and
-    flushes everything to the Langfuse dashboard.
+    Finalizes the trace with the assistant's final response and hands it
+    to the background exporter — returns immediately, no network call.
     Call this once after all agents and streaming are done.
 
     Args:
@@ -132,10 +370,11 @@ def end_trace(trace, final_response: str = ""):
     """
     try:
         trace.update(output=final_response)
-        _langfuse.flush()
+        if isinstance(trace, _Trace):
+            _exporter.submit(trace.record)
 
     except Exception as e:
-        # ⚠️ DEMO SAFETY: flush fails silently
+        # ⚠️ DEMO SAFETY: fails silently
         print(f"[Langfuse] end_trace failed: {e}")
 
 
@@ -145,8 +384,7 @@ def end_trace(trace, final_response: str = ""):
 
 class _DummyTrace:
     """
-    Silent no-op trace used when Langfuse connection fails.
-    Prevents the app from crashing if Langfuse is down during demo.
+    Silent no-op trace used for interactions that are not sampled.
     All methods do nothing but won't raise errors.
     """
     def span(self, **kwargs):   pass
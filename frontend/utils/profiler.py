@@ -0,0 +1,213 @@
+"""
+utils/profiler.py
+------------------
+Developer rerun profiler. Times each component of a Streamlit rerun and
+every backend call made through services.api_client during it.
+
+Turn on with PROFILE_RERUNS=1 in .env, or per browser tab with ?profile=1.
+When on:
+    - a "⏱ Rerun profile" overlay in the sidebar shows the last rerun and a
+      rolling per-session breakdown (last PROFILE_HISTORY reruns)
+    - each rerun is posted to the backend trace store (/admin/frontend-traces)
+When off, section() is a no-op and nothing is recorded.
+
+Usage in app.py:
+    from utils import profiler
+    profiler.begin_rerun()
+    with profiler.section("sidebar"):
+        render_sidebar()
+    profiler.end_rerun()      # also before every st.stop()
+"""
+
+import contextvars
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from config import PROFILE_RERUNS, PROFILE_HISTORY
+
+
+# The profile of the rerun running on this script thread. Worker threads
+# (agent pool, exporters) see None, so their calls are not attributed.
+_current = contextvars.ContextVar("rerun_profile", default=None)
+
+
+class RerunProfile:
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self.components = {}                   # name → ms
+        self.calls = []                        # (method, path, status, ms)
+        self.total_ms = None
+
+    def summary(self) -> dict:
+        api = defaultdict(float)
+        for method, path, _, ms in self.calls:
+            api[f"api {method} {path}"] += ms
+
+        return {
+            "page": self.page,
+            "total_ms": round(self.total_ms, 2),
+            "stages": {
+                **{name: round(ms, 2) for name, ms in self.components.items()},
+                **{name: round(ms, 2) for name, ms in api.items()},
+            },
+            "api_calls": len(self.calls),
+        }
+
+
+def enabled() -> bool:
+    return PROFILE_RERUNS or st.query_params.get("profile") == "1"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ⏱ RECORDING
+# ══════════════════════════════════════════════════════════════════════════════
+
+def begin_rerun() -> None:
+    """Start profiling this rerun. A rerun cut short by st.rerun() is flushed here."""
+    _flush_pending()
+
+    if not enabled():
+        _current.set(None)
+        return
+
+    profile = RerunProfile(st.session_state.get("ui_phase", "unknown"))
+    _current.set(profile)
+    st.session_state._profile_pending = profile
+
+
+@contextmanager
+def section(name: str):
+    """Time one component. Still recorded if it ends in st.stop() / st.rerun()."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.components[name] = profile.components.get(name, 0) + (time.perf_counter() - started) * 1000
+
+
+def record_call(method: str, path: str, status, ms: float) -> None:
+    """Called by api_client for every attempt (status is None on connection errors)."""
+    profile = _current.get()
+    if profile is not None:
+        profile.calls.append((method, path, status, ms))
+
+
+def end_rerun() -> None:
+    """Close the rerun, add it to the session history, export it and draw the overlay."""
+    profile = _current.get()
+    if profile is None:
+        return
+
+    _current.set(None)
+    st.session_state._profile_pending = None
+    _finish(profile)
+    _render_overlay()
+
+
+def _flush_pending() -> None:
+    profile = st.session_state.get("_profile_pending")
+    if profile is not None:
+        st.session_state._profile_pending = None
+        _finish(profile)
+
+
+def _finish(profile: RerunProfile) -> None:
+    if profile.total_ms is None:
+        profile.total_ms = (time.perf_counter() - profile.started) * 1000
+
+    history = st.session_state.setdefault("_profile_history", [])
+    history.append(profile)
+    del history[:-PROFILE_HISTORY]
+
+    _export(profile.summary())
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 📤 EXPORT
+# ══════════════════════════════════════════════════════════════════════════════
+
+@st.cache_resource
+def _export_pool() -> ThreadPoolExecutor:
+    """One background thread — exporting never adds to rerun time."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-export")
+
+
+def _post(summary: dict) -> None:
+    from services.api_client import api_request
+
+    try:
+        api_request("POST", "/admin/frontend-traces", json=summary, timeout=5)
+    except Exception as e:
+        print("⚠️ Rerun profile export failed:", e)
+
+
+def _export(summary: dict) -> None:
+    _export_pool().submit(_post, summary)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# 🧰 DEVELOPER OVERLAY
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _render_overlay() -> None:
+    history = st.session_state.get("_profile_history", [])
+    if not history:
+        return
+
+    last = history[-1]
+
+    with st.sidebar.expander(f"⏱ Rerun profile — {last.total_ms:.0f} ms", expanded=False):
+        st.caption(f"Last rerun · page: {last.page} · {len(last.calls)} backend call(s)")
+        st.dataframe(
+            pd.DataFrame(
+                sorted(last.components.items(), key=lambda kv: -kv[1]),
+                columns=["Component", "ms"],
+            ).round(1),
+            hide_index=True,
+            use_container_width=True,
+        )
+
+        # Rolling per-session breakdown
+        rows = [
+            {"Component": name, "ms": ms}
+            for profile in history
+            for name, ms in profile.components.items()
+        ]
+        if rows:
+            df = pd.DataFrame(rows).groupby("Component")["ms"]
+            rolling = pd.DataFrame({
+                "reruns": df.count(),
+                "avg ms": df.mean(),
+                "p95 ms": df.quantile(0.95),
+            }).sort_values("avg ms", ascending=False).round(1)
+            st.caption(f"Last {len(history)} reruns")
+            st.dataframe(rolling, use_container_width=True)
+
+        calls = [
+            {"Call": f"{method} {path}", "ms": ms, "failed": status is None or status >= 500}
+            for profile in history
+            for method, path, status, ms in profile.calls
+        ]
+        if calls:
+            df = pd.DataFrame(calls).groupby("Call")
+            st.caption("Backend calls (same window)")
+            st.dataframe(
+                pd.DataFrame({
+                    "count": df["ms"].count(),
+                    "avg ms": df["ms"].mean(),
+                    "max ms": df["ms"].max(),
+                    "failed": df["failed"].sum(),
+                }).sort_values("count", ascending=False).round(1),
+                use_container_width=True,
+            )